@@ -0,0 +1,642 @@
+"""
+ASGI entry point for the backend.
+
+Serves the same routes as `server.py` from an event loop. The model calls are CPU-bound,
+so each one runs in a bounded thread pool for its model family:
+- 'forecast' for the SARIMAX models
+- 'tabular' for the sklearn models
+- 'fer' for emotion recognition
+- 'stt' for speech to text
+- 'weapons' for weapon detection
+
+A slow transcription therefore only occupies a thread of the 'stt' pool. The event loop
+keeps answering the cheap tabular routes from their own pool.
+
+Each pool admits at most `workers + queue` calls. Further calls are rejected immediately
+with 429. A call that waits longer than ASGI_QUEUE_TIMEOUT seconds for a thread is dropped
+with 503 without running. Both responses carry a Retry-After header, so an overloaded family
+sheds load instead of building a backlog that only times out.
+
+The pool sizes are read from ASGI_<FAMILY>_WORKERS and ASGI_<FAMILY>_QUEUE, e.g.
+ASGI_STT_WORKERS=2. The models, forecast tables and result cache are the ones of
+`server.py`, configured by the same environment variables.
+
+Usage (from the backend directory):
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route, WebSocketRoute
+
+import fer
+import metrics
+import tts
+import weapons
+from cache import AsyncSingleFlight
+from models import ModelLoader
+from schemas import SCHEMAS
+from server import (cache_headers, cached_result, etag_matches, forecast_arguments, memoized_prediction, model_loader,
+                    prediction_cache, prediction_cache_stats, prediction_key, result_cache, tabular_arguments,
+                    track_emotion)
+
+
+class Overloaded(Exception):
+    def __init__(self, pool, status_code):
+        """
+        Raised when a model pool cannot take a call.
+
+        Args:
+            pool (str): Name of the saturated pool.
+            status_code (int): 429 when the pool is full, 503 when the call waited too long for a thread.
+        """
+        super().__init__(f"The {pool} pool is saturated, retry later")
+        self.pool = pool
+        self.status_code = status_code
+
+
+class BoundedPool:
+    def __init__(self, name, max_workers, max_queue, queue_timeout):
+        """
+        Initializes the BoundedPool class.
+
+        This class runs blocking calls in a thread pool from the event loop, with admission
+        control: at most `max_workers` calls run at once and at most `max_queue` more wait
+        for a thread.
+
+        Args:
+            name (str): Name of the model family served by the pool.
+            max_workers (int): Number of threads.
+            max_queue (int): Number of calls that can wait for a thread.
+            queue_timeout (float): Seconds a call may wait for a thread before it is dropped.
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-pool')
+        self.in_flight = 0
+        self.rejected = {429: 0, 503: 0}
+        self.lock = threading.Lock()
+
+    def release(self, future=None):
+        with self.lock:
+            self.in_flight -= 1
+
+    async def run(self, function, *args):
+        """
+        Runs a blocking function in the pool and waits for its result without blocking the event loop.
+
+        Args:
+            function (callable): The function to run.
+            *args: Its arguments.
+
+        Returns:
+            The result of the function.
+
+        Raises:
+            Overloaded: When the pool is full, or the call waited longer than the queue timeout.
+        """
+        with self.lock:
+            if self.in_flight >= self.capacity:
+                self.rejected[429] += 1
+                raise Overloaded(self.name, 429)
+            self.in_flight += 1
+        enqueued = time.perf_counter()
+
+        def call():
+            # The client has likely given up on a call that waited this long, so do not spend a thread on it
+            if time.perf_counter() - enqueued > self.queue_timeout:
+                with self.lock:
+                    self.rejected[503] += 1
+                raise Overloaded(self.name, 503)
+            return function(*args)
+
+        future = self.executor.submit(call)
+        future.add_done_callback(self.release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        """
+        Returns the current state of the pool.
+
+        Returns:
+            dict: Number of threads, calls running or waiting, capacity and rejected calls for each status code.
+        """
+        with self.lock:
+            return {'workers': self.max_workers, 'in_flight': self.in_flight, 'capacity': self.capacity,
+                    'rejected': dict(self.rejected)}
+
+
+def create_pool(name, default_workers, default_queue):
+    return BoundedPool(name,
+                       int(os.environ.get(f'ASGI_{name.upper()}_WORKERS', default_workers)),
+                       int(os.environ.get(f'ASGI_{name.upper()}_QUEUE', default_queue)),
+                       float(os.environ.get('ASGI_QUEUE_TIMEOUT', 10)))
+
+
+# The FER pool needs several threads so that concurrent requests can share a batch in `fer.get_batcher()`. Each thread
+# of the weapons pool keeps its own single-threaded interpreter, so one thread per core serves one stream per core.
+pools = {
+    'forecast': create_pool('forecast', 2, 64),
+    'tabular': create_pool('tabular', 4, 256),
+    'fer': create_pool('fer', 8, 32),
+    'stt': create_pool('stt', 2, 8),
+    'weapons': create_pool('weapons', os.cpu_count() or 1, 8),
+}
+
+# Memoized predictions being computed, awaited on the event loop by concurrent identical requests
+prediction_flights = AsyncSingleFlight()
+
+
+def overloaded_response(request, exc):
+    return JSONResponse({'error': str(exc)}, status_code=exc.status_code, headers={'Retry-After': '1'})
+
+
+async def memoized(pool, key, compute):
+    """
+    Returns a memoized prediction from the event loop, or computes it in a model pool.
+
+    Concurrent misses of the same key wait on the event loop for one computation, so only that one takes a thread and
+     an admission slot of the pool.
+
+    Args:
+        pool (str): Name of the pool that runs `compute` on a miss.
+        key (str): Key returned by `server.prediction_key`, or None to always compute.
+        compute (callable): Function that computes the result.
+
+    Returns:
+        The result, see `server.memoized_prediction`.
+    """
+    if key is None:
+        return await pools[pool].run(compute)
+
+    if prediction_cache is not None:
+        hit, result = prediction_cache.lookup(key)
+        if hit:
+            return result
+    return await prediction_flights.run(key, lambda: pools[pool].run(memoized_prediction, key, compute, False))
+
+
+def cacheable(request, content, key, result):
+    """
+    Builds the response of a prediction, with caching headers for successful GET predictions.
+    """
+    headers = cache_headers(key) if request.method == 'GET' and key is not None and result is not None else None
+    return JSONResponse(content, headers=headers)
+
+
+def not_modified(request, key):
+    """
+    Returns a 304 response when the client already holds the response of a GET prediction, otherwise None.
+    """
+    if request.method == 'GET' and etag_matches(request.headers.get('if-none-match'), key):
+        return Response(status_code=304, headers=cache_headers(key))
+    return None
+
+
+async def sarimax_response(request, model):
+    """
+    Answers a forecast request with a SARIMAX model, like `server.sarimax_response`.
+
+    Args:
+        request (Request): The request.
+        model (str): Name of the SARIMAX model to use.
+
+    Returns:
+        JSONResponse: The prediction for a single date, or the forecast for a range.
+    """
+    key = prediction_key(model, forecast_arguments(request.query_params))
+    response = not_modified(request, key)
+    if response is not None:
+        return response
+
+    start_date = request.query_params.get('start')
+    if start_date is None:
+        input_date = request.query_params.get('input_date')
+        prediction = await memoized('forecast', key, lambda: model_loader.process_SARIMAX(model, input_date))
+        return cacheable(request, {'prediction': prediction}, key, prediction)
+
+    end_date = request.query_params.get('end')
+    horizon = request.query_params.get('horizon')
+    if end_date is None and horizon is None:
+        return JSONResponse({'error': "A range needs either an 'end' date or a 'horizon'"}, status_code=400)
+    try:
+        horizon = int(horizon) if horizon is not None else None
+    except ValueError:
+        return JSONResponse({'error': f"'horizon' must be an integer, got {horizon!r}"}, status_code=400)
+
+    try:
+        forecast = await memoized('forecast', key,
+                                  lambda: model_loader.forecast_SARIMAX(model, start_date, end_date, horizon))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return cacheable(request, {'forecast': forecast}, key, forecast)
+
+
+def read_batch_rows(body, content_type):
+    """
+    Reads the rows of a batch prediction request, like `server.read_batch_rows`.
+
+    Args:
+        body (bytes): The request body.
+        content_type (str): The Content-Type header.
+
+    Returns:
+        pd.DataFrame or list: The rows to score.
+    """
+    if content_type.split(';')[0].strip() == 'text/csv':
+        return pd.read_csv(io.StringIO(body.decode()))
+
+    rows = json.loads(body)
+    if isinstance(rows, dict):
+        rows = rows['rows']
+    return rows
+
+
+def parse_body(schema, body, content_type):
+    return schema.parse_rows(read_batch_rows(body, content_type))
+
+
+async def prediction_response(request, model, single=False):
+    """
+    Answers a prediction request with any model, like `server.prediction_response`.
+
+    Large bodies are parsed in the tabular pool so that they do not block the event loop.
+
+    Args:
+        request (Request): The request.
+        model (str): Name of the model to use.
+        single (bool): Answer with the `prediction` for the first row instead of the list of `predictions`.
+
+    Returns:
+        JSONResponse: The predictions, or an error message.
+    """
+    if model in ModelLoader.SARIMAX_MODELS:
+        return await sarimax_response(request, model)
+
+    schema = SCHEMAS.get(model)
+    if schema is None:
+        return JSONResponse({'error': f"Unknown model '{model}'"}, status_code=404)
+
+    try:
+        if request.method == 'GET':
+            input_data = schema.parse_query(request.query_params)
+        else:
+            body = await request.body()
+            input_data = await pools['tabular'].run(parse_body, schema, body, request.headers.get('content-type', ''))
+    except Overloaded:
+        raise
+    except Exception as e:
+        error_msg = f"Error reading input for model '{model}': {e}"
+        print(error_msg)
+        return JSONResponse({'error': error_msg}, status_code=400)
+
+    if single:
+        input_data = input_data[:1]
+
+    # GET predictions are memoized and carry an ETag, the batch rows of POST requests are not
+    key = prediction_key(model, tabular_arguments(input_data, single)) if request.method == 'GET' else None
+    response = not_modified(request, key)
+    if response is not None:
+        return response
+
+    try:
+        predictions = await memoized('tabular', key, lambda: model_loader.predict(model, input_data))
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Error predicting with model '{model}': {e}")
+        predictions = None
+
+    if single:
+        return cacheable(request, {'prediction': predictions[0] if predictions else None}, key, predictions)
+    return cacheable(request, {'predictions': predictions}, key, predictions)
+
+
+async def predict(request):
+    return await prediction_response(request, request.path_params['model'])
+
+
+async def transcribe_audio_route(request):
+    """
+    Endpoint to transcribe an uploaded audio file, like `server.transcribe_audio_route`.
+
+    Returns:
+        JSONResponse: The transcription or an error message.
+    """
+    try:
+        form = await request.form()
+        audio_bytes = await form['audio'].read()
+
+        transcription = await pools['stt'].run(
+            cached_result, audio_bytes, tts.model_version, lambda: tts.transcribe_samples(tts.decode_audio(audio_bytes)))
+        print(transcription)
+        return JSONResponse({'transcription': transcription})
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        error_msg = f"Error transcribing audio: {e}"
+        print(error_msg)
+        return JSONResponse({'error': error_msg})
+
+
+async def transcribe_stream(websocket):
+    """
+    WebSocket endpoint to transcribe audio while the user is talking, like `server.transcribe_stream`.
+
+    When the STT pool is saturated, the connection is closed with code 1013 (try again later).
+
+    Args:
+        websocket: The WebSocket connection.
+    """
+    await websocket.accept()
+    transcriber = tts.StreamingTranscriber()
+    start = None
+    first_token_seconds = None
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message.get('text') is not None:
+                if message['text'] == 'end':
+                    break
+                continue
+
+            if start is None:
+                start = time.perf_counter()
+
+            try:
+                samples = tts.pcm_samples(message['bytes'])
+            except ValueError as e:
+                await websocket.send_text(json.dumps({'error': str(e)}))
+                await websocket.close(code=1007, reason=str(e))
+                return
+
+            partial = await pools['stt'].run(transcriber.add_audio, samples)
+            if partial is not None:
+                if partial and first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                await websocket.send_text(json.dumps({'partial': partial, 'audio_seconds': transcriber.audio_seconds,
+                                                      'first_token_seconds': first_token_seconds}))
+
+        transcription = await pools['stt'].run(transcriber.finish)
+    except Overloaded as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    await websocket.send_text(json.dumps({'transcription': transcription, 'audio_seconds': transcriber.audio_seconds,
+                                          'first_token_seconds': first_token_seconds}))
+    await websocket.close()
+
+
+def recognize_emotion(image_bytes):
+    """
+    Detects the first face of an image and recognizes its emotion, from the result cache when possible.
+
+    Args:
+        image_bytes (bytes): The uploaded image.
+
+    Returns:
+        dict or None: The emotions of the first face, or None when no face is found.
+    """
+    def recognize():
+        with metrics.stage('fer', 'decode'):
+            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), -1)
+
+        faces = fer.detectFaces(img)
+        if not faces:
+            return None
+        return fer.emotionRecognitionBatched(faces[:1])[0]
+
+    return cached_result(image_bytes, fer.model_version, recognize)
+
+
+async def process_image(request):
+    """
+    Endpoint to recognize emotions in an uploaded image file, like `server.process_image`.
+
+    Returns:
+        Response: The recognized emotions, "None" when no face is found, or an error message.
+    """
+    try:
+        form = await request.form()
+        image_bytes = await form['file'].read()
+
+        emotions = await pools['fer'].run(recognize_emotion, image_bytes)
+        if emotions is not None:
+            return JSONResponse({'emotions': emotions})
+        else:
+            return Response("None", media_type='text/html')
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Error processing image: {e}")
+        return JSONResponse({'error': str(e)})
+
+
+async def recognize_emotion_stream(websocket):
+    """
+    WebSocket endpoint to recognize emotions in the frames of a webcam session, like
+     `server.recognize_emotion_stream`.
+
+    When the FER pool is saturated, the connection is closed with code 1013 (try again later).
+
+    Args:
+        websocket: The WebSocket connection.
+    """
+    await websocket.accept()
+    tracker = fer.FaceTracker()
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message.get('text') is not None:
+                if message['text'] == 'end':
+                    break
+                continue
+
+            try:
+                result = await pools['fer'].run(track_emotion, tracker, message['bytes'])
+            except Overloaded:
+                raise
+            except Exception as e:
+                print(f"Error processing frame: {e}")
+                result = {'error': str(e)}
+            await websocket.send_text(json.dumps(result))
+    except Overloaded as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    await websocket.send_text(json.dumps(tracker.stats()))
+    await websocket.close()
+
+
+async def detect_weapons(request):
+    """
+    Endpoint to detect weapons in an uploaded image file, like `server.detect_weapons`.
+
+    Returns:
+        JSONResponse: The detections of the image, or an error message.
+    """
+    try:
+        form = await request.form()
+        image_bytes = await form['file'].read()
+
+        detections = await pools['weapons'].run(
+            cached_result, image_bytes, weapons.model_version, lambda: weapons.detect_image(image_bytes))
+        return JSONResponse({'detections': detections})
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Error detecting weapons: {e}")
+        return JSONResponse({'error': str(e)})
+
+
+async def detect_weapons_video(request):
+    """
+    Endpoint to detect weapons in an uploaded video file, like `server.detect_weapons_video`.
+
+    Returns:
+        JSONResponse: The detections of each sampled frame, or an error message.
+    """
+    try:
+        form = await request.form()
+        video_file = form['file']
+        video_bytes = await video_file.read()
+        suffix = os.path.splitext(video_file.filename or '')[1] or '.mp4'
+
+        result = await pools['weapons'].run(
+            cached_result, video_bytes, weapons.model_version, lambda: weapons.detect_video_bytes(video_bytes, suffix))
+        return JSONResponse(result)
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Error detecting weapons: {e}")
+        return JSONResponse({'error': str(e)})
+
+
+async def emotion_batching_stats(request):
+    return JSONResponse(fer.get_batcher().stats())
+
+
+async def cache_stats(request):
+    stats = prediction_cache_stats()
+    # Misses shared on the event loop never reach the thread-level single-flight of `server`
+    for name, value in prediction_flights.stats().items():
+        stats['predictions'][name] = stats['predictions'].get(name, 0) + value
+    return JSONResponse(stats)
+
+
+async def pool_stats(request):
+    """
+    Endpoint to inspect the model pools of the ASGI server.
+
+    Returns:
+        JSONResponse: The state of each pool, see `BoundedPool.stats`.
+    """
+    return JSONResponse({name: pool.stats() for name, pool in pools.items()})
+
+
+async def metrics_route(request):
+    """
+    Endpoint exposing the same metrics as `server.metrics_route`, plus the state of the model pools.
+
+    Returns:
+        Response: The metrics page in the Prometheus text format.
+    """
+    if fer.batcher is not None:
+        metrics.batch_queue_depth.set(fer.batcher.queue.qsize(), fer.batcher.name)
+    if result_cache is not None:
+        for event, count in result_cache.stats().items():
+            metrics.result_cache_events.set(count, event)
+    for name, pool in pools.items():
+        stats = pool.stats()
+        metrics.pool_in_flight.set(stats['in_flight'], name)
+        for status_code, count in stats['rejected'].items():
+            metrics.admission_rejections.set(count, name, status_code)
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+class RequestMetrics:
+    def __init__(self, app):
+        """
+        Initializes the RequestMetrics class, an ASGI middleware that records the latency of every HTTP route and
+         the number of requests in flight, like `metrics.instrument` does for Flask.
+
+        Args:
+            app: The ASGI application to wrap.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        metrics.requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            metrics.requests_in_flight.dec()
+            # The router adds the matched route to the scope
+            route = scope['route'].path if 'route' in scope else 'unmatched'
+            metrics.request_duration.observe(time.perf_counter() - start, route, scope['method'])
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    for pool in pools.values():
+        pool.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def route_for(model, single=False):
+    async def endpoint(request):
+        return await prediction_response(request, model, single)
+    return endpoint
+
+
+# The per-model URLs of server.py are aliases of /predict/{model}
+routes = [Route('/predict/{model}', predict, methods=['GET', 'POST'])]
+routes += [Route(f'/{model}_prediction', route_for(model), methods=['GET']) for model in ModelLoader.SARIMAX_MODELS]
+routes += [Route(f'/{model}_prediction', route_for(model, single=True), methods=['GET']) for model in SCHEMAS]
+routes += [Route(f'/{model}_batch_prediction', route_for(model), methods=['POST']) for model in SCHEMAS]
+routes += [
+    Route('/transcribe_audio', transcribe_audio_route, methods=['POST']),
+    WebSocketRoute('/transcribe_stream', transcribe_stream),
+    Route('/recognize_emotion', process_image, methods=['POST']),
+    WebSocketRoute('/recognize_emotion_stream', recognize_emotion_stream),
+    Route('/detect_weapons', detect_weapons, methods=['POST']),
+    Route('/detect_weapons_video', detect_weapons_video, methods=['POST']),
+    Route('/recognize_emotion/stats', emotion_batching_stats, methods=['GET']),
+    Route('/cache_stats', cache_stats, methods=['GET']),
+    Route('/pool_stats', pool_stats, methods=['GET']),
+    Route('/metrics', metrics_route, methods=['GET']),
+]
+
+app = Starlette(routes=routes, exception_handlers={Overloaded: overloaded_response}, lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+if metrics.enabled:
+    app.add_middleware(RequestMetrics)
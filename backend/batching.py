@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5.0, name='batcher'):
+        """
+        Initializes the MicroBatcher class.
+
+        This class gathers items submitted by concurrent requests and processes them together,
+        so a model with a high fixed cost per call runs once per batch instead of once per item.
+        A background thread takes the first waiting item, then keeps collecting until the batch
+        is full or `max_wait_ms` has passed, runs `process_batch` on the whole batch and fans
+        the results back out to each caller.
+
+        Args:
+            process_batch (callable): Function that takes a list of items and returns a list with
+             one result per item, in the same order.
+            max_batch_size (int, optional): Largest number of items processed together. Defaults to 32.
+            max_wait_ms (float, optional): Longest time the first item of a batch waits for more
+             items to arrive. Defaults to 5 ms.
+            name (str, optional): Name of the worker thread.
+        """
+        self.process_batch = process_batch
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        # Number of batches processed for each batch size
+        self.batch_sizes = {}
+        self.stats_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        """
+        Adds an item to the next batch.
+
+        Args:
+            item: The input to process.
+
+        Returns:
+            concurrent.futures.Future: Future that receives the result for this item.
+        """
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def map(self, items):
+        """
+        Processes several items through the shared batches and waits for their results.
+
+        Args:
+            items (list): The inputs to process.
+
+        Returns:
+            list: One result per item, in the same order.
+        """
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def collect(self):
+        """
+        Waits for the next batch of items.
+
+        Returns:
+            list of tuple: The (item, future) pairs of the batch.
+        """
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        """
+        Processes batches until the process exits.
+        """
+        while True:
+            batch = self.collect()
+            items = [item for item, _ in batch]
+
+            with self.stats_lock:
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            if metrics.enabled:
+                metrics.batch_size.observe(len(batch), self.name)
+
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """
+        Returns the current state of the batcher.
+
+        Returns:
+            dict: Number of items waiting in the queue and the number of batches processed for
+             each batch size.
+        """
+        with self.stats_lock:
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+        return {'queue_depth': self.queue.qsize(), 'batch_sizes': batch_sizes}
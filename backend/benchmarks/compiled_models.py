@@ -0,0 +1,84 @@
+"""
+Benchmark of the compiled tabular models against their pickles.
+
+For each tabular model, compiles the pickle with `compiled.compile_estimator`, checks that
+both forms predict the same classes, and compares load time, file size, and `predict`
+latency for a single row and for a batch.
+
+Usage (from the backend directory):
+    python benchmarks/compiled_models.py --models-dir ../models --repeat 200
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+import timeit
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compiled import COMPILED_SUFFIX, compile_estimator, load_compiled, verification_inputs  # noqa: E402
+from schemas import SCHEMAS  # noqa: E402
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+def load_time(load, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models-dir', default=os.environ.get('MODELS_DIR', os.path.join('..', 'models')),
+                        help='Directory containing the pickled models.')
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per model, form and input size.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows of the batch input.')
+    args = parser.parse_args()
+
+    print(f"{'model':<15}{'load ms':>16}{'size KB':>16}{'1 row us':>18}{'batch us':>20}")
+    with tempfile.TemporaryDirectory() as directory_path:
+        for model in SCHEMAS:
+            pickle_path = os.path.join(args.models_dir, model + '.pkl')
+            if not os.path.exists(pickle_path):
+                print(f"{model:<15}{'no pickle':>16}")
+                continue
+
+            with open(pickle_path, 'rb') as file:
+                estimator = pickle.load(file)
+            arrays = compile_estimator(estimator)
+            compiled_path = os.path.join(directory_path, model + COMPILED_SUFFIX)
+            np.savez(compiled_path, **arrays)
+            compiled = load_compiled(compiled_path)
+
+            # Both forms must agree before their timings are compared
+            X = verification_inputs(estimator, arrays, n_rows=max(args.batch_size, 2000))
+            assert np.array_equal(compiled.predict(X).tolist(), estimator.predict(X).tolist())
+            batch = X[:args.batch_size]
+
+            def read_pickle():
+                with open(pickle_path, 'rb') as file:
+                    return pickle.load(file)
+
+            loads = (load_time(read_pickle) * 1e3, load_time(lambda: load_compiled(compiled_path)) * 1e3)
+            sizes = (os.path.getsize(pickle_path) / 1024, os.path.getsize(compiled_path) / 1024)
+            row_times = [timeit.timeit(lambda: form.predict(batch[:1]), number=args.repeat) / args.repeat * 1e6
+                         for form in (estimator, compiled)]
+            batch_times = [timeit.timeit(lambda: form.predict(batch), number=args.repeat) / args.repeat * 1e6
+                           for form in (estimator, compiled)]
+
+            print(f"{model:<15}"
+                  f"{f'{loads[0]:.1f} -> {loads[1]:.1f}':>16}"
+                  f"{f'{sizes[0]:.0f} -> {sizes[1]:.0f}':>16}"
+                  f"{f'{row_times[0]:.0f} -> {row_times[1]:.0f}':>18}"
+                  f"{f'{batch_times[0]:.0f} -> {batch_times[1]:.0f}':>20}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Checks and times the NumPy greedy CTC decoder against the Keras decoder it replaced.
+
+Random softmax outputs shaped like the STT model's are decoded with both
+`keras.backend.ctc_decode(greedy=True)` + `num_to_char` and `tts.decode_batch_predictions`.
+The script fails if any transcript differs, then reports the per-call latency of both.
+
+Usage (from the backend directory):
+    python benchmarks/ctc_decoder.py --batch-size 1 --time-steps 500 --repeat 200
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tts  # noqa: E402
+
+# The lookup layers `tts` decoded with before, which map the model's output classes back to characters
+char_to_num = keras.layers.StringLookup(vocabulary=tts.characters, oov_token="")
+num_to_char = keras.layers.StringLookup(vocabulary=char_to_num.get_vocabulary(), oov_token="", invert=True)
+
+
+def keras_decode(pred):
+    """Decodes predictions the way `tts.decode_batch_predictions` did before."""
+    input_len = np.ones(pred.shape[0]) * pred.shape[1]
+    results = keras.backend.ctc_decode(pred, input_length=input_len, greedy=True)[0][0]
+    return [tf.strings.reduce_join(num_to_char(result)).numpy().decode("utf-8") for result in results]
+
+
+def random_predictions(rng, batch_size, time_steps):
+    """Returns softmax outputs that favour the blank, like a trained CTC model."""
+    logits = rng.normal(size=(batch_size, time_steps, len(tts.index_to_char))).astype(np.float32)
+    logits[..., -1] += 2.0
+    return tf.nn.softmax(logits).numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=1, help='Sequences per call.')
+    parser.add_argument('--time-steps', type=int, default=500, help='Model output time steps per sequence.')
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per decoder.')
+    parser.add_argument('--checks', type=int, default=100, help='Random batches compared before timing.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for _ in range(args.checks):
+        pred = random_predictions(rng, args.batch_size, int(rng.integers(1, args.time_steps + 1)))
+        expected, actual = keras_decode(pred), tts.decode_batch_predictions(pred)
+        if expected != actual:
+            raise AssertionError(f"Decoders differ: {expected!r} != {actual!r}")
+    print(f"{args.checks} random batches decoded identically")
+
+    pred = random_predictions(rng, args.batch_size, args.time_steps)
+    for name, decoder in (('keras', keras_decode), ('numpy', tts.decode_batch_predictions)):
+        decoder(pred)
+        seconds = timeit.timeit(lambda: decoder(pred), number=args.repeat) / args.repeat
+        print(f"{name:<8}{seconds * 1000:>10.3f} ms/call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmarks face detection on 720p and 4K uploads.
+
+Compares the previous detector (a new `cv2.CascadeClassifier` per call, full-resolution
+color image, minNeighbors=1) with `fer.detectFaces`, which reuses the classifier, converts
+to grayscale once and detects on a copy downscaled to `--max-side`.
+
+Without `--image` a synthetic noise image is used, which measures the cost of scanning
+the image but finds no faces. Pass a photo to compare the detections too.
+
+Usage (from the backend directory):
+    python benchmarks/face_detection.py --image group_photo.jpg --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fer  # noqa: E402
+
+RESOLUTIONS = {'720p': (1280, 720), '4K': (3840, 2160)}
+
+
+def legacy_detect_faces(img):
+    """Detects faces the way `fer.detectFaces` did before the classifier was cached."""
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    faces = face_cascade.detectMultiScale(img, scaleFactor=1.1, minNeighbors=1, minSize=(48, 48))
+    return [img[y:y + h, x:x + w] for (x, y, w, h) in faces]
+
+
+def time_detector(detector, img, repeat):
+    """Returns the mean seconds per call and the number of faces found."""
+    faces = detector(img)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        detector(img)
+    return (time.perf_counter() - start) / repeat, len(faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='Photo to resize to each resolution.')
+    parser.add_argument('--repeat', type=int, default=20, help='Calls per detector and resolution.')
+    parser.add_argument('--max-side', type=int, default=fer.max_detection_side,
+                        help='Longest side used by the downscaled detection.')
+    args = parser.parse_args()
+
+    if args.image:
+        source = cv2.imread(args.image)
+        if source is None:
+            raise ValueError(f"Image at path {args.image} could not be read.")
+    else:
+        source = np.random.default_rng(0).integers(0, 256, (2160, 3840, 3), dtype=np.uint8)
+
+    print(f"{'resolution':<12}{'detector':<12}{'ms/call':>10}{'faces':>8}")
+    for resolution, size in RESOLUTIONS.items():
+        img = cv2.resize(source, size)
+        detectors = {
+            'legacy': legacy_detect_faces,
+            'downscaled': lambda image: fer.detectFaces(image, max_side=args.max_side),
+        }
+        for name, detector in detectors.items():
+            seconds, faces = time_detector(detector, img, args.repeat)
+            print(f"{resolution:<12}{name:<12}{seconds * 1000:>10.1f}{faces:>8}")
+
+
+if __name__ == '__main__':
+    main()
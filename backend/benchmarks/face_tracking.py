@@ -0,0 +1,81 @@
+"""
+Benchmarks face tracking between the frames of a webcam session.
+
+Compares, frame by frame, the full-frame detection of `fer.detectFaces` (what
+/recognize_emotion runs on every upload) with `fer.FaceTracker`, which searches a region
+of interest around the previous box and only falls back to the full frame when the face
+is lost.
+
+Without `--video` a synthetic 720p clip of a drawn face moving across a noisy background
+is used. Pass a recording to measure a real session.
+
+Usage (from the backend directory):
+    python benchmarks/face_tracking.py --frames 120
+    python benchmarks/face_tracking.py --video webcam.mp4
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fer  # noqa: E402
+from benchmarks.fixtures import draw_face  # noqa: E402
+
+
+def synthetic_frames(num_frames, size=(1280, 720), face_size=200):
+    """Yields BGR frames of a face drifting across a static noisy background."""
+    rng = np.random.default_rng(0)
+    width, height = size
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (15, 15), 0)
+    face = draw_face(face_size)[:, :, np.newaxis]
+    for i in range(num_frames):
+        frame = background.copy()
+        x = int((width - face_size) * (0.5 + 0.4 * np.sin(i / 15)))
+        y = int((height - face_size) * (0.5 + 0.3 * np.cos(i / 20)))
+        frame[y:y + face_size, x:x + face_size] = face
+        yield frame
+
+
+def video_frames(path, num_frames):
+    capture = cv2.VideoCapture(path)
+    for _ in range(num_frames):
+        ok, frame = capture.read()
+        if not ok:
+            break
+        yield frame
+    capture.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='Recording to read the frames from.')
+    parser.add_argument('--frames', type=int, default=120, help='Number of frames.')
+    args = parser.parse_args()
+
+    if args.video:
+        frames = list(video_frames(args.video, args.frames))
+    else:
+        frames = list(synthetic_frames(args.frames))
+
+    start = time.perf_counter()
+    full_found = sum(bool(fer.detectFaces(frame)) for frame in frames)
+    full_time = time.perf_counter() - start
+
+    tracker = fer.FaceTracker()
+    start = time.perf_counter()
+    tracked_found = sum(tracker.update(frame)[0] is not None for frame in frames)
+    tracked_time = time.perf_counter() - start
+
+    print(f"{'detector':<12}{'ms/frame':>10}{'frames with a face':>22}")
+    print(f"{'full frame':<12}{full_time / len(frames) * 1e3:>10.2f}{full_found:>16}/{len(frames)}")
+    print(f"{'tracker':<12}{tracked_time / len(frames) * 1e3:>10.2f}{tracked_found:>16}/{len(frames)}")
+    print(f"Tracker: {tracker.stats()}")
+
+
+if __name__ == '__main__':
+    main()
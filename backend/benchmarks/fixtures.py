@@ -0,0 +1,201 @@
+"""
+Builds small stand-in models and inputs so the backend can be benchmarked offline on CPU.
+
+The fixtures have the same names, feature columns, input shapes and output classes as the
+real models, but are trained on random data, so only their cost matters, not their answers:
+
+- `models/`: sklearn classifiers for the six tabular models and SARIMAX fits for the four
+  forecast models, pickled like the real ones.
+- `weights/fer.keras` and `weights/tts.keras`: tiny Keras models with the FER and STT
+  input and output shapes.
+- `weights/weapons.tflite`: a tiny TFLite model with the input and output layout of a
+  YOLOv8 export (320x320, batch 4), with its class names in `weights/weapons.json`.
+- `image.jpg`, `video.mp4` and `audio.wav`: a 640x480 JPEG with one drawn face, a 3 second
+  30 fps clip of it scrolling, and a 3 second mono 22050 Hz WAV.
+
+Usage (from the backend directory):
+    python benchmarks/fixtures.py benchmark_fixtures
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import wave
+
+import cv2
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ModelLoader  # noqa: E402
+
+
+def build_tabular_models(directory_path, rng):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.tree import DecisionTreeClassifier
+
+    estimators = {
+        'wine': RandomForestClassifier(n_estimators=50, max_depth=8, random_state=0),
+        'stroke': LogisticRegression(),
+        'pokemon': DecisionTreeClassifier(max_depth=6, random_state=0),
+        'heart_failure': RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0),
+        'drug': DecisionTreeClassifier(random_state=0),
+        'breast_cancer': LogisticRegression(),
+    }
+    for model, features in ModelLoader.FEATURES.items():
+        input_data = pd.DataFrame(rng.normal(size=(500, len(features))) * 10, columns=features)
+        score = input_data.sum(axis=1)
+        if model == 'wine':
+            labels = np.digitize(score, [-5, 5])
+        elif model == 'drug':
+            labels = np.select([score < -5, score > 5], ['drugA', 'drugB'], 'DrugY')
+        else:
+            labels = (score > 0).astype(int)
+        estimators[model].fit(input_data, labels)
+        with open(os.path.join(directory_path, model + '.pkl'), 'wb') as file:
+            pickle.dump(estimators[model], file)
+
+
+def build_forecast_models(directory_path, rng):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    dates = pd.date_range('2020-01-01', periods=730, freq='D')
+    for model in ModelLoader.SARIMAX_MODELS:
+        series = pd.Series(np.cumsum(rng.normal(size=len(dates))) + 100, index=dates)
+        results = SARIMAX(series, order=(1, 1, 1), seasonal_order=(1, 0, 0, 7)).fit(disp=False)
+        with open(os.path.join(directory_path, model + '.pkl'), 'wb') as file:
+            pickle.dump(results, file)
+
+
+def build_keras_models(directory_path):
+    from tensorflow import keras
+
+    inputs = keras.Input((48, 48, 1))
+    x = keras.layers.Conv2D(16, 3, activation='relu')(inputs)
+    x = keras.layers.MaxPooling2D()(x)
+    x = keras.layers.Conv2D(32, 3, activation='relu')(x)
+    x = keras.layers.GlobalAveragePooling2D()(x)
+    outputs = keras.layers.Dense(6, activation='softmax')(x)
+    keras.Model(inputs, outputs).save(os.path.join(directory_path, 'fer.keras'))
+
+    # Same time downsampling (stride 2) and output classes as the real STT model
+    inputs = keras.Input((None, 193))
+    x = keras.layers.Conv1D(32, 11, strides=2, padding='same', activation='relu')(inputs)
+    x = keras.layers.Bidirectional(keras.layers.GRU(32, return_sequences=True))(x)
+    outputs = keras.layers.Dense(29, activation='softmax')(x)
+    keras.Model(inputs, outputs).save(os.path.join(directory_path, 'tts.keras'))
+
+
+def build_weapon_detector(directory_path):
+    import tensorflow as tf
+    from tensorflow import keras
+
+    # YOLOv8 TFLite layout: (4, 320, 320, 3) RGB input, (4, 4 + classes, anchors) output with normalized boxes
+    class_names = ['knife', 'pistol']
+    inputs = keras.Input((320, 320, 3), batch_size=4)
+    x = inputs
+    for filters in (16, 32, 64):
+        x = keras.layers.Conv2D(filters, 3, strides=2, padding='same', activation='relu')(x)
+    x = keras.layers.Conv2D(4 + len(class_names), 1, activation='sigmoid')(x)
+    x = keras.layers.Reshape((-1, 4 + len(class_names)))(x)
+    outputs = keras.layers.Permute((2, 1))(x)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras.Model(inputs, outputs))
+    with open(os.path.join(directory_path, 'weapons.tflite'), 'wb') as file:
+        file.write(converter.convert())
+    with open(os.path.join(directory_path, 'weapons.json'), 'w') as file:
+        json.dump(class_names, file)
+
+
+def draw_face(size):
+    """
+    Draws a grayscale cartoon face that the Haar frontal face cascade detects.
+
+    Args:
+        size (int): Side of the square image.
+
+    Returns:
+        numpy.ndarray: Image of shape (size, size).
+    """
+    face = np.full((size, size), 90, np.uint8)
+    cv2.ellipse(face, (size // 2, size // 2), (int(size * 0.38), int(size * 0.48)), 0, 0, 360, 200, -1)
+    for side in (-1, 1):
+        eye_x = size // 2 + side * int(size * 0.17)
+        cv2.ellipse(face, (eye_x, int(size * 0.33)), (int(size * 0.11), int(size * 0.03)), 0, 0, 360, 60, -1)
+        cv2.ellipse(face, (eye_x, int(size * 0.42)), (int(size * 0.08), int(size * 0.045)), 0, 0, 360, 40, -1)
+    cv2.ellipse(face, (size // 2, int(size * 0.58)), (int(size * 0.05), int(size * 0.1)), 0, 0, 360, 215, -1)
+    cv2.ellipse(face, (size // 2, int(size * 0.63)), (int(size * 0.06), int(size * 0.025)), 0, 0, 360, 120, -1)
+    cv2.ellipse(face, (size // 2, int(size * 0.76)), (int(size * 0.14), int(size * 0.035)), 0, 0, 360, 70, -1)
+    return cv2.GaussianBlur(face, (9, 9), 0)
+
+
+def build_inputs(directory_path, rng):
+    image = cv2.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (7, 7), 0)
+    image[140:340, 220:420] = draw_face(200)[:, :, np.newaxis]
+    cv2.imwrite(os.path.join(directory_path, 'image.jpg'), image)
+
+    writer = cv2.VideoWriter(os.path.join(directory_path, 'video.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), 30, (640, 480))
+    for i in range(90):
+        writer.write(np.roll(image, 4 * i, axis=1))
+    writer.release()
+
+    sample_rate = 22050
+    time_axis = np.arange(3 * sample_rate) / sample_rate
+    audio = 0.3 * np.sin(2 * np.pi * 220 * time_axis) + 0.05 * rng.normal(size=len(time_axis))
+    with wave.open(os.path.join(directory_path, 'audio.wav'), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def build_fixtures(directory_path):
+    """
+    Builds every fixture in a directory.
+
+    Args:
+        directory_path (str): Directory to write the fixtures to.
+
+    Returns:
+        dict: Environment variables that point the backend at the fixtures.
+    """
+    rng = np.random.default_rng(0)
+    models_path = os.path.join(directory_path, 'models')
+    weights_path = os.path.join(directory_path, 'weights')
+    os.makedirs(models_path, exist_ok=True)
+    os.makedirs(weights_path, exist_ok=True)
+
+    build_tabular_models(models_path, rng)
+    build_forecast_models(models_path, rng)
+    build_keras_models(weights_path)
+    build_weapon_detector(weights_path)
+    build_inputs(directory_path, rng)
+    return fixture_environment(directory_path)
+
+
+def fixture_environment(directory_path):
+    """
+    Returns the environment variables that point the backend at a fixture directory.
+
+    Args:
+        directory_path (str): Directory containing the fixtures.
+
+    Returns:
+        dict: MODELS_DIR, FER_WEIGHTS, TTS_WEIGHTS and WEAPON_WEIGHTS.
+    """
+    directory_path = os.path.abspath(directory_path)
+    return {
+        'MODELS_DIR': os.path.join(directory_path, 'models'),
+        'FER_WEIGHTS': os.path.join(directory_path, 'weights', 'fer.keras'),
+        'TTS_WEIGHTS': os.path.join(directory_path, 'weights', 'tts.keras'),
+        'WEAPON_WEIGHTS': os.path.join(directory_path, 'weights', 'weapons.tflite'),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', help='Directory to write the fixtures to.')
+    build_fixtures(parser.parse_args().directory)
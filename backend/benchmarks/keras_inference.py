@@ -0,0 +1,69 @@
+"""
+Compares `model.predict` with the compiled graph-mode inference function.
+
+For the FER and STT models, each inference path runs in its own interpreter so that its
+peak RSS is measured separately. The per-call latency is measured on a single input, the
+way the routes call the models. When FER_WEIGHTS or TTS_WEIGHTS points at a TFLite model,
+e.g. one written by `quantize.py`, only its interpreter is measured, since it has no
+`model.predict`.
+
+Usage (from the backend directory):
+    python benchmarks/keras_inference.py --repeat 200 --stt-frames 400
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WEIGHTS_VARIABLES = {'fer': 'FER_WEIGHTS', 'tts': 'TTS_WEIGHTS'}
+
+MEASURE = """
+import json, resource, sys, time
+import numpy as np
+model_name, path, repeat, stt_frames = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+module = __import__(model_name)
+keras_model = module.load_model()
+if model_name == 'fer':
+    inputs = np.random.rand(1, 48, 48, 1).astype(np.float32)
+else:
+    inputs = np.random.randn(1, stt_frames, module.num_frequency_bins).astype(np.float32)
+if path == 'predict':
+    run = lambda: keras_model.predict(inputs, verbose=0)
+else:
+    run = lambda: np.asarray(module.infer(inputs))
+run()
+latencies = []
+for _ in range(repeat):
+    start = time.perf_counter()
+    run()
+    latencies.append(time.perf_counter() - start)
+latencies.sort()
+print(json.dumps({'mean_ms': 1000 * sum(latencies) / len(latencies), 'p50_ms': 1000 * latencies[len(latencies) // 2],
+                  'p99_ms': 1000 * latencies[int(len(latencies) * 0.99) - 1],
+                  'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per model and inference path.')
+    parser.add_argument('--stt-frames', type=int, default=400, help='Spectrogram frames of the STT input.')
+    args = parser.parse_args()
+
+    print(f"{'model':<6}{'path':<10}{'mean (ms)':>11}{'p50 (ms)':>10}{'p99 (ms)':>10}{'peak RSS (MB)':>15}")
+    for model_name in ('fer', 'tts'):
+        tflite = os.environ.get(WEIGHTS_VARIABLES[model_name], '').endswith('.tflite')
+        for path in (('compiled',) if tflite else ('predict', 'compiled')):
+            output = subprocess.run([sys.executable, '-c', MEASURE, model_name, path, str(args.repeat),
+                                     str(args.stt_frames)], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                    check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{model_name:<6}{path:<10}{result['mean_ms']:>11.2f}{result['p50_ms']:>10.2f}"
+                  f"{result['p99_ms']:>10.2f}{result['peak_rss_mb']:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""
+Load test of every backend route, for comparing throughput between commits.
+
+The app is run against the stand-in models of `fixtures.py`, either in this process through
+the Flask test client or as a server subprocess driven over HTTP. Each route receives
+`--requests` requests from `--concurrency` threads. The report gives p50/p95/p99 latency,
+requests per second and errors for each route, plus the peak RSS of the server, as JSON.
+With `--background-route`, another route is kept under load during the whole run, e.g. to
+check that the tabular routes keep their tail latency while STT is saturated. Everything
+runs offline on CPU.
+
+Usage (from the backend directory):
+    python benchmarks/load_test.py --mode subprocess --concurrency 8 --requests 200 --output report.json
+    python benchmarks/load_test.py --routes wine_prediction bitcoin_range --mode inprocess
+    python benchmarks/load_test.py --server asgi --routes pokemon_prediction --background-route transcribe_audio
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fixtures import build_fixtures, fixture_environment  # noqa: E402
+
+
+def batch_rows(schema, rows=1000):
+    values = np.random.default_rng(0).normal(size=(rows, len(schema.features))).round(3)
+    values[:, schema.integer_positions] = values[:, schema.integer_positions].round()
+    return values.tolist()
+
+
+def build_routes(fixtures_path):
+    """
+    Describes the request sent to each route.
+
+    Args:
+        fixtures_path (str): Directory containing the fixtures.
+
+    Returns:
+        dict: For each route name, the HTTP method, the path and the request arguments.
+    """
+    from models import ModelLoader
+    from schemas import SCHEMAS
+
+    with open(os.path.join(fixtures_path, 'image.jpg'), 'rb') as file:
+        image = file.read()
+    with open(os.path.join(fixtures_path, 'audio.wav'), 'rb') as file:
+        audio = file.read()
+    with open(os.path.join(fixtures_path, 'video.mp4'), 'rb') as file:
+        video = file.read()
+
+    routes = {}
+    for model in ModelLoader.SARIMAX_MODELS:
+        routes[f'{model}_prediction'] = ('GET', f'/{model}_prediction', {'params': {'input_date': '2022-03-01'}})
+    routes['bitcoin_range'] = ('GET', '/bitcoin_prediction', {'params': {'start': '2022-01-01', 'end': '2022-03-31'}})
+
+    routes.update({
+        'wine_prediction': ('GET', '/wine_prediction',
+                            {'params': {'volatile_acidity': 0.5, 'density': 0.99, 'alcohol': 12.3}}),
+        'stroke_prediction': ('GET', '/stroke_prediction',
+                              {'params': {'age': 65, 'hypertension': 1, 'heart_disease': 0, 'avg_glucose_level': 90}}),
+        'pokemon_prediction': ('GET', '/pokemon_prediction', {'params': {'base_egg_steps': 10000, 'percentage_male': 60}}),
+        'heart_failure_prediction': ('GET', '/heart_failure_prediction',
+                                     {'params': {'ejection_fraction': 35, 'time': 200}}),
+        'drug_prediction': ('GET', '/drug_prediction',
+                            {'params': {'age': 50, 'sex': 1, 'bp': 1, 'cholesterol': 1, 'na_to_k': 10}}),
+        'breast_cancer_prediction': ('GET', '/breast_cancer_prediction',
+                                     {'params': {'concave_points_worst': 0.05, 'perimeter_worst': 100}}),
+    })
+    for model, schema in SCHEMAS.items():
+        routes[f'{model}_batch_prediction'] = ('POST', f'/{model}_batch_prediction', {'json': batch_rows(schema)})
+
+    routes['recognize_emotion'] = ('POST', '/recognize_emotion', {'files': {'file': ('image.jpg', image)}})
+    routes['transcribe_audio'] = ('POST', '/transcribe_audio', {'files': {'audio': ('audio.wav', audio)}})
+    routes['detect_weapons'] = ('POST', '/detect_weapons', {'files': {'file': ('image.jpg', image)}})
+    routes['detect_weapons_video'] = ('POST', '/detect_weapons_video', {'files': {'file': ('video.mp4', video)}})
+    return routes
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        """
+        Initializes the HttpClient class, which sends requests to a server subprocess with one session per thread.
+
+        Args:
+            base_url (str): URL of the server, e.g. 'http://127.0.0.1:5000'.
+        """
+        self.base_url = base_url
+        self.sessions = threading.local()
+
+    def send(self, method, path, arguments):
+        import requests
+
+        session = getattr(self.sessions, 'session', None)
+        if session is None:
+            session = self.sessions.session = requests.Session()
+        # Keep '&' in paths such as /s&p_prediction out of the query string
+        response = session.request(method, self.base_url + path.replace('&', '%26'), **arguments)
+        return response.status_code
+
+
+class TestClient:
+    def __init__(self, app):
+        """
+        Initializes the TestClient class, which sends requests to the app in this process.
+
+        Args:
+            app (flask.Flask): The backend app.
+        """
+        self.app = app
+
+    def send(self, method, path, arguments):
+        import io
+
+        arguments = dict(arguments)
+        if 'params' in arguments:
+            arguments['query_string'] = arguments.pop('params')
+        if 'files' in arguments:
+            arguments['data'] = {field: (io.BytesIO(content), filename)
+                                 for field, (filename, content) in arguments.pop('files').items()}
+        response = self.app.test_client().open(path, method=method, **arguments)
+        return response.status_code
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def run_route(client, method, path, arguments, num_requests, concurrency):
+    """
+    Sends the requests of one route and summarizes their latencies.
+
+    Returns:
+        dict: Latency percentiles in milliseconds, requests per second and number of errors.
+    """
+    def timed_request(_):
+        start = time.perf_counter()
+        try:
+            status = client.send(method, path, arguments)
+        except Exception:
+            status = None
+        return time.perf_counter() - start, status
+
+    # One untimed request so lazy loading and caches are not measured as latency
+    client.send(method, path, arguments)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed_request, range(num_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p95_ms': 1000 * percentile(latencies, 0.95),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+        'requests_per_second': num_requests / elapsed,
+        'errors': sum(status != 200 for _, status in results),
+    }
+
+
+class BackgroundLoad:
+    def __init__(self, client, method, path, arguments, concurrency):
+        """
+        Initializes the BackgroundLoad class, which keeps a route under load from several threads until stopped.
+
+        Args:
+            client: HttpClient or TestClient used to send the requests.
+            method (str): HTTP method of the route.
+            path (str): Path of the route.
+            arguments (dict): Request arguments.
+            concurrency (int): Number of threads sending requests.
+        """
+        self.stopping = threading.Event()
+        self.status_codes = {}
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run, args=(client, method, path, arguments), daemon=True)
+                        for _ in range(concurrency)]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self, client, method, path, arguments):
+        while not self.stopping.is_set():
+            try:
+                status = client.send(method, path, arguments)
+            except Exception:
+                status = 'error'
+            with self.lock:
+                self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+            if status == 429 or status == 503:
+                # Back off like a client honoring Retry-After would, instead of spinning on rejections
+                time.sleep(0.05)
+
+    def stop(self):
+        """
+        Stops the load and waits for the requests in flight.
+
+        Returns:
+            dict: Number of responses for each status code.
+        """
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+        return dict(sorted(self.status_codes.items()))
+
+
+def process_tree_peak_rss_mb(pid):
+    """
+    Sums the peak RSS (VmHWM) of a process and its descendants, from /proc.
+
+    Pages shared between forked workers are counted once per process, so for a prefork
+    server this is an upper bound.
+    """
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        total_kb += int(line.split()[1])
+            for children in glob.glob(f'/proc/{current}/task/*/children'):
+                with open(children) as file:
+                    pending.extend(int(child) for child in file.read().split())
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, environment):
+    """
+    Starts the backend as a subprocess and waits until it answers.
+
+    Returns:
+        tuple: The process and its base URL.
+    """
+    import requests
+
+    port = free_port()
+    if args.server == 'prefork':
+        command = [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers)]
+    elif args.server == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port)]
+    else:
+        command = [sys.executable, '-c', f"import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=environment, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode}")
+        try:
+            requests.get(base_url + '/cache_stats', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            # Refused before the socket is bound, timed out while the prefork workers load their models
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"The server did not answer within {args.startup_timeout} s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', help='Fixture directory. Built in a temporary directory when omitted.')
+    parser.add_argument('--mode', choices=['inprocess', 'subprocess'], default='subprocess',
+                        help='Run the app in this process or as a server subprocess.')
+    parser.add_argument('--server', choices=['flask', 'prefork', 'asgi'], default='flask',
+                        help='Server started in subprocess mode: threaded Flask, serve.py or asgi.py under uvicorn.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Workers of the prefork server.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent requests per route.')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+    parser.add_argument('--routes', nargs='+', help='Routes to run. Defaults to all of them.')
+    parser.add_argument('--background-route', help='Route kept under load while the other routes are measured.')
+    parser.add_argument('--background-concurrency', type=int, default=8,
+                        help='Concurrent requests of the background route.')
+    parser.add_argument('--startup-timeout', type=float, default=120, help='Seconds to wait for the server.')
+    parser.add_argument('--output', help='File to write the JSON report to.')
+    args = parser.parse_args()
+
+    fixtures_path = args.fixtures
+    if fixtures_path is None:
+        fixtures_path = tempfile.mkdtemp(prefix='backend_fixtures_')
+    if not os.path.exists(os.path.join(fixtures_path, 'models')):
+        build_fixtures(fixtures_path)
+
+    environment = dict(os.environ, MODEL_WARMUP='eager', **fixture_environment(fixtures_path))
+    routes = build_routes(fixtures_path)
+    selected = args.routes or list(routes)
+
+    process = None
+    if args.mode == 'subprocess':
+        process, base_url = start_server(args, environment)
+        client = HttpClient(base_url)
+    else:
+        os.environ.update(environment)
+        os.chdir(BACKEND_DIR)
+        import server
+        client = TestClient(server.app)
+
+    report = {'commit': git_commit(), 'mode': args.mode, 'server': args.server if process else None,
+              'concurrency': args.concurrency, 'requests': args.requests, 'routes': {}}
+    background = None
+    try:
+        if args.background_route:
+            background = BackgroundLoad(client, *routes[args.background_route], args.background_concurrency)
+        for name in selected:
+            method, path, arguments = routes[name]
+            report['routes'][name] = run_route(client, method, path, arguments, args.requests, args.concurrency)
+            print(f"{name:<32}{report['routes'][name]['p50_ms']:>9.1f} ms p50"
+                  f"{report['routes'][name]['p99_ms']:>9.1f} ms p99"
+                  f"{report['routes'][name]['requests_per_second']:>9.1f} req/s", file=sys.stderr)
+        if background is not None:
+            report['background'] = {'route': args.background_route, 'concurrency': args.background_concurrency,
+                                    'status_codes': background.stop()}
+            background = None
+        if process is not None:
+            report['peak_rss_mb'] = process_tree_peak_rss_mb(process.pid)
+        else:
+            report['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    finally:
+        if background is not None:
+            background.stop()
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Measures the time-to-first-request of the backend for each model warmup mode.
+
+Each mode runs in a fresh interpreter, which imports `server` and sends one request
+through the Flask test client. The reported time goes from the start of the import to
+the end of the first response. 'eager' matches the previous behaviour, where every
+model was loaded before the app could serve.
+
+Usage (from the backend directory):
+    python benchmarks/startup.py --route "/wine_prediction?volatile_acidity=0.5&density=0.99&alcohol=12.3"
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST = """
+import json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+response = server.app.test_client().get(sys.argv[1])
+done = time.perf_counter()
+timings = {'import': imported - start, 'first_request': done - start, 'status': response.status_code}
+print('STARTUP_TIMINGS', json.dumps(timings), flush=True)
+"""
+
+# Prefix of the line carrying the timings, which the warmup thread's output can come after
+MARKER = 'STARTUP_TIMINGS '
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--route', default='/wine_prediction?volatile_acidity=0.5&density=0.99&alcohol=12.3',
+                        help='Route of the first request.')
+    parser.add_argument('--modes', nargs='+', default=['eager', 'lazy', 'background'],
+                        help='Values of MODEL_WARMUP to compare.')
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'import (s)':>12}{'first request (s)':>20}{'status':>8}")
+    for mode in args.modes:
+        env = dict(os.environ, MODEL_WARMUP=mode)
+        output = subprocess.run([sys.executable, '-c', FIRST_REQUEST, args.route], cwd=BACKEND_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        timings = json.loads(next(line for line in output.splitlines() if line.startswith(MARKER))[len(MARKER):])
+        print(f"{mode:<12}{timings['import']:>12.2f}{timings['first_request']:>20.2f}{timings['status']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Microbenchmark of the single-row input path of the tabular classifiers.
+
+Compares, for each of the six classifiers, the per-call latency of building a
+one-row pandas DataFrame (the previous input path) against `ModelLoader.predict_row`,
+which fills a preallocated NumPy row in the fitted column order.
+
+Usage (from the backend directory):
+    python benchmarks/tabular_inputs.py --repeat 2000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ModelLoader  # noqa: E402
+
+# Sample inputs for each model, in the order of `ModelLoader.FEATURES`
+SAMPLE_ROWS = {
+    'wine': (0.5, 0.99, 12.3),
+    'stroke': (65, 1, 0, 90.0),
+    'pokemon': (10000, 60.0),
+    'heart_failure': (35, 200),
+    'drug': (50, 1, 1, 1, 10.0),
+    'breast_cancer': (0.05, 100.0),
+}
+
+
+def dataframe_predict(model_loader, model, values):
+    """Scores one row the way the prediction methods did before, through a one-row DataFrame."""
+    input_data = pd.DataFrame({column: [value] for column, value in zip(ModelLoader.FEATURES[model], values)})
+    return model_loader.models[model].predict(input_data[model_loader.input_columns[model]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=2000, help='Calls per model and input path.')
+    args = parser.parse_args()
+
+    model_loader = ModelLoader()
+    model_loader.warm()
+
+    print(f"{'model':<15}{'DataFrame (us)':>16}{'NumPy row (us)':>16}{'speedup':>10}")
+    for model, values in SAMPLE_ROWS.items():
+        if model not in model_loader.models:
+            print(f"{model:<15}{'not loaded':>16}")
+            continue
+
+        # Both paths must agree before their timings are compared
+        assert dataframe_predict(model_loader, model, values)[0] == model_loader.predict_row(model, *values)[0]
+
+        dataframe_time = timeit.timeit(lambda: dataframe_predict(model_loader, model, values), number=args.repeat)
+        row_time = timeit.timeit(lambda: model_loader.predict_row(model, *values), number=args.repeat)
+
+        dataframe_us = dataframe_time / args.repeat * 1e6
+        row_us = row_time / args.repeat * 1e6
+        print(f"{model:<15}{dataframe_us:>16.1f}{row_us:>16.1f}{dataframe_us / row_us:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmarks weapon detection on a video against the real-time rate of the video.
+
+Each of `--streams` threads runs `weapons.detect_video` on the same video, like one upload
+or camera per core. For each stream the report gives the seconds of video processed per
+second of wall time: above 1 the stream keeps up in real time. Decoding every frame without
+detection is timed first, as the upper bound of the pipeline.
+
+Usage (from the backend directory):
+    python benchmarks/fixtures.py /tmp/fixtures
+    WEAPON_WEIGHTS=/tmp/fixtures/weights/weapons.tflite python benchmarks/weapon_detection.py /tmp/fixtures/video.mp4
+    python benchmarks/weapon_detection.py webcam.mp4 --streams 4 --sample-fps 10
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weapons  # noqa: E402
+
+
+def decode_only(path):
+    """
+    Decodes every frame of a video.
+
+    Returns:
+        tuple: The number of frames, the frame rate of the video and the seconds spent decoding.
+    """
+    capture = cv2.VideoCapture(path)
+    start = time.perf_counter()
+    frames = 0
+    while capture.read()[0]:
+        frames += 1
+    elapsed = time.perf_counter() - start
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return frames, fps, elapsed
+
+
+def run_stream(path, sample_fps):
+    start = time.perf_counter()
+    result = weapons.detect_video(path, sample_fps)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', help='Video to run the detector on.')
+    parser.add_argument('--streams', type=int, default=1, help='Videos processed at the same time, one per thread.')
+    parser.add_argument('--sample-fps', type=float, default=weapons.sample_fps, help='Frames per second detected.')
+    args = parser.parse_args()
+
+    frames, fps, elapsed = decode_only(args.video)
+    duration = frames / fps
+    print(f"Video: {frames} frames at {fps:.1f} fps ({duration:.1f}s), "
+          f"decode only: {frames / elapsed:.0f} fps, {duration / elapsed:.1f}x real time")
+
+    # Load the detector of every thread before timing
+    weapons.load_model()
+    with ThreadPoolExecutor(max_workers=args.streams) as executor:
+        list(executor.map(lambda _: weapons.get_detector(), range(args.streams)))
+        start = time.perf_counter()
+        runs = list(executor.map(lambda _: run_stream(args.video, args.sample_fps), range(args.streams)))
+        wall = time.perf_counter() - start
+
+    batch_size = weapons.get_detector().batch_size
+    print(f"Detection at {args.sample_fps:g} fps, batch {batch_size}, {weapons.num_threads} interpreter thread(s) "
+          f"per stream, {args.streams} stream(s):")
+    for i, (result, seconds) in enumerate(runs):
+        detections = sum(len(frame['detections']) for frame in result['frames'])
+        print(f"  stream {i}: {len(result['frames'])} frames detected in {seconds:.2f}s, "
+              f"{detections} detections, {duration / seconds:.1f}x real time")
+    print(f"Total: {args.streams * duration / wall:.1f} seconds of video per second")
+
+
+if __name__ == '__main__':
+    main()
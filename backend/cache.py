@@ -0,0 +1,333 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def file_version(path):
+    """
+    Computes a short hash of a file's contents, used as the version of a model.
+
+    Args:
+        path (str): Path of the model file.
+
+    Returns:
+        str: Hexadecimal digest of the file.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries):
+        """
+        Initializes the MemoryBackend class.
+
+        This class keeps the cached entries in the memory of the current process, evicting the least recently
+         used entry once `max_entries` is reached.
+
+        Args:
+            max_entries (int): Largest number of entries kept.
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """
+        Stores an entry.
+
+        Returns:
+            int: Number of entries evicted to make room for it.
+        """
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            evictions = 0
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evictions += 1
+            return evictions
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class DiskBackend:
+    def __init__(self, directory_path, max_entries):
+        """
+        Initializes the DiskBackend class.
+
+        This class keeps each cached entry as a small JSON file in a directory, so every worker process on the
+         machine shares the same entries. Pointing it at a tmpfs such as `/dev/shm` keeps the entries in shared memory.
+         A hit refreshes the file's modification time.
+
+        A store does not list the directory. It is scanned once the number of entries tracked in memory passes
+         `max_entries`, or after every 10% of `max_entries` new entries stored by this process, to account for the
+         other workers. When it holds more than `max_entries` entries, the oldest files are evicted in one batch down
+         to 90% of `max_entries`. With N workers the directory can briefly exceed `max_entries` by N times 10%.
+
+        Args:
+            directory_path (str): Directory holding the entries. It is created if it does not exist.
+            max_entries (int): Largest number of entries kept.
+        """
+        self.directory_path = directory_path
+        self.max_entries = max_entries
+        # New entries stored between scans, and entries left after an eviction
+        self.scan_every = max(1, max_entries // 10)
+        self.low_watermark = max_entries - self.scan_every
+        self.lock = threading.Lock()
+        os.makedirs(directory_path, exist_ok=True)
+        self.entry_count = len(self.list_entries())
+        self.stores_since_scan = 0
+
+    def list_entries(self):
+        return [entry for entry in os.scandir(self.directory_path) if entry.name.endswith('.json')]
+
+    def path(self, key):
+        return os.path.join(self.directory_path, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as file:
+                entry = json.load(file)
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            return None
+        return entry['value'], entry['stored_at']
+
+    def set(self, key, entry):
+        """
+        Stores an entry.
+
+        Returns:
+            int: Number of entries evicted to make room for it.
+        """
+        value, stored_at = entry
+        is_new = not os.path.exists(self.path(key))
+        # Write to a temporary file first so that other workers never read a partial entry
+        temporary_path = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'w') as file:
+            json.dump({'value': value, 'stored_at': stored_at}, file)
+        os.replace(temporary_path, self.path(key))
+
+        with self.lock:
+            self.entry_count += is_new
+            self.stores_since_scan += is_new
+            if self.entry_count <= self.max_entries and self.stores_since_scan < self.scan_every:
+                return 0
+            return self.evict()
+
+    def evict(self):
+        """
+        Scans the directory and, when it holds more than `max_entries` entries, removes the oldest down to
+         `low_watermark`. Called with the lock held.
+
+        Returns:
+            int: Number of entries evicted.
+        """
+        entries = self.list_entries()
+        self.stores_since_scan = 0
+        evictions = 0
+        if len(entries) > self.max_entries:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.low_watermark]:
+                try:
+                    os.remove(entry.path)
+                    evictions += 1
+                except OSError:
+                    pass
+        self.entry_count = len(entries) - evictions
+        return evictions
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            return
+        with self.lock:
+            self.entry_count -= 1
+
+
+class ResultCache:
+    def __init__(self, backend, ttl_seconds=None):
+        """
+        Initializes the ResultCache class.
+
+        This class stores the results of the image and audio pipelines keyed by a hash of the uploaded bytes and the
+         version of the model that produced them, so a re-submitted file skips the pipeline.
+
+        Args:
+            backend (MemoryBackend or DiskBackend): Where the entries are stored.
+            ttl_seconds (float, optional): Seconds after which an entry expires. Entries never expire when it is None.
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.counters_lock = threading.Lock()
+
+    @staticmethod
+    def key(data, model_version):
+        """
+        Computes the cache key of an upload.
+
+        Args:
+            data (bytes): The uploaded file.
+            model_version (str): Version of the model that processes it.
+
+        Returns:
+            str: Hexadecimal key.
+        """
+        digest = hashlib.blake2b(data, digest_size=16)
+        digest.update(model_version.encode())
+        return digest.hexdigest()
+
+    def count(self, counter, amount=1):
+        with self.counters_lock:
+            self.counters[counter] += amount
+
+    def lookup(self, key):
+        """
+        Looks up a result.
+
+        Args:
+            key (str): Key returned by `key`.
+
+        Returns:
+            tuple: Whether the result was found, and the result.
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if self.ttl_seconds is None or time.time() - stored_at < self.ttl_seconds:
+                self.count('hits')
+                return True, value
+            # Expired entries count as evictions
+            self.backend.delete(key)
+            self.count('evictions')
+        self.count('misses')
+        return False, None
+
+    def store(self, key, value):
+        """
+        Stores a result.
+
+        Args:
+            key (str): Key returned by `key`.
+            value: JSON-serializable result.
+        """
+        self.count('evictions', self.backend.set(key, (value, time.time())))
+
+    def stats(self):
+        with self.counters_lock:
+            return dict(self.counters)
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Initializes the SingleFlight class.
+
+        This class lets concurrent callers that ask for the same key share one computation: the first caller runs it,
+         and the others wait for its result (or its exception) instead of running their own.
+        """
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.shared = 0
+
+    def run(self, key, compute):
+        """
+        Runs a computation, unless one with the same key is already running.
+
+        Args:
+            key (str): Key of the computation.
+            compute (callable): Function that computes the result.
+
+        Returns:
+            The result of `compute`, computed by this caller or by the concurrent caller that ran it first.
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = compute()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    def stats(self):
+        with self.lock:
+            return {'in_flight': len(self.calls), 'shared': self.shared}
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        """
+        Initializes the AsyncSingleFlight class.
+
+        This class is the event loop counterpart of `SingleFlight`. The first caller of a key starts its computation as
+         a task, and the others await that task instead of starting their own, so they take no thread while they wait.
+         It must only be used from the thread running the event loop.
+        """
+        self.calls = {}
+        self.shared = 0
+
+    async def run(self, key, compute):
+        """
+        Runs a computation, unless one with the same key is already running.
+
+        A caller that is cancelled, e.g. because its client disconnected, stops waiting without cancelling the
+         computation the others are waiting for.
+
+        Args:
+            key (str): Key of the computation.
+            compute (callable): Coroutine function that computes the result.
+
+        Returns:
+            The result of `compute`, computed for this caller or for the concurrent caller that started it first.
+        """
+        task = self.calls.get(key)
+        if task is None:
+            task = self.calls[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(functools.partial(self.forget, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def forget(self, key, task):
+        del self.calls[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved when every caller was cancelled
+            task.exception()
+
+    def stats(self):
+        return {'in_flight': len(self.calls), 'shared': self.shared}
@@ -0,0 +1,382 @@
+"""
+Compiled, array-backed form of the tabular classifiers.
+
+`compile_estimator` turns a fitted sklearn classifier into a handful of NumPy arrays, and
+`CompiledModel` evaluates them with vectorized NumPy, returning exactly what the
+estimator's `predict` returns:
+- trees and forests become flat node arrays
+- linear classifiers become a coefficient matrix and an intercept
+- scalers in a pipeline become elementwise steps
+
+The arrays are saved as `<name>.compiled.npz` next to the pickles. Loading one is a few
+array reads with `allow_pickle=False`, instead of rebuilding the whole Python object
+graph, and it does not need the sklearn version that pickled the model.
+
+Supported estimators: DecisionTreeClassifier, RandomForestClassifier,
+ExtraTreesClassifier and linear classifiers (e.g. LogisticRegression), optionally behind
+StandardScaler or MinMaxScaler steps in a Pipeline. Other models, e.g. the SARIMAX
+forecasts, are left as pickles.
+
+Usage (from the backend directory):
+    python compiled.py ../models
+"""
+import argparse
+import os
+import pickle
+import warnings
+
+import numpy as np
+
+COMPILED_SUFFIX = '.compiled.npz'
+
+# Value of `children_left` at the leaves of an sklearn tree
+TREE_LEAF = -1
+
+
+class CompiledModel:
+    def __init__(self, arrays):
+        """
+        Initializes the CompiledModel class.
+
+        Parameters:
+        - arrays (dict): Arrays produced by `compile_estimator`, or an open `.compiled.npz` file.
+        """
+        self.kind = str(arrays['kind'])
+        self.classes_ = arrays['classes']
+        if 'feature_names' in arrays:
+            self.feature_names_in_ = arrays['feature_names']
+
+        # Elementwise steps of the scalers, applied in order
+        self.steps = [(str(name), arrays[f'step{i}']) for i, name in enumerate(arrays['step_names'])]
+
+        if self.kind == 'linear':
+            self.coef = arrays['coef']
+            self.intercept = arrays['intercept']
+        else:
+            self.feature = arrays['feature']
+            self.threshold = arrays['threshold']
+            self.leaf_values = arrays['leaf_values']
+            self.roots = arrays['roots']
+            self.max_depth = int(arrays['max_depth'])
+            # Right and left child of every node side by side, so that a node's next node is
+            # children[2 * node + go_left]. Leaves point to themselves, so rows that reach a
+            # leaf early stay there without a separate check.
+            nodes = np.arange(len(self.feature))
+            is_leaf = arrays['children_left'] == TREE_LEAF
+            self.children = np.empty(2 * len(nodes), dtype=np.intp)
+            self.children[0::2] = np.where(is_leaf, nodes, arrays['children_right'])
+            self.children[1::2] = np.where(is_leaf, nodes, arrays['children_left'])
+
+    def transform(self, X):
+        """
+        Applies the scaler steps, with the same operations in the same order as sklearn.
+        """
+        X = np.array(X, dtype=np.float64)
+        for name, values in self.steps:
+            if name == 'subtract':
+                X -= values
+            elif name == 'divide':
+                X /= values
+            elif name == 'multiply':
+                X *= values
+            elif name == 'add':
+                X += values
+            elif name == 'clip':
+                np.clip(X, values[0], values[1], out=X)
+        return X
+
+    def apply(self, X):
+        """
+        Finds the leaf reached by every row in every tree.
+
+        All rows and trees descend together, one level per iteration.
+
+        Parameters:
+        - X (numpy.ndarray): (n, features) input matrix.
+
+        Returns:
+        - leaves (numpy.ndarray): (trees, n) node indices into the flat node arrays.
+        """
+        # Trees split on float32 values, like sklearn's tree predict
+        X = np.ascontiguousarray(X, dtype=np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+        X = X.ravel()
+        row_starts = np.arange(n_rows) * n_features
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[row_starts + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_left]
+        return nodes
+
+    def predict(self, X):
+        """
+        Predicts the class of every row, like the compiled estimator's `predict`.
+
+        Inputs must be finite: rows with NaN follow the right branch of every split instead of
+        sklearn's missing-value branch.
+
+        Parameters:
+        - X (numpy.ndarray or pd.DataFrame): (n, features) input matrix in the fitted column order.
+
+        Returns:
+        - predictions (numpy.ndarray): Predicted class of each row.
+        """
+        X = self.transform(X)
+
+        if self.kind == 'linear':
+            # coef keeps the estimator's shape, (classes, features) or (features,), so the same product is computed
+            scores = X @ self.coef.T + self.intercept
+            if scores.ndim == 1 or scores.shape[1] == 1:
+                indices = (scores.ravel() > 0).astype(int)
+            else:
+                indices = scores.argmax(axis=1)
+            return self.classes_.take(indices, axis=0)
+
+        leaves = self.apply(X)
+        # Sum the trees one at a time, in the order sklearn's forest accumulates them
+        proba = self.leaf_values[leaves[0]].copy()
+        for tree_leaves in leaves[1:]:
+            proba += self.leaf_values[tree_leaves]
+        if self.kind == 'forest':
+            proba /= len(self.roots)
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0)
+
+
+def tree_leaf_values(tree, n_classes, normalize):
+    """
+    Returns the class scores of every node of a fitted tree.
+
+    Parameters:
+    - tree (DecisionTreeClassifier): The fitted tree.
+    - n_classes (int): Number of classes.
+    - normalize (bool): Return the probabilities used by `predict_proba` instead of the raw node values.
+    """
+    import sklearn
+    from sklearn.utils.fixes import parse_version
+
+    values = tree.tree_.value[:, 0, :n_classes].astype(np.float64)
+    # Before sklearn 1.4 the nodes held weighted counts, normalized in `predict_proba`
+    if normalize and parse_version(sklearn.__version__) < parse_version('1.4'):
+        normalizer = values.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values = values / normalizer
+    return values
+
+
+def compile_trees(trees, n_classes, normalize):
+    """
+    Concatenates the nodes of several trees into flat arrays.
+
+    The child indices are offset so that they point into the concatenated arrays, and
+    the root of each tree is recorded in `roots`.
+    """
+    arrays = {name: [] for name in ('children_left', 'children_right', 'feature', 'threshold', 'leaf_values')}
+    roots = []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        nodes = tree.tree_
+        is_leaf = nodes.children_left == TREE_LEAF
+        arrays['children_left'].append(np.where(is_leaf, TREE_LEAF, nodes.children_left + offset))
+        arrays['children_right'].append(np.where(is_leaf, TREE_LEAF, nodes.children_right + offset))
+        # Leaves have no feature; any valid column keeps the vectorized lookup in bounds
+        arrays['feature'].append(np.where(is_leaf, 0, nodes.feature))
+        arrays['threshold'].append(nodes.threshold)
+        arrays['leaf_values'].append(tree_leaf_values(tree, n_classes, normalize))
+        roots.append(offset)
+        offset += nodes.node_count
+        max_depth = max(max_depth, nodes.max_depth)
+
+    compiled = {name: np.concatenate(values) for name, values in arrays.items()}
+    compiled['children_left'] = compiled['children_left'].astype(np.intp)
+    compiled['children_right'] = compiled['children_right'].astype(np.intp)
+    compiled['feature'] = compiled['feature'].astype(np.intp)
+    compiled['roots'] = np.array(roots, dtype=np.intp)
+    compiled['max_depth'] = np.array(max_depth)
+    return compiled
+
+
+def compile_steps(transformers):
+    """
+    Converts the scalers of a pipeline into elementwise steps.
+
+    Returns:
+    - names (list of str): Name of each step: 'subtract', 'divide', 'multiply', 'add' or 'clip'.
+    - values (list of numpy.ndarray): Operand of each step.
+    """
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+    names, values = [], []
+    for transformer in transformers:
+        if transformer is None or transformer == 'passthrough':
+            continue
+        if isinstance(transformer, StandardScaler):
+            if transformer.with_mean:
+                names.append('subtract')
+                values.append(transformer.mean_)
+            if transformer.with_std:
+                names.append('divide')
+                values.append(transformer.scale_)
+        elif isinstance(transformer, MinMaxScaler):
+            names += ['multiply', 'add']
+            values += [transformer.scale_, transformer.min_]
+            if transformer.clip:
+                names.append('clip')
+                values.append(np.array(transformer.feature_range, dtype=np.float64))
+        else:
+            raise TypeError(f"Unsupported pipeline step {type(transformer).__name__}")
+    return names, values
+
+
+def compile_estimator(estimator):
+    """
+    Compiles a fitted sklearn classifier into arrays.
+
+    Parameters:
+    - estimator: The fitted classifier or pipeline.
+
+    Returns:
+    - arrays (dict of numpy.ndarray): Arrays that `CompiledModel` evaluates.
+
+    Raises:
+    - TypeError: When the estimator is not supported.
+    """
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.linear_model._base import LinearClassifierMixin
+    from sklearn.pipeline import Pipeline
+    from sklearn.tree import DecisionTreeClassifier
+
+    transformers = []
+    final = estimator
+    if isinstance(estimator, Pipeline):
+        transformers = [step for _, step in estimator.steps[:-1]]
+        final = estimator.steps[-1][1]
+
+    if getattr(final, 'n_outputs_', 1) != 1:
+        raise TypeError("Multi-output classifiers are not supported")
+
+    if isinstance(final, DecisionTreeClassifier):
+        arrays = compile_trees([final], final.n_classes_, normalize=False)
+        arrays['kind'] = np.array('tree')
+    elif isinstance(final, (RandomForestClassifier, ExtraTreesClassifier)):
+        arrays = compile_trees(final.estimators_, final.n_classes_, normalize=True)
+        arrays['kind'] = np.array('forest')
+    elif isinstance(final, LinearClassifierMixin):
+        arrays = {'kind': np.array('linear'), 'coef': final.coef_.astype(np.float64),
+                  'intercept': np.atleast_1d(final.intercept_).astype(np.float64)}
+    else:
+        raise TypeError(f"Unsupported estimator {type(final).__name__}")
+
+    classes = final.classes_
+    # Store string labels as a fixed-width array so that they load without pickle
+    arrays['classes'] = classes.astype(str) if classes.dtype == object else classes
+
+    names, values = compile_steps(transformers)
+    arrays['step_names'] = np.array(names, dtype=str)
+    for i, value in enumerate(values):
+        arrays[f'step{i}'] = np.asarray(value, dtype=np.float64)
+
+    feature_names = getattr(estimator, 'feature_names_in_', None)
+    if feature_names is not None:
+        arrays['feature_names'] = np.asarray(feature_names, dtype=str)
+    return arrays
+
+
+def verification_inputs(estimator, arrays, n_rows=2000, seed=0):
+    """
+    Builds inputs that exercise a compiled model, including values on and right next to every tree threshold.
+
+    Parameters:
+    - estimator: The fitted classifier or pipeline.
+    - arrays (dict): Its compiled arrays.
+    - n_rows (int): Number of rows.
+
+    Returns:
+    - X (numpy.ndarray): (n_rows, features) input matrix.
+    """
+    rng = np.random.default_rng(seed)
+    n_features = estimator.n_features_in_
+    X = rng.normal(size=(n_rows, n_features)) * 10
+
+    # Undo the standard scaler steps so that the random rows are spread like the training data
+    for i, name in reversed(list(enumerate(arrays['step_names']))):
+        if name == 'subtract':
+            X += arrays[f'step{i}']
+        elif name == 'divide':
+            X *= arrays[f'step{i}']
+
+    if 'threshold' in arrays:
+        is_split = arrays['children_left'] != TREE_LEAF
+        features = arrays['feature'][is_split]
+        thresholds = arrays['threshold'][is_split].astype(np.float32)
+        for column in range(n_features):
+            candidates = thresholds[features == column]
+            if len(candidates) == 0:
+                continue
+            candidates = np.concatenate([candidates, np.nextafter(candidates, np.float32(np.inf)),
+                                         np.nextafter(candidates, np.float32(-np.inf))])
+            chosen = rng.random(n_rows) < 0.5
+            X[chosen, column] = rng.choice(candidates, chosen.sum())
+    return X
+
+
+def compile_models(directory_path):
+    """
+    Saves a `.compiled.npz` copy of every supported pickled or joblib model in a directory.
+
+    Each compiled model is checked against the estimator's `predict` before it is saved.
+
+    Parameters:
+    - directory_path (str): Directory containing the models.
+    """
+    import joblib
+
+    for filename in sorted(os.listdir(directory_path)):
+        model_name, extension = os.path.splitext(filename)
+        if extension not in ('.pkl', '.joblib'):
+            continue
+        file_path = os.path.join(directory_path, filename)
+        if extension == '.joblib':
+            estimator = joblib.load(file_path)
+        else:
+            with open(file_path, 'rb') as file:
+                estimator = pickle.load(file)
+
+        try:
+            arrays = compile_estimator(estimator)
+        except TypeError as e:
+            print(f"Skipped {filename}: {e}")
+            continue
+
+        X = verification_inputs(estimator, arrays)
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            expected = estimator.predict(X)
+        if not np.array_equal(CompiledModel(arrays).predict(X), expected.astype(str) if expected.dtype == object
+                              else expected):
+            print(f"Skipped {filename}: the compiled model does not reproduce predict")
+            continue
+
+        np.savez(os.path.join(directory_path, model_name + COMPILED_SUFFIX), **arrays)
+        print(f"Saved {model_name}{COMPILED_SUFFIX}")
+
+
+def load_compiled(file_path):
+    """
+    Loads a compiled model.
+
+    Parameters:
+    - file_path (str): Path of the `.compiled.npz` file.
+
+    Returns:
+    - model (CompiledModel): The compiled model.
+    """
+    with np.load(file_path, allow_pickle=False) as arrays:
+        return CompiledModel({name: arrays[name] for name in arrays.files})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', nargs='?', default=os.environ.get('MODELS_DIR', os.path.join('..', 'models')),
+                        help='Directory containing the models. Defaults to MODELS_DIR or ../models.')
+    compile_models(parser.parse_args().directory)
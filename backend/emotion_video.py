@@ -0,0 +1,219 @@
+"""
+Builds the emotion timeline of a recorded video offline.
+
+A reader thread decodes the video and puts the frames sampled at `--fps` into a bounded
+queue, so decoding runs ahead of the detection without holding the whole video in memory.
+The faces of each frame are detected with the Haar cascade of `fer` in a thread pool, and
+cropped to the 48x48 grayscale input of the model right away. The crops of many frames
+are then run through the CNN together, in batches of about `--batch-size` faces.
+
+One JSON line is written per sampled frame, in the order of the video, with its time and
+the box and emotion of every face. The throughput is reported against decoding alone, the
+upper bound of the pipeline.
+
+Usage (from the backend directory):
+    python emotion_video.py session.mp4 --output timeline.jsonl --fps 5 --workers 4
+"""
+import argparse
+import collections
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import fer
+import metrics
+
+
+def sample_step(capture, fps):
+    """
+    Returns how many frames of a video there are per sampled frame.
+    """
+    video_fps = capture.get(cv2.CAP_PROP_FPS) or fps
+    return max(1, round(video_fps / fps)), video_fps
+
+
+def read_frames(capture, fps, frames, errors):
+    """
+    Decodes the sampled frames of a video into a queue. Runs on the reader thread.
+
+    Every frame is grabbed so that the position in the video advances, but only the sampled
+     frames are retrieved as images. A None item marks the end of the video.
+
+    Args:
+        capture (cv2.VideoCapture): The opened video.
+        fps (float): Frames per second to sample.
+        frames (queue.Queue): Bounded queue receiving (index, seconds, frame) items.
+        errors (list): Receives the exception that stopped the reader, if any.
+    """
+    try:
+        step, video_fps = sample_step(capture, fps)
+        index = 0
+        while True:
+            with metrics.stage('fer', 'decode'):
+                if not capture.grab():
+                    break
+                frame = capture.retrieve()[1] if index % step == 0 else None
+            if frame is not None:
+                frames.put((index, index / video_fps, frame))
+            index += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        frames.put(None)
+
+
+def detect(frame):
+    """
+    Detects the faces of a frame and crops them to the input size of the model.
+
+    Args:
+        frame (numpy.ndarray): The frame, in BGR, BGRA or grayscale.
+
+    Returns:
+        tuple: The (x, y, width, height) box of each face and its 48x48 grayscale crop.
+    """
+    grayscale_image = fer.to_grayscale(frame)
+    with metrics.stage('fer', 'detect'):
+        boxes = fer.detect_boxes(grayscale_image)
+    crops = [cv2.resize(grayscale_image[y:y + h, x:x + w], (48, 48)) for (x, y, w, h) in boxes]
+    return boxes, crops
+
+
+def write_frames(done, output):
+    """
+    Recognizes the emotions of the faces of a group of frames in one pass and writes their lines.
+
+    Args:
+        done (list): (index, seconds, boxes, crops) of each frame, in the order of the video.
+        output: File receiving the JSON lines.
+
+    Returns:
+        int: The number of faces recognized.
+    """
+    crops = [crop for _, _, _, frame_crops in done for crop in frame_crops]
+    emotions = iter(fer.emotionRecognition(crops) if crops else [])
+    for index, seconds, boxes, _ in done:
+        faces = [{'box': [int(value) for value in box], 'emotion': next(emotions)} for box in boxes]
+        output.write(json.dumps({'frame': index, 'time': round(seconds, 3), 'faces': faces}) + '\n')
+    return len(crops)
+
+
+def analyze(path, output, fps=5.0, workers=4, batch_size=256, queue_size=64):
+    """
+    Writes the emotion timeline of a video.
+
+    Args:
+        path (str): Path of the video.
+        output: File receiving one JSON line per sampled frame.
+        fps (float): Frames per second to sample.
+        workers (int): Threads detecting faces.
+        batch_size (int): Faces gathered before a pass of the model.
+        queue_size (int): Decoded frames waiting for detection, and frames being detected, at most.
+
+    Returns:
+        dict: The number of sampled frames and faces.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"The video {path} could not be opened")
+
+    frames = queue.Queue(maxsize=queue_size)
+    errors = []
+    reader = threading.Thread(target=read_frames, args=(capture, fps, frames, errors), name='video-reader', daemon=True)
+    reader.start()
+
+    # Frames being detected, in the order of the video, and detected frames waiting for the model
+    pending = collections.deque()
+    done = []
+    done_faces = 0
+    counts = {'frames': 0, 'faces': 0}
+
+    def collect():
+        nonlocal done_faces
+        index, seconds, future = pending.popleft()
+        boxes, crops = future.result()
+        done.append((index, seconds, boxes, crops))
+        done_faces += len(crops)
+        if done_faces >= batch_size:
+            flush()
+
+    def flush():
+        nonlocal done_faces
+        counts['frames'] += len(done)
+        counts['faces'] += write_frames(done, output)
+        done.clear()
+        done_faces = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='face-detection') as executor:
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            index, seconds, frame = item
+            pending.append((index, seconds, executor.submit(detect, frame)))
+            # Collect the detected frames in order, and bound the frames in flight
+            while pending and (pending[0][2].done() or len(pending) >= queue_size):
+                collect()
+        while pending:
+            collect()
+    flush()
+
+    reader.join()
+    capture.release()
+    if errors:
+        raise errors[0]
+    return counts
+
+
+def decode_only(path, fps):
+    """
+    Decodes the sampled frames of a video without processing them.
+
+    Returns:
+        tuple: The number of sampled frames, the duration of the video in seconds and the seconds spent decoding.
+    """
+    capture = cv2.VideoCapture(path)
+    step, video_fps = sample_step(capture, fps)
+    start = time.perf_counter()
+    index = sampled = 0
+    while capture.grab():
+        if index % step == 0:
+            capture.retrieve()
+            sampled += 1
+        index += 1
+    elapsed = time.perf_counter() - start
+    capture.release()
+    return sampled, index / video_fps, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', help='Video to analyze.')
+    parser.add_argument('--output', default='timeline.jsonl', help='JSONL file to write.')
+    parser.add_argument('--fps', type=float, default=5.0, help='Frames per second to sample.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Threads detecting faces.')
+    parser.add_argument('--batch-size', type=int, default=256, help='Faces per model pass.')
+    parser.add_argument('--queue-size', type=int, default=64, help='Decoded frames held in memory at most.')
+    args = parser.parse_args()
+
+    sampled, duration, decode_seconds = decode_only(args.video, args.fps)
+    fer.load_model()
+
+    start = time.perf_counter()
+    with open(args.output, 'w') as output:
+        counts = analyze(args.video, output, args.fps, args.workers, args.batch_size, args.queue_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"Analyzed {counts['frames']} frames ({duration:.1f} s of video, {counts['faces']} faces) in {elapsed:.1f} s: "
+          f"{counts['frames'] / elapsed:.1f} frames per second, {duration / elapsed:.1f} video-seconds per wall-second")
+    print(f"Decode only: {sampled / decode_seconds:.1f} frames per second, "
+          f"the pipeline runs at {decode_seconds / elapsed:.0%} of the decoding speed")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,65 +1,317 @@
 import cv2
 from PIL import Image
 import numpy as np
-import tensorflow as tf
-import matplotlib.pyplot as plt
 import tempfile
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import os
+import threading
+import functools
+from batching import MicroBatcher
+from cache import file_version
+import metrics
+import time
+from inference import compile_inference, compile_tflite_inference
 
 # Set TensorFlow logging level to only display errors
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # 0 = all messages, 1 = info, 2 = warnings, 3 = errors
 
-# FER Model
-model = tf.keras.models.load_model(r'deep_learning_models/weights/fer.keras')
+# FER Model, loaded on first use by `load_model`. A .tflite path, e.g. a model quantized by `quantize.py`, is served by
+# the TFLite interpreter instead of Keras.
+model_path = os.environ.get('FER_WEIGHTS', r'deep_learning_models/weights/fer.keras')
+model = None
+# Graph-mode inference function of the model, built by `load_model`
+infer = None
+model_lock = threading.Lock()
 
 
-def detectFaces(img):
+def load_model():
+    """
+    Loads the FER model and compiles its inference function the first time it is needed.
+
+    Returns:
+        tf.keras.Model or inference.TFLiteModel: The emotion recognition model.
+    """
+    global model, infer
+    with model_lock:
+        if model is None:
+            start = time.perf_counter()
+            if model_path.endswith('.tflite'):
+                loaded_model = infer = compile_tflite_inference(model_path, (1, 48, 48, 1))
+            else:
+                import tensorflow as tf
+                loaded_model = tf.keras.models.load_model(model_path)
+                infer = compile_inference(loaded_model, (1, 48, 48, 1))
+            model = loaded_model
+            metrics.model_load_seconds.set(time.perf_counter() - start, 'fer')
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def model_version():
+    """
+    Returns the version of the emotion recognition pipeline, used to key cached results.
+
+    Returns:
+        str: Hash of the model weights together with the face detection settings.
+    """
+    return f"{file_version(model_path)}:{max_detection_side}"
+
+
+# Batcher shared by concurrent requests, created on first use by `get_batcher`
+max_batch_size = int(os.environ.get('FER_MAX_BATCH_SIZE', 32))
+max_wait_ms = float(os.environ.get('FER_MAX_WAIT_MS', 5))
+batcher = None
+batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """
+    Creates the emotion recognition batcher the first time it is needed.
+
+    The batcher thread is started lazily so that it belongs to the worker process that uses it.
+
+    Returns:
+        MicroBatcher: The batcher that runs `emotionRecognition` on the faces of concurrent requests.
+    """
+    global batcher
+    with batcher_lock:
+        if batcher is None:
+            batcher = MicroBatcher(emotionRecognition, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                   name='fer-batcher')
+    return batcher
+
+
+# Haar cascade face detector, loaded once per thread by `get_face_cascade`
+face_cascades = threading.local()
+
+# Longest image side used for face detection; larger images are downscaled first
+max_detection_side = int(os.environ.get('FER_MAX_DETECTION_SIDE', 640))
+
+
+def get_face_cascade():
+    """
+    Loads the Haar cascade face detector the first time the current thread needs it.
+
+    A `cv2.CascadeClassifier` must not be shared between threads that detect at the same time, so each thread of a
+     worker keeps its own instance.
+
+    Returns:
+        cv2.CascadeClassifier: The frontal face detector.
+    """
+    face_cascade = getattr(face_cascades, 'classifier', None)
+    if face_cascade is None:
+        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        face_cascades.classifier = face_cascade
+    return face_cascade
+
+
+def to_grayscale(image):
+    """
+    Converts a BGR or BGRA image to grayscale, returning single-channel images unchanged.
+
+    Args:
+        image (numpy.ndarray): Image of shape (height, width, channels) or (height, width).
+
+    Returns:
+        numpy.ndarray: Grayscale image of shape (height, width).
+    """
+    if image.ndim == 3 and image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    if image.ndim == 3 and image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image.reshape(image.shape[:2])
+
+
+def detect_boxes(grayscale_image, scale_factor=1.1, min_neighbors=5, min_size=(48, 48), max_size=None, max_side=None):
+    """
+    Finds the face boxes in a grayscale image with the Haar cascade classifier.
+
+    When the longest side of the image is larger than `max_side`, the detection runs on a
+    downscaled copy and the boxes are mapped back to full resolution.
+
+    Parameters:
+    - grayscale_image (numpy.ndarray): Image of shape (height, width).
+    - scale_factor (float): How much the cascade shrinks the image at each scale.
+    - min_neighbors (int): Neighbouring detections needed to keep a face.
+      Higher values give fewer false positives.
+    - min_size (tuple of int): Smallest face (width, height) at full resolution.
+    - max_size (tuple of int, optional): Largest face (width, height) at full resolution.
+    - max_side (int): Longest image side used for detection. Defaults to
+      `max_detection_side`.
+
+    Returns:
+    - boxes (list of tuple): (x, y, width, height) of each face at full resolution.
+    """
+    if max_side is None:
+        max_side = max_detection_side
+
+    height, width = grayscale_image.shape
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        detection_image = cv2.resize(grayscale_image, (round(width * scale), round(height * scale)),
+                                     interpolation=cv2.INTER_AREA)
+    else:
+        detection_image = grayscale_image
+
+    options = {'minSize': (round(min_size[0] * scale), round(min_size[1] * scale))}
+    if max_size is not None:
+        options['maxSize'] = (round(max_size[0] * scale), round(max_size[1] * scale))
+    faces = get_face_cascade().detectMultiScale(detection_image, scaleFactor=scale_factor, minNeighbors=min_neighbors,
+                                                **options)
+
+    boxes = []
+    for (x, y, w, h) in faces:
+        x, y = int(x / scale), int(y / scale)
+        w, h = int(round(w / scale)), int(round(h / scale))
+        boxes.append((x, y, min(w, width - x), min(h, height - y)))
+    return boxes
+
+
+def detectFaces(img, scale_factor=1.1, min_neighbors=5, min_size=(48, 48), max_side=None):
     """
     Detects faces in the provided image.
 
     This function takes an image file and detects faces using
-    the Haar cascade classifier. It extracts the detected face
-    regions without any resizing or color conversion.
+    the Haar cascade classifier. The image is converted to grayscale
+    once and, when its longest side is larger than `max_side`, the
+    detection runs on a downscaled copy. The boxes are mapped back to
+    full resolution and the face regions are extracted from the
+    original image without any resizing or color conversion.
 
     Parameters:
-    - image: Image file containing faces.
+    - img: Image file containing faces.
+    - scale_factor (float): How much the cascade shrinks the image at each scale.
+    - min_neighbors (int): Neighbouring detections needed to keep a face.
+      Higher values give fewer false positives.
+    - min_size (tuple of int): Smallest face (width, height) at full resolution.
+    - max_side (int): Longest image side used for detection. Defaults to
+      `max_detection_side`.
 
     Returns:
     - face_regions (list): List of face images.
     """
-    # Load the face cascade classifier
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-    # Detect faces in the image
-    faces = face_cascade.detectMultiScale(img, scaleFactor=1.1, minNeighbors=1, minSize=(48, 48))
-
-    # Initialize a list to store face images
-    face_regions = []
+    with metrics.stage('fer', 'detect'):
+        # Convert to grayscale once and detect on a downscaled copy of large images
+        boxes = detect_boxes(to_grayscale(img), scale_factor, min_neighbors, min_size, max_side=max_side)
 
     # Extract the face regions from the original image
-    for (x, y, w, h) in faces:
-        face_region = img[y:y + h, x:x + w]
-        face_regions.append(face_region)
+    return [img[y:y + h, x:x + w] for (x, y, w, h) in boxes]
+
+
+class FaceTracker:
+    def __init__(self, margin=0.5, scale_factor=1.1, min_neighbors=5, min_size=(48, 48)):
+        """
+        Initializes the FaceTracker class.
+
+        This class follows one face through the frames of a video session. Once a face is
+        found, the next frame is only searched in a region of interest around its previous
+        box, for faces between half and twice its previous size. The full-frame cascade runs
+        only on the first frame and whenever the face is lost, so most frames cost a
+        fraction of a full detection.
+
+        Args:
+            margin (float, optional): Size of the region of interest around the previous box, as a fraction of the
+             box size added on every side. Defaults to 0.5.
+            scale_factor (float, optional): Scale step of the cascade.
+            min_neighbors (int, optional): Neighbouring detections needed to keep a face.
+            min_size (tuple of int, optional): Smallest face (width, height) of the full-frame detection.
+        """
+        self.margin = margin
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        # Box of the tracked face in the previous frame, None when no face is tracked
+        self.box = None
+        self.frames = 0
+        self.tracked_frames = 0
+        self.full_detections = 0
+
+    def search_region(self, grayscale_image):
+        """
+        Searches for the tracked face around its previous box.
+
+        Args:
+            grayscale_image (numpy.ndarray): The current frame in grayscale.
+
+        Returns:
+            tuple or None: The new (x, y, width, height) of the face, or None when it is not found.
+        """
+        height, width = grayscale_image.shape
+        x, y, w, h = self.box
+        x0, y0 = max(0, x - int(w * self.margin)), max(0, y - int(h * self.margin))
+        x1, y1 = min(width, x + w + int(w * self.margin)), min(height, y + h + int(h * self.margin))
+
+        min_size = (max(self.min_size[0], w // 2), max(self.min_size[1], h // 2))
+        boxes = detect_boxes(grayscale_image[y0:y1, x0:x1], self.scale_factor, self.min_neighbors, min_size,
+                             max_size=(w * 2, h * 2))
+        if not boxes:
+            return None
+
+        # Keep the detection closest to the previous position
+        center_x, center_y = x + w / 2 - x0, y + h / 2 - y0
+        bx, by, bw, bh = min(boxes, key=lambda b: (b[0] + b[2] / 2 - center_x) ** 2 + (b[1] + b[3] / 2 - center_y) ** 2)
+        return bx + x0, by + y0, bw, bh
+
+    def update(self, img):
+        """
+        Finds the tracked face in the next frame.
+
+        Args:
+            img (numpy.ndarray): The next frame, in BGR, BGRA or grayscale.
+
+        Returns:
+            tuple: The face region of the frame and its (x, y, width, height) box, or (None, None) when no face is
+             found. A new face is picked as the largest one of a full-frame detection.
+        """
+        self.frames += 1
+        grayscale_image = to_grayscale(img)
+
+        box = None
+        if self.box is not None:
+            with metrics.stage('fer', 'track'):
+                box = self.search_region(grayscale_image)
+            if box is not None:
+                self.tracked_frames += 1
+
+        if box is None:
+            self.full_detections += 1
+            with metrics.stage('fer', 'detect'):
+                boxes = detect_boxes(grayscale_image, self.scale_factor, self.min_neighbors, self.min_size)
+            box = max(boxes, key=lambda b: b[2] * b[3]) if boxes else None
+
+        self.box = box
+        if box is None:
+            return None, None
+        x, y, w, h = box
+        return img[y:y + h, x:x + w], box
+
+    def stats(self):
+        """
+        Returns the number of frames processed, found in the region of interest, and searched in full.
+
+        Returns:
+            dict: The frame counters of the session.
+        """
+        return {'frames': self.frames, 'tracked_frames': self.tracked_frames, 'full_detections': self.full_detections}
 
-    return face_regions
 
 def preprocess_images(images, target_size=(48, 48)):
     """
     Preprocesses a list of images for emotion recognition.
 
     This function performs the following preprocessing steps:
-    1. Converts each image to grayscale.
-    2. Resizes each image to the target size.
-    3. Normalizes pixel values to the range [0, 1].
-    4. Converts each image to a tensor and expands its dimensions to match the input shape of the model.
+    1. Converts each image to grayscale, unless it already has a single channel.
+    2. Resizes each image to the target size, writing it straight into one preallocated float32 batch.
+    3. Normalizes the pixel values of the whole batch to the range [0, 1] in place.
 
     Args:
-        images (list of numpy.ndarray): A list of images. Each image should be a numpy array of shape (height, width, channels).
-        target_size (tuple of int, optional): The target size for resizing each image. Defaults to (48, 48).
+        images (list of numpy.ndarray): A list of images. Each image should be a numpy array of shape (height, width,
+         channels) in BGR or BGRA order, or (height, width) when it is already grayscale.
+        target_size (tuple of int, optional): The target size (width, height) for resizing each image. Defaults to
+         (48, 48).
 
     Returns:
-        tensorflow.Tensor: A tensor of shape (num_images, target_size[0], target_size[1], 1) containing the preprocessed images.
+        numpy.ndarray: A float32 array of shape (num_images, target_size[1], target_size[0], 1) containing the
+         preprocessed images.
 
     Example:
         images = [image1, image2, image3]
@@ -68,25 +320,19 @@ def preprocess_images(images, target_size=(48, 48)):
 
     Notes:
         - The function uses OpenCV to convert images to grayscale and resize them.
-        - TensorFlow is used to normalize the images and convert them to tensors.
     """
-    processed_images = []
-    for image in images:
+    processed_images = np.empty((len(images), target_size[1], target_size[0], 1), dtype=np.float32)
+    for i, image in enumerate(images):
         # Convert to grayscale
-        grayscale_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Resize the image
-        resized_image = cv2.resize(grayscale_image, target_size)
+        grayscale_image = to_grayscale(image)
 
-        # Normalize the image
-        normalized_image = resized_image / 255.0
+        # Resize the image into its slot of the batch
+        processed_images[i, :, :, 0] = cv2.resize(grayscale_image, target_size)
 
-        # Convert image to a tensor and expand dimensions to match the input shape of the model
-        expanded_image = tf.expand_dims(tf.convert_to_tensor(normalized_image, dtype=tf.float32), axis=-1)
+    # Normalize the whole batch
+    processed_images /= 255.0
 
-        processed_images.append(expanded_image)
-
-    return tf.stack(processed_images)
+    return processed_images
 
 
 def emotionRecognition(faces):
@@ -110,8 +356,7 @@ def emotionRecognition(faces):
         print(emotions)  # Output: ['happy', 'neutral', 'sad']
 
     Notes:
-        - The function assumes the presence of a global `model` variable, which is a pre-trained emotion recognition
-         model.
+        - The pre-trained emotion recognition model is loaded by `load_model` on the first call.
         - The `preprocess_images` function is expected to be defined elsewhere in the codebase, which handles the
          preprocessing of face images.
 
@@ -121,17 +366,37 @@ def emotionRecognition(faces):
     label_mapping = {0: 'angry', 1: 'fear', 2: 'happy', 3: 'neutral', 4: 'sad', 5: 'surprise'}
 
     # Preprocess the faces
-    preprocessed_faces = preprocess_images(faces)
+    with metrics.stage('fer', 'preprocess'):
+        preprocessed_faces = preprocess_images(faces)
 
     # Make predictions for each face
-    predictions = model.predict(preprocessed_faces)
+    load_model()
+    with metrics.stage('fer', 'infer'):
+        predictions = np.asarray(infer(preprocessed_faces))
 
     # Convert predictions to emotion labels using the label mapping
-    predicted_emotions = [label_mapping[idx] for idx in np.argmax(predictions, axis=1)]
+    with metrics.stage('fer', 'postprocess'):
+        predicted_emotions = [label_mapping[idx] for idx in np.argmax(predictions, axis=1)]
 
     return predicted_emotions
 
 
+def emotionRecognitionBatched(faces):
+    """
+    Recognizes the emotions of a list of face images through the shared batcher.
+
+    The faces are queued together with the faces of other concurrent requests for up to `max_wait_ms`, and the
+     model runs once on the whole batch.
+
+    Args:
+        faces (list of numpy.ndarray): A list of face images.
+
+    Returns:
+        list of str: The predicted emotion label for each face image.
+    """
+    return get_batcher().map(faces)
+
+
 if __name__ == "__main__":
     # Path to the image file containing faces
     image_path = r"C:\Users\Joshua\Downloads\ezgif.com-gif-maker-3.jpg"  # Update this with your image path
@@ -0,0 +1,135 @@
+import os
+import threading
+
+import numpy as np
+
+try:
+    # LiteRT replaces the deprecated `tf.lite.Interpreter` when it is installed
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    Interpreter = None
+
+# Threads of each TFLite interpreter, left to the runtime when TFLITE_NUM_THREADS is not set
+tflite_num_threads = int(os.environ['TFLITE_NUM_THREADS']) if os.environ.get('TFLITE_NUM_THREADS') else None
+
+
+def new_interpreter(**kwargs):
+    """
+    Creates a TFLite interpreter, from LiteRT when it is installed and from TensorFlow otherwise.
+
+    TensorFlow is only imported here, so that importing the backend does not initialise it.
+
+    Args:
+        **kwargs: Arguments of the interpreter, e.g. `model_content` and `num_threads`.
+
+    Returns:
+        Interpreter: The interpreter.
+    """
+    if Interpreter is not None:
+        return Interpreter(**kwargs)
+    import tensorflow as tf
+    return tf.lite.Interpreter(**kwargs)
+
+
+def compile_inference(keras_model, warmup_shape):
+    """
+    Builds a graph-mode inference function for a Keras model.
+
+    `model.predict` builds a data adapter and runs the callback machinery on every call, which
+    dominates the cost of predicting a single small input. This function traces the model once
+    into a `tf.function` with a fixed input signature, taken from the model's input shape, and
+    runs it once so that the first request does not pay for the tracing.
+
+    Args:
+        keras_model (tf.keras.Model): The model to compile.
+        warmup_shape (tuple of int): Shape of the zero input used to warm the function. It must
+         match the model's input shape.
+
+    Returns:
+        tf.types.experimental.GenericFunction: Function that takes a float32 batch (NumPy array or
+         tensor) and returns the model's output tensor.
+    """
+    import tensorflow as tf
+
+    @tf.function(input_signature=[tf.TensorSpec(keras_model.input_shape, tf.float32)])
+    def infer(inputs):
+        return keras_model(inputs, training=False)
+
+    infer(tf.zeros(warmup_shape, tf.float32))
+    return infer
+
+
+class TFLiteModel:
+    def __init__(self, model_content, num_threads=None):
+        """
+        Initializes the TFLiteModel class, which runs a TFLite model like the function built by
+        `compile_inference`.
+
+        A TFLite interpreter must not be used by two threads at once, so each thread gets its own,
+        built from the shared flatbuffer. The input is resized whenever the shape of a batch
+        changes, e.g. for spectrograms of different lengths. A model converted with a batch size of
+        1, which the recurrent STT model needs, runs a larger batch one row at a time.
+
+        Args:
+            model_content (bytes): The TFLite flatbuffer, with a float32 input and output.
+            num_threads (int, optional): Threads of each interpreter.
+        """
+        self.model_content = model_content
+        self.num_threads = num_threads
+        self.interpreters = threading.local()
+
+        interpreter = new_interpreter(model_content=model_content)
+        self.fixed_batch = interpreter.get_input_details()[0]['shape_signature'][0] == 1
+
+    def interpreter(self, shape):
+        """
+        Returns the interpreter of the current thread, with its input resized to `shape`.
+        """
+        local = self.interpreters
+        if getattr(local, 'interpreter', None) is None:
+            local.interpreter = new_interpreter(model_content=self.model_content, num_threads=self.num_threads)
+            local.input = local.interpreter.get_input_details()[0]['index']
+            local.output = local.interpreter.get_output_details()[0]['index']
+            local.shape = None
+        if local.shape != shape:
+            local.interpreter.resize_tensor_input(local.input, shape)
+            local.interpreter.allocate_tensors()
+            local.shape = shape
+        return local
+
+    def __call__(self, inputs):
+        """
+        Runs the model on a batch.
+
+        Args:
+            inputs: float32 batch (NumPy array or tensor).
+
+        Returns:
+            numpy.ndarray: The output of the model.
+        """
+        inputs = np.asarray(inputs, dtype=np.float32)
+        if self.fixed_batch and len(inputs) > 1:
+            return np.concatenate([self(inputs[i:i + 1]) for i in range(len(inputs))])
+
+        local = self.interpreter(inputs.shape)
+        local.interpreter.set_tensor(local.input, inputs)
+        local.interpreter.invoke()
+        return local.interpreter.get_tensor(local.output)
+
+
+def compile_tflite_inference(model_path, warmup_shape):
+    """
+    Loads a TFLite model, e.g. a quantized model written by `quantize.py`, as an inference function.
+
+    Args:
+        model_path (str): Path of the TFLite file.
+        warmup_shape (tuple of int): Shape of the zero input used to warm the interpreter.
+
+    Returns:
+        TFLiteModel: Function that takes a float32 batch (NumPy array or tensor) and returns the
+         model's output as a NumPy array.
+    """
+    with open(model_path, 'rb') as file:
+        infer = TFLiteModel(file.read(), tflite_num_threads)
+    infer(np.zeros(warmup_shape, np.float32))
+    return infer
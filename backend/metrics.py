@@ -0,0 +1,244 @@
+"""
+Lightweight latency instrumentation exposed in the Prometheus text format.
+
+Set METRICS_ENABLED=1 to record request and stage timings. When it is disabled, `stage`
+returns a shared no-op context manager and the request hooks are not installed, so the
+instrumented code pays a single boolean check.
+"""
+import bisect
+import os
+import threading
+import time
+
+enabled = os.environ.get('METRICS_ENABLED', '0') == '1'
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labelnames, labelvalues, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Initializes the Histogram class.
+
+        Args:
+            name (str): Metric name.
+            description (str): Help text of the metric.
+            labelnames (tuple of str, optional): Names of the labels that split the metric.
+            buckets (tuple of float, optional): Upper bounds of the buckets.
+        """
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label values: count of each bucket (plus +Inf), sum and total count
+        self.series = {}
+        self.lock = threading.Lock()
+        metrics.append(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labelvalues)
+            if series is None:
+                series = self.series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series_items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self.series.items())
+        for labelvalues, (counts, total, count) in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labelvalues)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, description, labelnames=()):
+        """
+        Initializes the Gauge class.
+
+        Args:
+            name (str): Metric name.
+            description (str): Help text of the metric.
+            labelnames (tuple of str, optional): Names of the labels that split the metric.
+        """
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+        metrics.append(self)
+
+    def set(self, value, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = value
+
+    def inc(self, amount=1, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def dec(self, amount=1, *labelvalues):
+        self.inc(-amount, *labelvalues)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            values = sorted(self.values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description, labelnames=()):
+        """
+        Initializes the Counter class.
+
+        The series only go up, and are rendered as `<name>_total` with the counter type so that `rate()` and
+         `increase()` handle restarts.
+
+        Args:
+            name (str): Metric name, without the `_total` suffix.
+            description (str): Help text of the metric.
+            labelnames (tuple of str, optional): Names of the labels that split the metric.
+        """
+        self.name = name + '_total'
+        self.description = description
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+        metrics.append(self)
+
+    def inc(self, amount=1, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def set(self, value, *labelvalues):
+        """
+        Mirrors a count kept elsewhere, e.g. by the result cache, which only goes up until the process restarts.
+        """
+        with self.lock:
+            self.values[labelvalues] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = sorted(self.values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class StageTimer:
+    def __init__(self, pipeline, stage):
+        self.pipeline = pipeline
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        stage_duration.observe(time.perf_counter() - self.start, self.pipeline, self.stage)
+        return False
+
+
+null_timer = NullTimer()
+
+
+def stage(pipeline, name):
+    """
+    Times one stage of a pipeline.
+
+    Args:
+        pipeline (str): Pipeline the stage belongs to, e.g. 'fer' or 'stt'.
+        name (str): Stage name: 'decode', 'detect', 'preprocess', 'infer' or 'postprocess'.
+
+    Returns:
+        A context manager that records the duration of its block, or a shared no-op one when metrics are disabled.
+
+    Example:
+        with metrics.stage('fer', 'detect'):
+            faces = detectFaces(img)
+    """
+    if not enabled:
+        return null_timer
+    return StageTimer(pipeline, name)
+
+
+def instrument(app):
+    """
+    Records the latency of every route of a Flask app and the number of requests in flight.
+
+    Args:
+        app (flask.Flask): The app to instrument. Nothing is installed when metrics are disabled.
+    """
+    if not enabled:
+        return
+
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        requests_in_flight.inc()
+
+    @app.teardown_request
+    def record_request_time(exception=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        requests_in_flight.dec()
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_duration.observe(time.perf_counter() - start, route, request.method)
+
+
+def render():
+    """
+    Renders every metric in the Prometheus text format.
+
+    Returns:
+        str: The metrics page.
+    """
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+metrics = []
+
+request_duration = Histogram('request_duration_seconds', 'Latency of each route.', ('route', 'method'))
+requests_in_flight = Gauge('requests_in_flight', 'Requests being processed.')
+stage_duration = Histogram('stage_duration_seconds', 'Latency of each pipeline stage.', ('pipeline', 'stage'))
+model_load_seconds = Gauge('model_load_seconds', 'Seconds spent loading each model.', ('model',))
+batch_size = Histogram('batch_size', 'Items processed together by each batcher.', ('batcher',),
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+batch_queue_depth = Gauge('batch_queue_depth', 'Items waiting in each batcher.', ('batcher',))
+result_cache_events = Counter('result_cache_events', 'Result cache hits, misses and evictions.', ('event',))
+pool_in_flight = Gauge('pool_in_flight', 'Calls running or waiting in each ASGI model pool.', ('pool',))
+admission_rejections = Counter('admission_rejections', 'Calls rejected by each ASGI model pool.', ('pool', 'status'))
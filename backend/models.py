@@ -1,42 +1,233 @@
 import os
-import pickle
+import threading
+import warnings
+from collections import OrderedDict
 import sklearn
+import numpy as np
 import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from registry import ModelRegistry
+from schemas import SCHEMAS
 
 
 class ModelLoader:
-    def __init__(self):
+    # Input columns of each tabular model, in the order of its schema's features
+    FEATURES = {model: schema.columns for model, schema in SCHEMAS.items()}
+
+    # Fitted SARIMAX models served by the forecast routes
+    SARIMAX_MODELS = ['s&p', 'ethereum', 'bitcoin', 'avocado']
+
+    # Maximum number of date ranges kept in the forecast cache
+    FORECAST_CACHE_SIZE = 256
+
+    # Default maximum number of periods of a forecast range, ten years of daily periods
+    FORECAST_MAX_HORIZON = 3660
+
+    def __init__(self, forecast_window=None, precompute_in_background=False, directory_path=None, mmap_mode=None,
+                 prefer_compiled=True, max_horizon=None):
         """
         Initializes the ModelLoader class.
 
         This class is responsible for loading machine learning deep_learning_models from
         pickle files and providing methods for making predictions using those deep_learning_models.
+        Models are loaded on first use; call `warm` to load them ahead of time.
+
+        Parameters:
+        - forecast_window (tuple of str, optional): First and last date for which the
+          SARIMAX forecasts are precomputed. No table is built when it is None.
+        - precompute_in_background (bool): Build the forecast tables in a background
+          thread instead of blocking the constructor. Requests fall back to the live
+          `get_prediction` call until a model's table is ready.
+        - directory_path (str, optional): Directory containing the models. Defaults to
+          the `MODELS_DIR` environment variable or `../models`.
+        - mmap_mode (str, optional): Joblib memory-map mode used for `.joblib` models.
+        - prefer_compiled (bool): Use the `.compiled.npz` form of a tabular model when it
+          exists (see `compiled.py`).
+        - max_horizon (int, optional): Maximum number of periods of a forecast range.
+          Defaults to `FORECAST_MAX_HORIZON`.
         """
-        self.models = self.load_models()
+        self.models = self.load_models(directory_path, mmap_mode, prefer_compiled)
+        self.max_horizon = max_horizon or self.FORECAST_MAX_HORIZON
+        self.input_columns = {}
+        self.input_positions = {}
+        self.input_rows = threading.local()
+        self.forecast_cache = OrderedDict()
+        self.forecast_cache_lock = threading.Lock()
+        self.forecast_tables = {}
+
+        if forecast_window is not None:
+            if precompute_in_background:
+                threading.Thread(target=self.precompute_forecasts, args=forecast_window, daemon=True).start()
+            else:
+                self.precompute_forecasts(*forecast_window)
 
     @staticmethod
-    def load_models():
-        directory_path = r"..\..\9S_AI\models"
+    def load_models(directory_path=None, mmap_mode=None, prefer_compiled=True):
         """
-        Loads machine learning deep_learning_models from pickle files.
+        Creates the registry of machine learning deep_learning_models.
 
-        This method loads machine learning deep_learning_models from pickle files located in
-        a specified directory. The deep_learning_models are stored in a dictionary where the
-        keys are the model names and the values are the loaded deep_learning_models.
+        The deep_learning_models are stored in a dictionary-like registry where the keys
+        are the model names. Each model is unpickled the first time it is used.
+
+        Parameters:
+        - directory_path (str, optional): Directory containing the models.
+        - mmap_mode (str, optional): Joblib memory-map mode used for `.joblib` models.
+        - prefer_compiled (bool): Use the compiled form of a model when it exists.
 
         Returns:
-        - loaded_models (dict): Dictionary containing loaded machine learning deep_learning_models.
-        """
-        directory_path = r"..\models"
-        loaded_models = {}
-        for filename in os.listdir(directory_path):
-            if filename.endswith('.pkl'):
-                model_name = filename.split('.')[0]
-                file_path = os.path.join(directory_path, filename)
-                with open(file_path, 'rb') as file:
-                    loaded_model = pickle.load(file)
-                    loaded_models[model_name] = loaded_model
-        return loaded_models
+        - loaded_models (ModelRegistry): Registry of the machine learning deep_learning_models.
+        """
+        if directory_path is None:
+            directory_path = os.environ.get('MODELS_DIR', os.path.join('..', 'models'))
+        return ModelRegistry(directory_path, mmap_mode=mmap_mode, prefer_compiled=prefer_compiled)
+
+    def warm(self, max_workers=None):
+        """
+        Loads every model in parallel and records the input layout of the tabular models.
+
+        Parameters:
+        - max_workers (int, optional): Size of the thread pool used to load the models.
+
+        Returns:
+        - load_times (dict): Seconds spent loading each model.
+        """
+        load_times = self.models.warm(max_workers=max_workers)
+        for model in self.FEATURES:
+            if model in self.models:
+                self.compile_inputs(model)
+        return load_times
+
+    def compile_inputs(self, model):
+        """
+        Records the input layout of a tabular model once, when it is first used.
+
+        The column order is taken from the model's `feature_names_in_` when the model
+        was fitted on a DataFrame, and validated against `FEATURES`. Otherwise the
+        order of `FEATURES` is used.
+
+        Parameters:
+        - model (str): Name of the tabular model.
+
+        Returns:
+        - input_columns (list of str): Fitted column order of the model.
+        """
+        if model in self.input_columns:
+            return self.input_columns[model]
+
+        features = self.FEATURES[model]
+        fitted_columns = getattr(self.models[model], 'feature_names_in_', None)
+        if fitted_columns is None:
+            columns = list(features)
+        else:
+            columns = list(fitted_columns)
+            if sorted(columns) != sorted(features):
+                raise ValueError(f"Model '{model}' was fitted with columns {columns}, expected {features}")
+
+        self.input_positions[model] = np.array([columns.index(feature) for feature in features])
+        self.input_columns[model] = columns
+        return columns
+
+    def predict_row(self, model, *values):
+        """
+        Makes a prediction for a single row without building a DataFrame.
+
+        The values are written into a preallocated NumPy row (one per thread and model)
+        in the fitted column order and passed straight to the model's `predict`.
+
+        Parameters:
+        - model (str): Name of the tabular model to use.
+        - *values: Feature values in the order of `FEATURES[model]`.
+
+        Returns:
+        - prediction (numpy.ndarray): Raw output of the model's `predict` for the row.
+        """
+        row = getattr(self.input_rows, model, None)
+        if row is None:
+            row = np.empty((1, len(self.compile_inputs(model))))
+            setattr(self.input_rows, model, row)
+
+        row[0, self.input_positions[model]] = values
+        return self.estimator_predict(model, row)
+
+    def estimator_predict(self, model, X):
+        """
+        Runs the `predict` of a tabular model on a NumPy array in its fitted column order.
+
+        The feature name check that sklearn does for DataFrames is done once by `compile_inputs`,
+        so the warning sklearn gives for an array is only silenced around this call, for the
+        models that were fitted on a DataFrame.
+
+        Parameters:
+        - model (str): Name of the tabular model.
+        - X (numpy.ndarray): Rows in the order of `compile_inputs(model)`.
+
+        Returns:
+        - prediction (numpy.ndarray): Raw output of the model's `predict`.
+        """
+        estimator = self.models[model]
+        if getattr(estimator, 'feature_names_in_', None) is None:
+            return estimator.predict(X)
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            return estimator.predict(X)
+
+    def precompute_forecasts(self, start_date, end_date):
+        """
+        Precomputes the forecasts of every SARIMAX model for a window of dates.
+
+        Each table stores the dates as int64 nanoseconds and, for each date, the predicted
+        value and the lower/upper bounds of the 95% confidence interval in one float array.
+        When the dates are evenly spaced the position of a date is computed from its offset
+        to the first date, so a lookup does no statsmodels work.
+
+        Parameters:
+        - start_date (str): First date of the window.
+        - end_date (str): Last date of the window (inclusive).
+        """
+        for model in self.SARIMAX_MODELS:
+            if model not in self.models:
+                continue
+            try:
+                pred = self.models[model].get_prediction(start=pd.to_datetime(start_date),
+                                                         end=pd.to_datetime(end_date), dynamic=False)
+                conf_int = pred.conf_int()
+
+                dates = pred.predicted_mean.index.values.astype('datetime64[ns]').astype(np.int64)
+                values = np.column_stack([pred.predicted_mean.to_numpy(), conf_int.to_numpy()])
+
+                steps = np.unique(np.diff(dates))
+                step = int(steps[0]) if len(steps) == 1 else None
+
+                self.forecast_tables[model] = (dates, values, step)
+            except Exception as e:
+                print(f"Error precomputing forecasts with model '{model}': {e}")
+
+    def forecast_table_position(self, model, input_datetime):
+        """
+        Finds the row of a date in the precomputed forecast table of a model.
+
+        Parameters:
+        - model (str): Name of the SARIMAX model.
+        - input_datetime (pd.Timestamp): Date to look up.
+
+        Returns:
+        - position (int): Row of the date in the table, or None if the model has no table
+          or the date is outside its window.
+        """
+        table = self.forecast_tables.get(model)
+        if table is None:
+            return None
+
+        dates, values, step = table
+        if step is not None:
+            position, remainder = divmod(input_datetime.value - int(dates[0]), step)
+        else:
+            position = int(np.searchsorted(dates, input_datetime.value))
+            remainder = 0 if position < len(dates) and dates[position] == input_datetime.value else 1
+
+        if remainder or not 0 <= position < len(dates):
+            return None
+        return position
 
     def process_SARIMAX(self, model, input_date):
         """
@@ -57,6 +248,11 @@ class ModelLoader:
             # Convert the input date to a datetime object
             input_datetime = pd.to_datetime(input_date)
 
+            # Use the precomputed forecast when the date is inside the window
+            position = self.forecast_table_position(model, input_datetime)
+            if position is not None:
+                return float(self.forecast_tables[model][1][position, 0])
+
             # Make predictions for the specified date
             pred = self.models[model].get_prediction(start=input_datetime, end=input_datetime, dynamic=False)
 
@@ -68,233 +264,236 @@ class ModelLoader:
             print(f"Error predicting with model '{model}': {e}")
             return None
 
-    def wine_prediction(self, volatile_acidity, density, alcohol):
+    def forecast_range(self, results, start_date, end_date=None, horizon=None):
         """
-        Makes predictions using the wine model.
+        Resolves and validates the dates of a forecast range.
 
-        This method makes predictions using the wine model based on the input
-        volatile acidity, density, and alcohol values.
+        The range may not span more than `max_horizon` periods of the model's frequency,
+        so that a single request cannot compute and cache an arbitrarily long forecast.
 
         Parameters:
-        - volatile_acidity (float): Volatile acidity of the wine.
-        - density (float): Density of the wine.
-        - alcohol (float): Alcohol content of the wine.
+        - results: Fitted SARIMAX results of the model.
+        - start_date (str): First date of the range.
+        - end_date (str, optional): Last date of the range (inclusive).
+        - horizon (int, optional): Number of periods to forecast from `start_date`,
+          used when `end_date` is not given.
 
         Returns:
-        - original_label (str): Predicted label for the wine quality.
+        - start, end (pd.Timestamp): First and last date of the range.
+
+        Raises:
+        - ValueError: When a date cannot be parsed, or the range is empty or longer
+          than `max_horizon` periods.
         """
         try:
-            # Create a DataFrame with the input data
-            input_data = pd.DataFrame({
-                'volatile acidity': [volatile_acidity],
-                'density': [density],
-                'alcohol': [alcohol],
-            })
+            start = pd.to_datetime(start_date)
+        except ValueError:
+            start = pd.NaT
+        if pd.isna(start):
+            raise ValueError(f"Invalid 'start' date: {start_date!r}")
+
+        freq = results.fittedvalues.index.freq or 'D'
+        if end_date is None:
+            if horizon < 1:
+                raise ValueError("'horizon' must be at least 1")
+            if horizon > self.max_horizon:
+                raise ValueError(f"'horizon' cannot be more than {self.max_horizon} periods")
+            # Step forward in the frequency the model was fitted with
+            return start, pd.date_range(start, periods=horizon, freq=freq)[-1]
 
-            # Make predictions using the trained model
-            prediction_encoded = self.models['wine'].predict(input_data)
-
-            # Define mapping dictionary to map encoded values to original labels
-            label_mapping = {0: 'Bad', 1: 'Good', 2: 'Regular'}
-
-            # Get the original label corresponding to the predicted encoded value
-            original_label = label_mapping[prediction_encoded[0]]
-
-            return original_label
-        except Exception as e:
-            print(f"Error predicting with model 'wine': {e}")
-            return None
-
-    def stroke_prediction(self, age, hypertension, heart_disease, avg_glucose_level):
+        try:
+            end = pd.to_datetime(end_date)
+        except ValueError:
+            end = pd.NaT
+        if pd.isna(end):
+            raise ValueError(f"Invalid 'end' date: {end_date!r}")
+        if end < start:
+            raise ValueError("'end' cannot be before 'start'")
+        if end > start + to_offset(freq) * (self.max_horizon - 1):
+            raise ValueError(f"The range from 'start' to 'end' cannot be more than {self.max_horizon} periods")
+        return start, end
+
+    def forecast_SARIMAX(self, model, start_date, end_date=None, horizon=None):
         """
-        Makes predictions using the stroke model.
+        Makes predictions using the SARIMAX model for a range of dates.
 
-        This method makes predictions using the stroke model based on the input
-        age, hypertension, heart disease, and average glucose level values.
+        This method computes the whole series and its confidence intervals with a single
+        `get_prediction` call. The fitted models never change, so results are kept in a
+        bounded in-memory cache keyed by model and date range.
 
         Parameters:
-        - age (int): Age of the patient.
-        - hypertension (int): Presence of hypertension (1 for True, 0 for False).
-        - heart_disease (int): Presence of heart disease (1 for True, 0 for False).
-        - avg_glucose_level (float): Average glucose level of the patient.
+        - model (str): Name of the SARIMAX model to use for prediction.
+        - start_date (str): First date of the range.
+        - end_date (str, optional): Last date of the range (inclusive).
+        - horizon (int, optional): Number of periods to forecast from `start_date`,
+          used when `end_date` is not given.
 
         Returns:
-        - prediction (bool): Predicted likelihood of stroke (True for high, False for low).
+        - forecast (dict): Dates, predicted values and lower/upper bounds of the 95%
+          confidence interval, or None if the prediction fails.
+
+        Raises:
+        - ValueError: When the range is invalid, see `forecast_range`.
         """
         try:
-            # Create a DataFrame with the input data
-            input_data = pd.DataFrame({
-                'age': [age],
-                'hypertension': [hypertension],
-                'heart_disease': [heart_disease],
-                'avg_glucose_level': [avg_glucose_level]
-            })
-
-            # Make predictions using the trained model
-            prediction = self.models['stroke'].predict(input_data)
-
-            # Return True if prediction is equal to 1, otherwise return False
-            return bool(prediction[0])  # Convert 1 or 0 to True or False
+            results = self.models[model]
+        except Exception as e:
+            print(f"Error forecasting with model '{model}': {e}")
+            return None
 
+        start, end = self.forecast_range(results, start_date, end_date, horizon)
+        try:
+            key = (model, start, end)
+            with self.forecast_cache_lock:
+                if key in self.forecast_cache:
+                    self.forecast_cache.move_to_end(key)
+                    return self.forecast_cache[key]
+
+            # Slice the precomputed forecasts when the whole range is inside the window
+            first = self.forecast_table_position(model, start)
+            last = self.forecast_table_position(model, end)
+            if first is not None and last is not None:
+                dates, values, _ = self.forecast_tables[model]
+                return {
+                    'dates': pd.to_datetime(dates[first:last + 1]).strftime('%Y-%m-%d').tolist(),
+                    'predictions': values[first:last + 1, 0].tolist(),
+                    'lower': values[first:last + 1, 1].tolist(),
+                    'upper': values[first:last + 1, 2].tolist(),
+                }
+
+            # Make predictions for the whole range at once
+            pred = results.get_prediction(start=start, end=end, dynamic=False)
+            conf_int = pred.conf_int()
+
+            forecast = {
+                'dates': [date.strftime('%Y-%m-%d') for date in pred.predicted_mean.index],
+                'predictions': pred.predicted_mean.tolist(),
+                'lower': conf_int.iloc[:, 0].tolist(),
+                'upper': conf_int.iloc[:, 1].tolist(),
+            }
+
+            with self.forecast_cache_lock:
+                self.forecast_cache[key] = forecast
+                if len(self.forecast_cache) > self.FORECAST_CACHE_SIZE:
+                    self.forecast_cache.popitem(last=False)
+
+            return forecast
         except Exception as e:
-            print(f"Error predicting with model 'stroke': {e}")
+            print(f"Error forecasting with model '{model}': {e}")
             return None
 
-    def pokemon_prediction(self, base_egg_steps, percentage_male):
+    def model_version(self, model):
         """
-        Makes predictions using the Pokémon model.
-
-        This method makes predictions using the Pokémon model based on the input
-        base egg steps and percentage male values.
+        Returns the version of a model, used to key memoized predictions and their ETags.
 
         Parameters:
-        - base_egg_steps (int): Base egg steps for the Pokémon.
-        - percentage_male (float): Percentage of male Pokémon.
+        - model (str): Name of the model.
 
         Returns:
-        - prediction (bool): Predicted likelihood of being legendary (True for legendary, False for not legendary).
+        - version (str): Hash of the model file, or None if the model is not in the
+          models directory.
         """
-        try:
-            # Create a DataFrame with the input data
-            input_data = pd.DataFrame({
-                'base_egg_steps': [base_egg_steps],
-                'percentage_male': [percentage_male],
-            })
-
-            # Make predictions using the trained model
-            prediction = self.models['pokemon'].predict(input_data)
-
-            # Return True if prediction is equal to 1, otherwise return False
-            return bool(prediction[0])  # Convert 1 or 0 to True or False
-
-        except Exception as e:
-            print(f"Error predicting with model 'pokemon': {e}")
+        if model not in self.models:
             return None
+        return self.models.version(model)
 
-    def heart_failure_prediction(self, ejection_fraction, time):
+    def predict(self, model, input_data):
         """
-        Makes predictions using the heart failure model.
+        Makes predictions for a matrix of rows using a tabular model.
 
-        This method makes predictions using the heart failure model based on the input
-        ejection fraction and time values.
+        This is the single code path of every tabular prediction, for one row or many.
+        A single row goes through `predict_row`; larger matrices are reordered into the
+        fitted column order and passed to the model's `predict` in one call.
 
         Parameters:
-        - ejection_fraction (int): Ejection fraction of the patient.
-        - time (int): Time of follow-up (in days).
+        - model (str): Name of the tabular model to use (a key of `SCHEMAS`).
+        - input_data (numpy.ndarray): Validated (n, features) float matrix in the order of
+          `FEATURES[model]`, as returned by `SCHEMAS[model].parse_query` or `parse_rows`.
 
         Returns:
-        - prediction (bool): Predicted likelihood of heart failure (True for high, False for low).
+        - labels (list): Predicted label for each row.
         """
-        try:
-            # Create a DataFrame with the input data
-            input_data = pd.DataFrame({
-                'ejection_fraction': [ejection_fraction],
-                'time': [time],
-            })
-
-            # Make predictions using the trained model
-            prediction = self.models['heart_failure'].predict(input_data)
+        schema = SCHEMAS[model]
+        if schema.preprocess is not None:
+            input_data = schema.preprocess(input_data)
+
+        if len(input_data) == 0:
+            return []
+        if len(input_data) == 1:
+            predictions = self.predict_row(model, *input_data[0])
+        else:
+            columns = self.compile_inputs(model)
+            fitted_data = np.empty((len(input_data), len(columns)))
+            fitted_data[:, self.input_positions[model]] = input_data
+            predictions = self.estimator_predict(model, fitted_data)
+
+        return schema.decode(predictions)
+
+    def predict_one(self, model, *values):
+        """
+        Makes a prediction for a single row using a tabular model.
 
-            # Return True if prediction is equal to 1, otherwise return False
-            return bool(prediction[0])  # Convert 1 or 0 to True or False
+        Parameters:
+        - model (str): Name of the tabular model to use (e.g. 'wine', 'drug').
+        - *values: Feature values in the order of `FEATURES[model]`, e.g.
+          `predict_one('wine', volatile_acidity, density, alcohol)`.
 
+        Returns:
+        - prediction: Predicted label for the row, or None if the prediction fails.
+        """
+        try:
+            input_data = SCHEMAS[model].validate(np.array([values], dtype=float))
+            return self.predict(model, input_data)[0]
         except Exception as e:
-            print(f"Error predicting with model 'heart_failure': {e}")
+            print(f"Error predicting with model '{model}': {e}")
             return None
 
-    def drug_prediction(self, age, sex, bp, cholesterol, na_to_k):
+    @staticmethod
+    def decode_labels(model, predictions):
         """
-        Makes predictions using the drug model.
-
-        This method makes predictions using the drug model based on the input
-        age, sex, blood pressure, cholesterol, and sodium-to-potassium ratio.
+        Converts the raw output of a tabular model into the labels returned by the API.
 
         Parameters:
-        - age (int): Age of the patient.
-        - sex (int): Sex of the patient (1 for male, 0 for female).
-        - bp (int): Blood pressure level.
-        - cholesterol (int): Cholesterol level.
-        - na_to_k (float): Sodium-to-potassium ratio.
+        - model (str): Name of the tabular model that produced the predictions.
+        - predictions (numpy.ndarray): Raw predictions returned by the model's `predict`.
 
         Returns:
-        - prediction: Predicted drug type for the patient.
+        - labels (list): Labels as described by the model's schema in `SCHEMAS`.
         """
-        try:
-            # Create a DataFrame with the input data
-            input_data = pd.DataFrame({
-                'Age': [age],
-                'Sex': [sex],
-                'BP': [bp],
-                'Cholesterol': [cholesterol],
-                'Na_to_K': [na_to_k]
-            })
-
-            # Make predictions using the trained model
-            prediction = self.models['drug'].predict(input_data)
-
-            return prediction[0]
-        except Exception as e:
-            print(f"Error predicting with model 'drug': {e}")
-            return None
+        return SCHEMAS[model].decode(predictions)
 
-    def breast_cancer_prediction(self, concave_points_worst, perimeter_worst):
+    def batch_prediction(self, model, rows):
         """
-        Makes predictions using the breast cancer model.
+        Makes predictions for many rows at once using a tabular model.
 
-        This method makes predictions using the breast cancer model based on the input
-        concave points worst and perimeter worst values.
+        This method builds a single input matrix for all the rows and calls the
+        model's `predict` once, instead of once per row.
 
         Parameters:
-        - concave_points_worst (float): Worst concave points of the tumor.
-        - perimeter_worst (float): Worst perimeter of the tumor.
+        - model (str): Name of the tabular model to use (e.g. 'wine', 'drug').
+        - rows (list or pd.DataFrame): Rows to score. Either a DataFrame, a list of
+          dicts keyed by feature name or a list of lists in the order of `FEATURES[model]`.
 
         Returns:
-        - prediction (bool): Predicted likelihood of breast cancer (True for high, False for low).
+        - labels (list): Predicted label for each row, or None if the prediction fails.
         """
         try:
-            # Create a DataFrame with the input data
-            input_data = pd.DataFrame({
-                'concave points_worst': [concave_points_worst],
-                'perimeter_worst': [perimeter_worst],
-            })
-
-            # Make predictions using the trained model
-            prediction = self.models['breast_cancer'].predict(input_data)
-
-            # Return True if prediction is equal to 1, otherwise return False
-            return bool(prediction[0])  # Convert 1 or 0 to True or False
-
+            return self.predict(model, SCHEMAS[model].parse_rows(rows))
         except Exception as e:
-            print(f"Error predicting with model 'breast_cancer': {e}")
+            print(f"Error predicting batch with model '{model}': {e}")
             return None
 
 if __name__ == "__main__":
     # Create an instance of the ModelLoader class
     model_loader = ModelLoader()
 
-    # # Test the wine_prediction method
-    # wine_prediction = model_loader.wine_prediction(0.5, 0.99, 12.3)
-    # print("Wine Prediction:", wine_prediction)
-    #
-    # # Test the stroke_prediction method
-    # stroke_prediction = model_loader.stroke_prediction(65, 1, 0, 90)
-    # print("Stroke Prediction:", stroke_prediction)
-    #
-    # # Test the pokemon_prediction method
-    # pokemon_prediction = model_loader.pokemon_prediction(10000, 60)
-    # print("Pokemon Prediction:", pokemon_prediction)
-    #
-    # # Test the heart_failure_prediction method
-    # heart_failure_prediction = model_loader.heart_failure_prediction(35, 200)
-    # print("Heart Failure Prediction:", heart_failure_prediction)
-    #
-    # # Test the drug_prediction method
-    # drug_prediction = model_loader.drug_prediction(50, 1, 120, 200, 10)
-    # print("Drug Prediction:", drug_prediction)
-    #
-    # # Test the breast_cancer_prediction method
-    # breast_cancer_prediction = model_loader.breast_cancer_prediction(0.05, 100)
-    # print("Breast Cancer Prediction:", breast_cancer_prediction)
+    # # Test the tabular models
+    # print("Wine Prediction:", model_loader.predict_one('wine', 0.5, 0.99, 12.3))
+    # print("Stroke Prediction:", model_loader.predict_one('stroke', 65, 1, 0, 90))
+    # print("Pokemon Prediction:", model_loader.predict_one('pokemon', 10000, 60))
+    # print("Heart Failure Prediction:", model_loader.predict_one('heart_failure', 35, 200))
+    # print("Drug Prediction:", model_loader.predict_one('drug', 50, 1, 120, 200, 10))
+    # print("Breast Cancer Prediction:", model_loader.predict_one('breast_cancer', 0.05, 100))
 
     # Assuming 'results' is your trained model object
     print(model_loader.process_SARIMAX('s&p', '2024-04-08'))
\ No newline at end of file
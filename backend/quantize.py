@@ -0,0 +1,252 @@
+"""
+Quantizes the FER and STT Keras models for CPU serving, with an accuracy gate.
+
+Two TFLite variants can be made from each float model:
+- 'dynamic': dynamic-range quantization. The weights are stored as int8 and the
+  activations stay float.
+- 'int8': full integer quantization. The activations are quantized too, with ranges
+  calibrated on the first `--calibration-size` samples. Ops without an int8 kernel stay
+  float, and the input and output stay float32.
+
+Each variant is compared with the float model on every sample and is only written when it
+passes the gate:
+- FER: top-1 agreement of the emotions with the float model (`--min-agreement`)
+- STT: character error rate of the transcriptions, with the float model's as the
+  reference (`--max-cer`)
+
+The report gives the size of each model, its latency, and the peak RSS of a process that
+loads it through `fer.load_model`/`tts.load_model` and runs it once. Every conversion and
+measurement runs in a child process, so a converter crash only fails its variant. The
+int8 calibration of recurrent layers crashes some TensorFlow versions.
+
+The variants are written next to the Keras weights, e.g. `fer.int8.tflite`. Pointing
+FER_WEIGHTS or TTS_WEIGHTS at one serves it. The command exits with status 1 when a
+variant fails.
+
+The FER samples are face crops, e.g. the 48x48 images of the training set, in a directory
+tree. The STT samples are recordings in a directory or a manifest, like `transcribe_batch.py`.
+
+Usage (from the backend directory):
+    python quantize.py fer faces/ --modes dynamic int8
+    python quantize.py tts recordings/ --modes dynamic --max-cer 0.03
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+import fer
+import tts
+from inference import TFLiteModel, compile_inference
+from transcribe_batch import prepare, read_inputs
+
+MODES = ('dynamic', 'int8')
+
+
+def load_keras(family, weights):
+    if family == 'fer':
+        return tf.keras.models.load_model(weights)
+    return tf.keras.models.load_model(weights, custom_objects={'CTCLoss': tts.CTCLoss})
+
+
+def load_samples(family, source, limit=None):
+    """
+    Reads the samples the variants are calibrated and evaluated on.
+
+    Args:
+        family (str): 'fer' or 'tts'.
+        source (str): Directory of face images, or directory or manifest of recordings.
+        limit (int, optional): Largest number of samples.
+
+    Returns:
+        numpy.ndarray or list: The (n, 48, 48, 1) batch of faces, or the spectrogram of each recording.
+    """
+    if family == 'fer':
+        paths = sorted(os.path.join(directory, filename) for directory, _, filenames in os.walk(source)
+                       for filename in filenames)
+        images = [image for image in (cv2.imread(path, cv2.IMREAD_GRAYSCALE) for path in paths[:limit])
+                  if image is not None]
+        return fer.preprocess_images(images)
+
+    return [prepare(path)[0] for path in read_inputs(source)[:limit]]
+
+
+def convert(family, weights, mode, calibration):
+    """
+    Converts a Keras model to a quantized TFLite model. Runs in a child process.
+
+    Args:
+        family (str): 'fer' or 'tts'.
+        weights (str): Path of the Keras model.
+        mode (str): 'dynamic' or 'int8'.
+        calibration (list): Samples used to calibrate the activation ranges of 'int8'.
+
+    Returns:
+        bytes: The TFLite flatbuffer.
+    """
+    keras_model = load_keras(family, weights)
+    if family == 'tts':
+        # The recurrent layers only convert with a static batch size, the time axis stays dynamic
+        inputs = tf.keras.Input(keras_model.input_shape[1:], batch_size=1)
+        keras_model = tf.keras.Model(inputs, keras_model(inputs))
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'int8':
+        converter.representative_dataset = lambda: ([sample[np.newaxis].astype(np.float32)] for sample in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+
+def peak_rss(family, model_path):
+    """
+    Loads a model through the loader of its module and runs it once. Runs in a child process.
+
+    Returns:
+        float: Peak RSS of the process in MB.
+    """
+    module = fer if family == 'fer' else tts
+    module.model_path = model_path
+    module.load_model()
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def in_child(function, *args):
+    """
+    Runs a function in a fresh child process.
+
+    Raises:
+        RuntimeError: When the child process crashes.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            raise RuntimeError(f"{function.__name__} crashed the child process")
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def predictions(family, infer, samples):
+    """
+    Runs an inference function on every sample.
+
+    Returns:
+        list: The emotion index of each face, or the transcription of each recording.
+    """
+    if family == 'fer':
+        return np.asarray(infer(samples)).argmax(axis=1).tolist()
+    return [tts.decode_batch_predictions(np.asarray(infer(sample[np.newaxis])))[0] for sample in samples]
+
+
+def accuracy(family, reference, quantized):
+    """
+    Compares the outputs of a variant with those of the float model.
+
+    Returns:
+        float: The top-1 agreement for FER, or the character error rate for STT.
+    """
+    if family == 'fer':
+        return float(np.mean(np.array(reference) == np.array(quantized)))
+    errors = sum(edit_distance(ref, hyp) for ref, hyp in zip(reference, quantized))
+    return errors / max(1, sum(len(ref) for ref in reference))
+
+
+def latency_ms(family, infer, samples, repeat=20):
+    """
+    Measures the latency of an inference function.
+
+    Returns:
+        dict: Milliseconds per call for one face and for a batch of 32 faces, or per recording.
+    """
+    def timed(inputs_list):
+        infer(inputs_list[0])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for inputs in inputs_list:
+                infer(inputs)
+        return (time.perf_counter() - start) / (repeat * len(inputs_list)) * 1e3
+
+    if family == 'fer':
+        return {'1 face': timed([samples[:1]]), '32 faces': timed([samples[:32]])}
+    return {'1 recording': timed([sample[np.newaxis] for sample in samples[:8]])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('family', choices=['fer', 'tts'], help='Model to quantize.')
+    parser.add_argument('samples', help='Face images, or recordings, to calibrate and evaluate on.')
+    parser.add_argument('--weights', help='Keras model. Defaults to FER_WEIGHTS or TTS_WEIGHTS.')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='Variants to make.')
+    parser.add_argument('--limit', type=int, help='Largest number of samples.')
+    parser.add_argument('--calibration-size', type=int, default=200, help='Samples used to calibrate int8.')
+    parser.add_argument('--min-agreement', type=float, default=0.98, help='Smallest FER top-1 agreement.')
+    parser.add_argument('--max-cer', type=float, default=0.05, help='Largest STT character error rate.')
+    args = parser.parse_args()
+
+    module = fer if args.family == 'fer' else tts
+    weights = args.weights or module.model_path
+    samples = load_samples(args.family, args.samples, args.limit)
+    if len(samples) == 0:
+        sys.exit(f"No samples found in {args.samples}")
+    calibration = samples[:args.calibration_size]
+
+    keras_model = load_keras(args.family, weights)
+    warmup_shape = (1,) + tuple(samples[0].shape)
+    reference = predictions(args.family, compile_inference(keras_model, warmup_shape), samples)
+    print(f"{'model':<10}{'size KB':>10}{'latency ms':>28}{'peak RSS MB':>14}{'gate':>26}")
+
+    def report(name, path, infer, gate):
+        latency = ', '.join(f"{key} {value:.2f}" for key, value in latency_ms(args.family, infer, samples).items())
+        rss = in_child(peak_rss, args.family, path)
+        print(f"{name:<10}{os.path.getsize(path) / 1024:>10.0f}{latency:>28}{rss:>14.0f}{gate:>26}")
+
+    report('float', weights, compile_inference(keras_model, warmup_shape), '')
+
+    failed = False
+    for mode in args.modes:
+        try:
+            content = in_child(convert, args.family, weights, mode, calibration)
+        except Exception as e:
+            print(f"{mode:<10}conversion failed: {e}")
+            failed = True
+            continue
+
+        infer = TFLiteModel(content)
+        value = accuracy(args.family, reference, predictions(args.family, infer, samples))
+        if args.family == 'fer':
+            passed, gate = value >= args.min_agreement, f"agreement {value:.3f}"
+        else:
+            passed, gate = value <= args.max_cer, f"CER {value:.3f}"
+
+        output_path = f"{os.path.splitext(weights)[0]}.{mode}.tflite"
+        with open(output_path, 'wb') as file:
+            file.write(content)
+        report(mode, output_path, infer, f"{gate} {'pass' if passed else 'FAIL'}")
+        if not passed:
+            # Only variants that pass the gate are left next to the weights
+            os.remove(output_path)
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
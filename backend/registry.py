@@ -0,0 +1,165 @@
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+
+import metrics
+from cache import file_version
+from compiled import COMPILED_SUFFIX, load_compiled
+
+
+class ModelRegistry:
+    def __init__(self, directory_path, mmap_mode=None, prefer_compiled=True):
+        """
+        Initializes the ModelRegistry class.
+
+        This class gives dictionary-like access to the models saved in a directory and
+        loads each one on first use, so the server does not pay for every model before it
+        can answer the first request. Models can also be warmed ahead of time in parallel.
+
+        A model is read from `<name>.compiled.npz` when that file exists (see `compiled.py`),
+        then from `<name>.joblib` and from `<name>.pkl` otherwise. Joblib files are loaded
+        with `mmap_mode`, so the NumPy arrays of large estimators are memory-mapped and
+        forked workers share their pages instead of each holding a private copy.
+
+        Parameters:
+        - directory_path (str): Directory containing the model files.
+        - mmap_mode (str, optional): Joblib memory-map mode, e.g. 'r'. None loads the
+          arrays into memory.
+        - prefer_compiled (bool): Use the compiled form of a model when it exists.
+        """
+        self.directory_path = directory_path
+        self.mmap_mode = mmap_mode
+        self.paths = self.find_models(directory_path, prefer_compiled)
+        self.models = {}
+        self.load_times = {}
+        self.versions = {}
+        self.locks = {model_name: threading.Lock() for model_name in self.paths}
+
+    @staticmethod
+    def find_models(directory_path, prefer_compiled=True):
+        """
+        Finds the model files in a directory.
+
+        Parameters:
+        - directory_path (str): Directory containing the model files.
+        - prefer_compiled (bool): Prefer compiled models over joblib files and pickles.
+
+        Returns:
+        - paths (dict): Path of each model keyed by model name, preferring compiled models,
+          then joblib files, then pickles.
+        """
+        priorities = {'.pkl': 1, '.joblib': 2}
+        if prefer_compiled:
+            priorities[COMPILED_SUFFIX] = 3
+
+        paths = {}
+        best = {}
+        for filename in sorted(os.listdir(directory_path)):
+            if filename.endswith(COMPILED_SUFFIX):
+                model_name, extension = filename[:-len(COMPILED_SUFFIX)], COMPILED_SUFFIX
+            else:
+                model_name, extension = os.path.splitext(filename)
+            priority = priorities.get(extension)
+            if priority is not None and priority > best.get(model_name, 0):
+                paths[model_name] = os.path.join(directory_path, filename)
+                best[model_name] = priority
+        return paths
+
+    def __contains__(self, model_name):
+        return model_name in self.paths
+
+    def __getitem__(self, model_name):
+        model = self.models.get(model_name)
+        if model is None:
+            model = self.load(model_name)
+        return model
+
+    def keys(self):
+        return self.paths.keys()
+
+    def version(self, model_name):
+        """
+        Returns the version of a model, a hash of its file computed on first use.
+
+        Parameters:
+        - model_name (str): Name of the model.
+
+        Returns:
+        - version (str): Hexadecimal digest of the model file.
+        """
+        version = self.versions.get(model_name)
+        if version is None:
+            version = self.versions[model_name] = file_version(self.paths[model_name])
+        return version
+
+    def load(self, model_name):
+        """
+        Loads a model if it has not been loaded yet.
+
+        Concurrent callers asking for the same model wait for a single load.
+
+        Parameters:
+        - model_name (str): Name of the model to load.
+
+        Returns:
+        - model: The loaded model.
+        """
+        with self.locks[model_name]:
+            if model_name not in self.models:
+                start = time.perf_counter()
+                file_path = self.paths[model_name]
+                if file_path.endswith(COMPILED_SUFFIX):
+                    model = load_compiled(file_path)
+                elif file_path.endswith('.joblib'):
+                    model = joblib.load(file_path, mmap_mode=self.mmap_mode)
+                else:
+                    with open(file_path, 'rb') as file:
+                        model = pickle.load(file)
+                self.load_times[model_name] = time.perf_counter() - start
+                metrics.model_load_seconds.set(self.load_times[model_name], model_name)
+                self.version(model_name)
+                self.models[model_name] = model
+        return self.models[model_name]
+
+    def warm(self, model_names=None, max_workers=None):
+        """
+        Loads several models in parallel in a thread pool.
+
+        Parameters:
+        - model_names (list of str, optional): Models to load. Defaults to every model in the directory.
+        - max_workers (int, optional): Size of the thread pool. Defaults to the executor's default.
+
+        Returns:
+        - load_times (dict): Seconds spent loading each model.
+        """
+        model_names = list(self.paths) if model_names is None else model_names
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(self.load, model_names))
+        return {model_name: self.load_times[model_name] for model_name in model_names}
+
+
+def convert_to_joblib(directory_path):
+    """
+    Saves a joblib copy of every pickled model in a directory.
+
+    The copies are not compressed, which is required for them to be memory-mapped.
+
+    Parameters:
+    - directory_path (str): Directory containing the `.pkl` files.
+    """
+    for filename in sorted(os.listdir(directory_path)):
+        model_name, extension = os.path.splitext(filename)
+        if extension == '.pkl':
+            with open(os.path.join(directory_path, filename), 'rb') as file:
+                model = pickle.load(file)
+            joblib.dump(model, os.path.join(directory_path, model_name + '.joblib'))
+            print(f"Saved {model_name}.joblib")
+
+
+if __name__ == "__main__":
+    # Convert the pickled models so that they can be memory-mapped
+    convert_to_joblib(os.environ.get('MODELS_DIR', os.path.join('..', 'models')))
@@ -0,0 +1,199 @@
+"""
+Declarative description of the tabular models served by the backend.
+
+Each model is described once by a `ModelSchema`:
+- its input features: the request argument name, the column the model was fitted with
+  and the dtype
+- an optional preprocessing step
+- the mapping from the raw model output to the labels returned by the API
+
+`ModelLoader`, the `/predict/<model>` dispatcher and the per-model URLs all read from
+`SCHEMAS`, so adding a tabular model only takes a new entry here and its pickle in the
+models directory.
+"""
+import numpy as np
+import pandas as pd
+
+
+class Feature:
+    def __init__(self, name, dtype=float, column=None):
+        """
+        Initializes the Feature class.
+
+        Parameters:
+        - name (str): Name of the request argument, e.g. 'volatile_acidity'.
+        - dtype (type): int or float. Values of int features must be whole numbers.
+        - column (str, optional): Column the model was fitted with, when it differs from
+          `name`, e.g. 'volatile acidity'.
+        """
+        self.name = name
+        self.dtype = dtype
+        self.column = column or name
+
+
+class ModelSchema:
+    def __init__(self, name, features, label_mapping=None, binary=False, preprocess=None):
+        """
+        Initializes the ModelSchema class.
+
+        Parameters:
+        - name (str): Name of the model, which is also the name of its pickle.
+        - features (list of Feature): Input features, in the order of the request arguments.
+        - label_mapping (dict, optional): Label returned for each raw prediction, e.g. {0: 'Bad'}.
+        - binary (bool): Return the raw 0/1 predictions as booleans.
+        - preprocess (callable, optional): Function applied to the validated (n, features)
+          float matrix before it is passed to the model.
+        """
+        self.name = name
+        self.features = features
+        self.label_mapping = label_mapping
+        self.binary = binary
+        self.preprocess = preprocess
+        self.columns = [feature.column for feature in features]
+        self.integer_positions = np.array([i for i, feature in enumerate(features) if feature.dtype is int], dtype=int)
+
+    def parse_query(self, args):
+        """
+        Reads the rows of a request from its query arguments.
+
+        A row is made of the i-th value of every argument, so repeating the arguments
+        (e.g. `?age=50&age=60&...`) scores several rows in one request.
+
+        Parameters:
+        - args: Query arguments with a `getlist` method (Flask's `request.args` or
+          Starlette's `request.query_params`).
+
+        Returns:
+        - input_data (numpy.ndarray): Validated (n, features) float matrix.
+        """
+        values = []
+        for feature in self.features:
+            feature_values = args.getlist(feature.name)
+            if not feature_values:
+                raise ValueError(f"Missing argument '{feature.name}'")
+            values.append(feature_values)
+
+        if len({len(feature_values) for feature_values in values}) > 1:
+            raise ValueError("Every argument must be given the same number of times")
+
+        columns = [self.to_float(feature, feature_values) for feature, feature_values in zip(self.features, values)]
+        return self.validate(np.column_stack(columns))
+
+    def parse_rows(self, rows):
+        """
+        Reads the rows of a batch request.
+
+        Parameters:
+        - rows (list or pd.DataFrame): A DataFrame, a list of dicts keyed by argument or
+          column name, or a list of lists in the order of `features`.
+
+        Returns:
+        - input_data (numpy.ndarray): Validated (n, features) float matrix.
+        """
+        if isinstance(rows, pd.DataFrame):
+            columns = [self.to_float(feature, rows[self.key(feature, rows.columns)]) for feature in self.features]
+            return self.validate(np.column_stack(columns))
+
+        if len(rows) == 0:
+            return np.empty((0, len(self.features)))
+
+        if isinstance(rows[0], dict):
+            columns = []
+            for feature in self.features:
+                key = self.key(feature, rows[0])
+                try:
+                    columns.append(self.to_float(feature, [row[key] for row in rows]))
+                except KeyError:
+                    raise ValueError(f"Missing feature '{feature.name}' in some rows")
+            return self.validate(np.column_stack(columns))
+
+        try:
+            input_data = np.asarray(rows, dtype=float)
+        except ValueError as e:
+            raise ValueError(f"Rows must be lists of {len(self.features)} numbers: {e}")
+        return self.validate(input_data)
+
+    @staticmethod
+    def key(feature, keys):
+        """
+        Returns the key under which a feature is given, its argument name or its column name.
+        """
+        if feature.name in keys:
+            return feature.name
+        if feature.column in keys:
+            return feature.column
+        raise ValueError(f"Missing feature '{feature.name}'")
+
+    @staticmethod
+    def to_float(feature, values):
+        try:
+            return np.asarray(values, dtype=float)
+        except (TypeError, ValueError):
+            raise ValueError(f"Feature '{feature.name}' must be a number")
+
+    def validate(self, input_data):
+        """
+        Checks the shape and values of an input matrix.
+
+        Parameters:
+        - input_data (numpy.ndarray): (n, features) float matrix.
+
+        Returns:
+        - input_data (numpy.ndarray): The same matrix.
+        """
+        if input_data.ndim != 2 or input_data.shape[1] != len(self.features):
+            raise ValueError(f"Model '{self.name}' expects {len(self.features)} features: "
+                             f"{[feature.name for feature in self.features]}")
+
+        invalid = ~np.isfinite(input_data)
+        if len(self.integer_positions):
+            integers = input_data[:, self.integer_positions]
+            invalid[:, self.integer_positions] |= integers != np.round(integers)
+        if invalid.any():
+            feature = self.features[np.nonzero(invalid.any(axis=0))[0][0]]
+            kind = 'a whole number' if feature.dtype is int else 'a finite number'
+            raise ValueError(f"Feature '{feature.name}' must be {kind}")
+        return input_data
+
+    def decode(self, predictions):
+        """
+        Converts the raw output of the model into the labels returned by the API.
+
+        Parameters:
+        - predictions (numpy.ndarray): Raw predictions returned by the model's `predict`.
+
+        Returns:
+        - labels (list): One label per row.
+        """
+        if self.label_mapping is not None:
+            return [self.label_mapping[prediction] for prediction in predictions.tolist()]
+        if self.binary:
+            return predictions.astype(bool).tolist()
+        return predictions.tolist()
+
+
+SCHEMAS = {schema.name: schema for schema in [
+    ModelSchema('wine', [Feature('volatile_acidity', float, column='volatile acidity'),
+                         Feature('density', float),
+                         Feature('alcohol', float)],
+                label_mapping={0: 'Bad', 1: 'Good', 2: 'Regular'}),
+    ModelSchema('stroke', [Feature('age', int),
+                           Feature('hypertension', int),
+                           Feature('heart_disease', int),
+                           Feature('avg_glucose_level', float)],
+                binary=True),
+    ModelSchema('pokemon', [Feature('base_egg_steps', int),
+                            Feature('percentage_male', float)],
+                binary=True),
+    ModelSchema('heart_failure', [Feature('ejection_fraction', int),
+                                  Feature('time', int)],
+                binary=True),
+    ModelSchema('drug', [Feature('age', int, column='Age'),
+                         Feature('sex', int, column='Sex'),
+                         Feature('bp', int, column='BP'),
+                         Feature('cholesterol', int, column='Cholesterol'),
+                         Feature('na_to_k', float, column='Na_to_K')]),
+    ModelSchema('breast_cancer', [Feature('concave_points_worst', float, column='concave points_worst'),
+                                  Feature('perimeter_worst', float)],
+                binary=True),
+]}
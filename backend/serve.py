@@ -0,0 +1,114 @@
+"""
+Production entry point for the backend.
+
+Runs the Flask app under gunicorn with several worker processes forked from one parent.
+The parent loads the pickled sklearn/statsmodels models and builds the forecast tables
+before forking, so the workers share those pages copy-on-write instead of each loading
+its own copy. `gc.freeze()` is called before forking so that garbage collection in the
+workers does not write to the shared objects.
+
+The FER and STT Keras models are loaded in each worker right after the fork. TensorFlow
+starts its thread pools when the first model is built, and those pools do not survive a
+fork, so the Keras models cannot be shared the same way. Importing the app does not
+import TensorFlow, so each worker initialises its own. Each worker's TensorFlow and BLAS
+thread pools are sized to its share of the cores, through environment variables set
+before the import, so that N workers do not oversubscribe the machine.
+
+gunicorn only runs on Unix. On Windows use `python server.py`.
+
+Usage (from the backend directory):
+    python serve.py --workers 4 --bind 0.0.0.0:5000
+"""
+import argparse
+import gc
+import os
+
+
+def parse_args():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bind', default='0.0.0.0:5000', help='Address to listen on.')
+    parser.add_argument('--workers', type=int, default=cpu_count, help='Number of worker processes.')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Request threads per worker. More than one uses gunicorn gthread workers.')
+    parser.add_argument('--timeout', type=int, default=120, help='Seconds before a silent worker is restarted.')
+    parser.add_argument('--tf-threads', type=int, default=None,
+                        help='TensorFlow intra-op threads per worker. Defaults to cores / workers.')
+    args = parser.parse_args()
+    if args.tf_threads is None:
+        args.tf_threads = max(1, cpu_count // args.workers)
+    return args
+
+
+args = parse_args()
+
+# Thread pools are sized from the environment when numpy and TensorFlow are initialised,
+# so these variables must be set before importing the app. TensorFlow's pools cannot be
+# resized once it has started.
+for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+    os.environ.setdefault(variable, str(args.tf_threads))
+os.environ.setdefault('TF_NUM_INTEROP_THREADS', '1')
+
+# Models are loaded explicitly below; threads started by the app would not survive the fork
+os.environ['MODEL_WARMUP'] = 'lazy'
+os.environ['FORECAST_TABLE_BACKGROUND'] = '0'
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+
+import fer  # noqa: E402
+import tts  # noqa: E402
+from server import app, model_loader  # noqa: E402
+
+
+def post_fork(server, worker):
+    """
+    Loads the Keras models in one worker, which initialises its TensorFlow.
+
+    Args:
+        server: The gunicorn arbiter.
+        worker: The worker that has just been forked.
+    """
+    fer.load_model()
+    tts.load_model()
+    server.log.info(f"Worker {worker.pid} ready with {args.tf_threads} TensorFlow threads")
+
+
+class PreforkServer(BaseApplication):
+    def __init__(self, application, options):
+        """
+        Initializes the PreforkServer class.
+
+        This class runs an already imported WSGI application under gunicorn, so the models
+        loaded in this process are inherited by every worker.
+
+        Args:
+            application: The WSGI application to serve.
+            options (dict): gunicorn settings.
+        """
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+if __name__ == '__main__':
+    # Load the shared models in the parent, then keep the collector away from them
+    load_times = model_loader.warm()
+    print(f"Loaded {len(load_times)} models in the parent process")
+    gc.freeze()
+
+    PreforkServer(app, {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'preload_app': True,
+        'post_fork': post_fork,
+    }).run()
@@ -1,17 +1,284 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
+from flask_sock import Sock
 from models import ModelLoader
+from schemas import SCHEMAS
+from cache import ResultCache, MemoryBackend, DiskBackend, SingleFlight
+import metrics
 import os
-import tempfile
 import requests
 import fer
 import tts
+import weapons
 import cv2
 import numpy as np
+import pandas as pd
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 CORS(app)
-model_loader = ModelLoader()
+sock = Sock(app)
+metrics.instrument(app)
+
+# Optional window of dates for which the SARIMAX forecasts are precomputed at startup
+forecast_window = None
+if os.environ.get('FORECAST_TABLE_START') and os.environ.get('FORECAST_TABLE_END'):
+    forecast_window = (os.environ['FORECAST_TABLE_START'], os.environ['FORECAST_TABLE_END'])
+
+# COMPILED_MODELS=0 serves the tabular models from their pickles even when a compiled form exists
+# FORECAST_MAX_HORIZON bounds the number of periods of a forecast range, longer ranges are rejected with a 400
+model_loader = ModelLoader(forecast_window=forecast_window,
+                           precompute_in_background=os.environ.get('FORECAST_TABLE_BACKGROUND', '1') == '1',
+                           mmap_mode=os.environ.get('MODEL_MMAP_MODE') or None,
+                           prefer_compiled=os.environ.get('COMPILED_MODELS', '1') == '1',
+                           max_horizon=int(os.environ['FORECAST_MAX_HORIZON']) if os.environ.get('FORECAST_MAX_HORIZON')
+                           else None)
+
+
+def warm_models():
+    """
+    Loads every model ahead of the first request that needs it.
+
+    The FER and STT Keras models, and the weapon detector when it has been exported, are loaded in parallel with the
+     pickled models.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        keras_loads = [executor.submit(fer.load_model), executor.submit(tts.load_model)]
+        if os.path.exists(weapons.model_path):
+            keras_loads.append(executor.submit(weapons.load_model))
+        model_loader.warm()
+        for keras_load in keras_loads:
+            keras_load.result()
+    print(f"Models warmed in {time.perf_counter() - start:.2f}s")
+
+
+# MODEL_WARMUP selects when the models are loaded: 'lazy' loads each one on its first
+# request, 'background' warms them all in a thread while serving, 'eager' before serving
+model_warmup = os.environ.get('MODEL_WARMUP', 'background')
+if model_warmup == 'eager':
+    warm_models()
+elif model_warmup == 'background':
+    threading.Thread(target=warm_models, daemon=True).start()
+
+
+# Optional cache of /recognize_emotion, /transcribe_audio and /detect_weapons results: RESULT_CACHE is 'memory' for a
+# cache per worker, 'disk' for one shared by every worker through RESULT_CACHE_DIR (e.g. under /dev/shm), or empty to
+# disable it
+result_cache = None
+result_cache_size = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+if os.environ.get('RESULT_CACHE') == 'memory':
+    result_cache = ResultCache(MemoryBackend(result_cache_size), float(os.environ.get('RESULT_CACHE_TTL', 3600)))
+elif os.environ.get('RESULT_CACHE') == 'disk':
+    result_cache = ResultCache(DiskBackend(os.environ.get('RESULT_CACHE_DIR', 'result_cache'), result_cache_size),
+                               float(os.environ.get('RESULT_CACHE_TTL', 3600)))
+
+
+def cached_result(data, model_version, compute):
+    """
+    Returns the result of a pipeline for an upload, from the result cache when possible.
+
+    Args:
+        data (bytes): The uploaded file.
+        model_version (callable): Function returning the version of the model that processes the file.
+        compute (callable): Function that runs the pipeline and returns a JSON-serializable result.
+
+    Returns:
+        The result of `compute`, or the cached result of an earlier identical upload.
+    """
+    if result_cache is None:
+        return compute()
+
+    key = result_cache.key(data, model_version())
+    hit, result = result_cache.lookup(key)
+    if not hit:
+        result = compute()
+        result_cache.store(key, result)
+    return result
+
+
+# Memo of the GET prediction routes, keyed by model version and normalized arguments: PREDICTION_CACHE_SIZE entries per
+# worker, 0 disables it. Concurrent identical misses share one computation either way.
+prediction_cache_size = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+prediction_cache = ResultCache(MemoryBackend(prediction_cache_size)) if prediction_cache_size > 0 else None
+prediction_flights = SingleFlight()
+
+# Seconds for which browsers and proxies may reuse a GET prediction without revalidating its ETag
+prediction_max_age = int(os.environ.get('PREDICTION_MAX_AGE', 3600))
+
+
+def prediction_key(model, arguments):
+    """
+    Computes the memo key of a prediction request, which is also the ETag of its response.
+
+    Args:
+        model (str): Name of the model.
+        arguments (bytes): The normalized arguments of the request, see `forecast_arguments` and `tabular_arguments`.
+
+    Returns:
+        str: Hexadecimal key, or None when the model is missing.
+    """
+    version = model_loader.model_version(model)
+    if version is None:
+        return None
+    return ResultCache.key(arguments, f"{model}:{version}")
+
+
+def forecast_arguments(args):
+    """
+    Normalizes the arguments of a forecast request, so that e.g. '2022-3-1' and '2022-03-01' share a key.
+
+    Args:
+        args: Query arguments with a `get` method.
+
+    Returns:
+        bytes: The arguments that the forecast depends on, as canonical JSON.
+    """
+    names = ('input_date',) if args.get('start') is None else ('start', 'end', 'horizon')
+    normalized = {}
+    for name in names:
+        value = args.get(name)
+        try:
+            if value is not None:
+                value = int(value) if name == 'horizon' else pd.to_datetime(value).isoformat()
+        except (TypeError, ValueError):
+            # Invalid arguments are rejected by the route, the raw value keeps them apart from valid ones
+            pass
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True).encode()
+
+
+def tabular_arguments(input_data, single):
+    """
+    Normalizes the arguments of a tabular prediction, so that e.g. 'age=65' and 'age=65.0' share a key.
+
+    Args:
+        input_data (numpy.ndarray): The validated rows, as returned by `ModelSchema.parse_query`.
+        single (bool): Whether the response has the `prediction` of one row or the list of `predictions`.
+
+    Returns:
+        bytes: The response shape followed by the rows.
+    """
+    return f"{int(single)}:{input_data.shape}:".encode() + np.ascontiguousarray(input_data, dtype=np.float64).tobytes()
+
+
+def memoized_prediction(key, compute, lookup=True):
+    """
+    Returns the result of a prediction, from the memo when possible.
+
+    Concurrent calls with the same key that miss the memo share one call to `compute`. Results of None, returned by the
+     models when they fail, are not memoized.
+
+    Args:
+        key (str): Key returned by `prediction_key`, or None to always compute.
+        compute (callable): Function that computes the result.
+        lookup (bool): Look the key up in the memo first. The ASGI app looks it up on the event loop before calling
+         this function in a model pool.
+
+    Returns:
+        The result of `compute`, or the memoized result of an earlier identical request.
+    """
+    if key is None:
+        return compute()
+
+    if lookup and prediction_cache is not None:
+        hit, result = prediction_cache.lookup(key)
+        if hit:
+            return result
+
+    def compute_and_store():
+        result = compute()
+        if prediction_cache is not None and result is not None:
+            prediction_cache.store(key, result)
+        return result
+
+    return prediction_flights.run(key, compute_and_store)
+
+
+def etag_matches(if_none_match, key):
+    """
+    Checks whether an If-None-Match header names the ETag of a key.
+
+    Args:
+        if_none_match (str): The header, or None.
+        key (str): Key returned by `prediction_key`.
+
+    Returns:
+        bool: True when the client already holds the response.
+    """
+    if not if_none_match or key is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/').strip('"') == key for tag in tags)
+
+
+def cache_headers(key):
+    """
+    Returns the caching headers of a GET prediction.
+
+    The key changes with the model file, so a reverse proxy or a browser can reuse a response for
+     `prediction_max_age` seconds and then revalidate it with If-None-Match.
+    """
+    return {'ETag': f'"{key}"', 'Cache-Control': f"public, max-age={prediction_max_age}"}
+
+
+def cacheable(response, key, result):
+    """
+    Adds the caching headers to the response of a GET prediction, unless the prediction failed.
+    """
+    if request.method == 'GET' and key is not None and result is not None:
+        response.headers.update(cache_headers(key))
+    return response
+
+
+def not_modified(key):
+    return Response(status=304, headers=cache_headers(key))
+
+
+def sarimax_response(model):
+    """
+    Answers a forecast request with a SARIMAX model.
+
+    A single date is read from the `input_date` argument. A range is read from the
+    `start` argument together with either `end` or `horizon` (number of periods), and
+    is computed in one call to `model_loader.forecast_SARIMAX`. Invalid ranges, and ranges
+    longer than FORECAST_MAX_HORIZON periods, are answered with a 400.
+
+    Args:
+        model (str): Name of the SARIMAX model to use.
+
+    Returns:
+        Response: A JSON response with the prediction for a single date, or the forecast for a range.
+    """
+    key = prediction_key(model, forecast_arguments(request.args))
+    if request.method == 'GET' and etag_matches(request.headers.get('If-None-Match'), key):
+        return not_modified(key)
+
+    start_date = request.args.get('start')
+    if start_date is None:
+        input_date = request.args.get('input_date')
+        prediction = memoized_prediction(key, lambda: model_loader.process_SARIMAX(model, input_date))
+        return cacheable(jsonify(prediction=prediction), key, prediction)
+
+    end_date = request.args.get('end')
+    horizon = request.args.get('horizon')
+    if end_date is None and horizon is None:
+        return jsonify({'error': "A range needs either an 'end' date or a 'horizon'"}), 400
+    try:
+        horizon = int(horizon) if horizon is not None else None
+    except ValueError:
+        return jsonify({'error': f"'horizon' must be an integer, got {horizon!r}"}), 400
+
+    try:
+        forecast = memoized_prediction(key,
+                                       lambda: model_loader.forecast_SARIMAX(model, start_date, end_date, horizon))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cacheable(jsonify(forecast=forecast), key, forecast)
 
 
 @app.route('/s&p_prediction', methods=['GET'])
@@ -26,11 +293,10 @@ def s_and_p_prediction():
 
         Returns:
         - prediction (float): Predicted value of S&P index.
+        - forecast (dict): Dates, predictions and confidence bounds when a
+          `start` date with an `end` date or a `horizon` is given instead.
         """
-    model = 's&p'
-    input_date = request.args.get('input_date')
-    prediction = model_loader.process_SARIMAX(model, input_date)
-    return jsonify(prediction=prediction)
+    return sarimax_response('s&p')
 
 
 @app.route('/ethereum_prediction', methods=['GET'])
@@ -45,11 +311,10 @@ def ethereum_prediction():
 
        Returns:
        - prediction (float): Predicted value of Ethereum cryptocurrency.
+       - forecast (dict): Dates, predictions and confidence bounds when a
+         `start` date with an `end` date or a `horizon` is given instead.
        """
-    model = 'ethereum'
-    input_date = request.args.get('input_date')
-    prediction = model_loader.process_SARIMAX(model, input_date)
-    return jsonify(prediction=prediction)
+    return sarimax_response('ethereum')
 
 
 @app.route('/bitcoin_prediction', methods=['GET'])
@@ -64,11 +329,10 @@ def bitcoin_prediction():
 
        Returns:
        - prediction (float): Predicted value of Bitcoin cryptocurrency.
+       - forecast (dict): Dates, predictions and confidence bounds when a
+         `start` date with an `end` date or a `horizon` is given instead.
        """
-    model = 'bitcoin'
-    input_date = request.args.get('input_date')
-    prediction = model_loader.process_SARIMAX(model, input_date)
-    return jsonify(prediction=prediction)
+    return sarimax_response('bitcoin')
 
 
 @app.route('/avocado_prediction', methods=['GET'])
@@ -83,11 +347,79 @@ def avocado_prediction():
 
         Returns:
         - prediction (float): Predicted price of avocados.
+        - forecast (dict): Dates, predictions and confidence bounds when a
+          `start` date with an `end` date or a `horizon` is given instead.
         """
-    model = 'avocado'
-    input_date = request.args.get('input_date')
-    prediction = model_loader.process_SARIMAX(model, input_date)
-    return jsonify(prediction=prediction)
+    return sarimax_response('avocado')
+
+
+def prediction_response(model, single=False):
+    """
+    Answers a prediction request with any model, through the model's schema in `SCHEMAS`.
+
+    GET requests read the rows from the query arguments, where repeating every argument
+    scores several rows (see `ModelSchema.parse_query`). POST requests read them from the
+    body (see `read_batch_rows`). Both are parsed and validated into one matrix that is
+    scored by `model_loader.predict`. Forecast models are answered by `sarimax_response`.
+
+    Args:
+        model (str): Name of the model to use.
+        single (bool): Answer with the `prediction` for the first row, as the per-model GET
+         routes do, instead of the list of `predictions`.
+
+    Returns:
+        Response: A JSON response with the predictions, or an error message.
+    """
+    if model in ModelLoader.SARIMAX_MODELS:
+        return sarimax_response(model)
+
+    schema = SCHEMAS.get(model)
+    if schema is None:
+        return jsonify({'error': f"Unknown model '{model}'"}), 404
+
+    try:
+        if request.method == 'GET':
+            input_data = schema.parse_query(request.args)
+        else:
+            input_data = schema.parse_rows(read_batch_rows())
+    except Exception as e:
+        error_msg = f"Error reading input for model '{model}': {e}"
+        print(error_msg)
+        return jsonify({'error': error_msg}), 400
+
+    if single:
+        input_data = input_data[:1]
+
+    # GET predictions are memoized and carry an ETag, the batch rows of POST requests are not
+    key = prediction_key(model, tabular_arguments(input_data, single)) if request.method == 'GET' else None
+    if etag_matches(request.headers.get('If-None-Match'), key):
+        return not_modified(key)
+
+    try:
+        predictions = memoized_prediction(key, lambda: model_loader.predict(model, input_data))
+    except Exception as e:
+        print(f"Error predicting with model '{model}': {e}")
+        predictions = None
+
+    if single:
+        return cacheable(jsonify(prediction=predictions[0] if predictions else None), key, predictions)
+    return cacheable(jsonify(predictions=predictions), key, predictions)
+
+
+@app.route('/predict/<model>', methods=['GET', 'POST'])
+def predict(model):
+    """
+    Predicts with any model served by the backend.
+
+    The per-model URLs (e.g. /wine_prediction and /wine_batch_prediction) are aliases of
+    this route. Tabular models take their features as query arguments or as rows in the
+    body; forecast models take the same arguments as /bitcoin_prediction.
+
+    Returns:
+    - predictions (list): Predicted label for each row, for tabular models.
+    - prediction or forecast: As returned by the forecast routes, for forecast models.
+    """
+    return prediction_response(model)
 
 
 @app.route('/wine_prediction', methods=['GET'])
@@ -97,17 +429,13 @@ def wine_prediction():
 
       This function retrieves the volatile acidity, density, and alcohol
       content from the request arguments and passes them to the
-      `model_loader.wine_prediction` function. The prediction result
+      `model_loader.predict` method. The prediction result
       is then returned as a JSON object.
 
       Returns:
       - prediction (str): Predicted quality of wine (e.g., 'Good', 'Bad').
       """
-    volatile_acidity = float(request.args.get('volatile_acidity'))
-    density = float(request.args.get('density'))
-    alcohol = float(request.args.get('alcohol'))
-    prediction = model_loader.wine_prediction(volatile_acidity, density, alcohol)
-    return jsonify(prediction=prediction)
+    return prediction_response('wine', single=True)
 
 
 @app.route('/stroke_prediction', methods=['GET'])
@@ -117,7 +445,7 @@ def stroke_prediction():
 
     This function retrieves age, hypertension, heart disease, and average
     glucose level from the request arguments and passes them to the
-    `model_loader.stroke_prediction` function. The prediction result
+    `model_loader.predict` method. The prediction result
     is a boolean value indicating whether the likelihood of stroke is high
     (True) or low (False).
 
@@ -125,13 +453,7 @@ def stroke_prediction():
     - prediction (bool): True if the likelihood of stroke is high,
                          False otherwise.
     """
-    age = int(request.args.get('age'))
-    print(age)
-    hypertension = int(request.args.get('hypertension'))
-    heart_disease = int(request.args.get('heart_disease'))
-    avg_glucose_level = float(request.args.get('avg_glucose_level'))
-    prediction = model_loader.stroke_prediction(age, hypertension, heart_disease, avg_glucose_level)
-    return jsonify(prediction=prediction)
+    return prediction_response('stroke', single=True)
 
 
 @app.route('/pokemon_prediction', methods=['GET'])
@@ -141,7 +463,7 @@ def pokemon_prediction():
 
       This function retrieves the base egg steps and male percentage
       from the request arguments and passes them to the
-      `model_loader.pokemon_prediction` function. The prediction
+      `model_loader.predict` method. The prediction
       result is then returned as a JSON object indicating whether
       the Pokémon is legendary or not.
 
@@ -149,10 +471,7 @@ def pokemon_prediction():
       - prediction (bool): True if the Pokémon is predicted to be legendary,
                            False otherwise.
       """
-    base_egg_steps = int(request.args.get('base_egg_steps'))
-    percentage_male = float(request.args.get('percentage_male'))
-    prediction = model_loader.pokemon_prediction(base_egg_steps, percentage_male)
-    return jsonify(prediction=prediction)
+    return prediction_response('pokemon', single=True)
 
 
 @app.route('/heart_failure_prediction', methods=['GET'])
@@ -161,18 +480,15 @@ def heart_failure_prediction():
     Predicts the likelihood of heart failure based on health parameters.
 
     This function retrieves ejection fraction and time from the request
-    arguments and passes them to the `model_loader.heart_failure_prediction`
-    function. The prediction result is a boolean value indicating whether
+    arguments and passes them to the `model_loader.predict`
+    method. The prediction result is a boolean value indicating whether
     the likelihood of heart failure is high (True) or low (False).
 
     Returns:
     - prediction (bool): True if the likelihood of heart failure is high,
                          False otherwise.
     """
-    ejection_fraction = int(request.args.get('ejection_fraction'))
-    time = int(request.args.get('time'))
-    prediction = model_loader.heart_failure_prediction(ejection_fraction, time)
-    return jsonify(prediction=prediction)
+    return prediction_response('heart_failure', single=True)
 
 
 @app.route('/drug_prediction', methods=['GET'])
@@ -182,19 +498,13 @@ def drug_prediction():
 
         This function retrieves age, sex, blood pressure, cholesterol,
         and sodium-to-potassium ratio from the request arguments and passes
-        them to the `model_loader.drug_prediction` function. The prediction
+        them to the `model_loader.predict` method. The prediction
         result is then returned as a JSON object.
 
         Returns:
         - prediction (str): Recommended drug for the patient.
         """
-    age = int(request.args.get('age'))
-    sex = int(request.args.get('sex'))
-    bp = int(request.args.get('bp'))
-    cholesterol = int(request.args.get('cholesterol'))
-    na_to_k = float(request.args.get('na_to_k'))
-    prediction = model_loader.drug_prediction(age, sex, bp, cholesterol, na_to_k)
-    return jsonify(prediction=prediction)
+    return prediction_response('drug', single=True)
 
 
 @app.route('/breast_cancer_prediction', methods=['GET'])
@@ -204,7 +514,7 @@ def breast_cancer_prediction():
 
     This function retrieves concave points worst and perimeter worst
     from the request arguments and passes them to the
-    `model_loader.breast_cancer_prediction` function. The prediction
+    `model_loader.predict` method. The prediction
     result is a boolean value indicating whether the likelihood of
     breast cancer is high (True) or low (False).
 
@@ -212,10 +522,105 @@ def breast_cancer_prediction():
     - prediction (bool): True if the likelihood of breast cancer is high,
                          False otherwise.
     """
-    concave_points_worst = float(request.args.get('concave_points_worst'))
-    perimeter_worst = float(request.args.get('perimeter_worst'))
-    prediction = model_loader.breast_cancer_prediction(concave_points_worst, perimeter_worst)
-    return jsonify(prediction=prediction)
+    return prediction_response('breast_cancer', single=True)
+
+
+def read_batch_rows():
+    """
+    Reads the rows of a batch prediction request.
+
+    The body can be a CSV file with a header row (Content-Type `text/csv`), a JSON
+    array of rows, or a JSON object with the array under the `rows` key. Each JSON
+    row is either an object keyed by feature name or an array in feature order.
+
+    Returns:
+        pd.DataFrame or list: The rows to score.
+    """
+    if request.mimetype == 'text/csv':
+        return pd.read_csv(io.StringIO(request.get_data(as_text=True)))
+
+    rows = request.get_json(force=True)
+    if isinstance(rows, dict):
+        rows = rows['rows']
+    return rows
+
+
+@app.route('/wine_batch_prediction', methods=['POST'])
+def wine_batch_prediction():
+    """
+    Predicts the quality of many wines in a single call.
+
+    Each row needs the volatile acidity, density and alcohol columns.
+
+    Returns:
+    - predictions (list of str): Predicted quality of each wine.
+    """
+    return prediction_response('wine')
+
+
+@app.route('/stroke_batch_prediction', methods=['POST'])
+def stroke_batch_prediction():
+    """
+    Predicts the likelihood of stroke for many patients in a single call.
+
+    Each row needs the age, hypertension, heart_disease and avg_glucose_level columns.
+
+    Returns:
+    - predictions (list of bool): True for each patient with a high likelihood of stroke.
+    """
+    return prediction_response('stroke')
+
+
+@app.route('/pokemon_batch_prediction', methods=['POST'])
+def pokemon_batch_prediction():
+    """
+    Predicts whether many Pokémon are legendary in a single call.
+
+    Each row needs the base_egg_steps and percentage_male columns.
+
+    Returns:
+    - predictions (list of bool): True for each Pokémon predicted to be legendary.
+    """
+    return prediction_response('pokemon')
+
+
+@app.route('/heart_failure_batch_prediction', methods=['POST'])
+def heart_failure_batch_prediction():
+    """
+    Predicts the likelihood of heart failure for many patients in a single call.
+
+    Each row needs the ejection_fraction and time columns.
+
+    Returns:
+    - predictions (list of bool): True for each patient with a high likelihood of heart failure.
+    """
+    return prediction_response('heart_failure')
+
+
+@app.route('/drug_batch_prediction', methods=['POST'])
+def drug_batch_prediction():
+    """
+    Predicts the recommended drug for many patients in a single call.
+
+    Each row needs the Age, Sex, BP, Cholesterol and Na_to_K columns.
+
+    Returns:
+    - predictions (list of str): Recommended drug for each patient.
+    """
+    return prediction_response('drug')
+
+
+@app.route('/breast_cancer_batch_prediction', methods=['POST'])
+def breast_cancer_batch_prediction():
+    """
+    Predicts the likelihood of breast cancer for many tumors in a single call.
+
+    Each row needs the concave points_worst and perimeter_worst columns.
+
+    Returns:
+    - predictions (list of bool): True for each tumor with a high likelihood of breast cancer.
+    """
+    return prediction_response('breast_cancer')
 
 
 @app.route('/transcribe_audio', methods=['POST'])
@@ -224,8 +629,8 @@ def transcribe_audio_route():
     Endpoint to transcribe an audio file uploaded via a POST request.
 
     This endpoint accepts an audio file through a POST request, processes it, and returns the transcription as a JSON
-     response. It first saves the uploaded file to a temporary location, then transforms and transcribes the audio using
-     the functions defined in the `tts` module.
+     response. The upload is decoded in memory and transcribed using the functions defined in the `tts` module, so no
+     temporary files are written.
 
     Returns:
         Response: A JSON response containing the transcription or an error message.
@@ -233,16 +638,11 @@ def transcribe_audio_route():
     try:
         # Get the audio file from the request
         audio_file = request.files['audio']
+        audio_bytes = audio_file.read()
 
-        # Save the file to a temporary location
-        temp_file = tempfile.NamedTemporaryFile(delete=False)
-        audio_file.save(temp_file.name)
-
-        # Transform the audio file
-        transformed_audio_file = tts.transform_audio(temp_file.name)
-
-        # Transcribe the transformed audio file
-        transcription = tts.transcribe_audio(transformed_audio_file.name)
+        # Decode the audio in memory and transcribe it, unless the same file was transcribed before
+        transcription = cached_result(audio_bytes, tts.model_version,
+                                      lambda: tts.transcribe_samples(tts.decode_audio(audio_bytes)))
         print(transcription)
 
         # Return the transcription as JSON response
@@ -254,6 +654,53 @@ def transcribe_audio_route():
         return jsonify({'error': error_msg})
 
 
+@sock.route('/transcribe_stream')
+def transcribe_stream(ws):
+    """
+    WebSocket endpoint to transcribe audio while the user is talking.
+
+    The client sends binary messages with chunks of mono 16-bit little-endian PCM at 22050 Hz and a text message
+     'end' after the last chunk. While audio arrives, the endpoint sends JSON messages with a `partial` transcript, and
+     after 'end' a message with the final `transcription`. Every message includes the seconds of audio received and
+     `first_token_seconds`, the time from the first chunk to the first non-empty partial transcript. A chunk with an
+     odd number of bytes gets an `error` message and closes the connection with code 1007 (invalid payload).
+
+    Args:
+        ws: The WebSocket connection.
+    """
+    transcriber = tts.StreamingTranscriber()
+    start = None
+    first_token_seconds = None
+
+    while True:
+        message = ws.receive()
+        if isinstance(message, str):
+            if message == 'end':
+                break
+            continue
+
+        if start is None:
+            start = time.perf_counter()
+
+        try:
+            samples = tts.pcm_samples(message)
+        except ValueError as e:
+            ws.send(json.dumps({'error': str(e)}))
+            ws.close(reason=1007, message=str(e))
+            return
+
+        partial = transcriber.add_audio(samples)
+        if partial is not None:
+            if partial and first_token_seconds is None:
+                first_token_seconds = time.perf_counter() - start
+            ws.send(json.dumps({'partial': partial, 'audio_seconds': transcriber.audio_seconds,
+                                'first_token_seconds': first_token_seconds}))
+
+    transcription = transcriber.finish()
+    ws.send(json.dumps({'transcription': transcription, 'audio_seconds': transcriber.audio_seconds,
+                        'first_token_seconds': first_token_seconds}))
+
+
 @app.route('/recognize_emotion', methods=['POST'])
 def process_image():
     """
@@ -268,16 +715,25 @@ def process_image():
     try:
         # Get the image file from the request
         image_file = request.files['file']
+        image_bytes = image_file.read()
+
+        def recognize():
+            # Read the image file using OpenCV
+            with metrics.stage('fer', 'decode'):
+                img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), -1)
+
+            # Detect faces in the image
+            faces = fer.detectFaces(img)
+            if not faces:
+                return None
 
-        # Read the image file using OpenCV
-        img = cv2.imdecode(np.frombuffer(image_file.read(), np.uint8), -1)
+            # Recognize the emotion of the first face, batched with concurrent requests
+            return fer.emotionRecognitionBatched(faces[:1])[0]
 
-        # Detect faces in the image
-        faces = fer.detectFaces(img)
+        # Run the pipeline unless the same image was processed before
+        emotions = cached_result(image_bytes, fer.model_version, recognize)
 
-        if faces:
-            # Recognize emotions in detected faces
-            emotions = fer.emotionRecognition(faces)[0]
+        if emotions is not None:
             return jsonify({'emotions': emotions})
         else:
             return "None"
@@ -287,5 +743,150 @@ def process_image():
         return jsonify({'error': str(e)})
 
 
+def track_emotion(tracker, image_bytes):
+    """
+    Recognizes the emotion of the face followed by a tracker in one video frame.
+
+    Args:
+        tracker (fer.FaceTracker): The face tracker of the session.
+        image_bytes (bytes): The encoded frame, e.g. a JPEG.
+
+    Returns:
+        dict: The `emotions` of the tracked face and its `box` (x, y, width, height), both None when no face is found.
+    """
+    with metrics.stage('fer', 'decode'):
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), -1)
+    if img is None:
+        return {'error': "The frame could not be decoded"}
+
+    face, box = tracker.update(img)
+    if face is None:
+        return {'emotions': None, 'box': None}
+    return {'emotions': fer.emotionRecognitionBatched([face])[0], 'box': list(box)}
+
+
+@sock.route('/recognize_emotion_stream')
+def recognize_emotion_stream(ws):
+    """
+    WebSocket endpoint to recognize emotions in the frames of a webcam session.
+
+    The client sends each frame as a binary message with an encoded image (e.g. a JPEG) and a text message 'end'
+     when the session stops. The endpoint answers every frame with a JSON message with the `emotions` of the tracked
+     face and its `box`. The face is followed between frames by a `fer.FaceTracker`, so the full-frame face detection
+     only runs when the face is lost. After 'end' it sends the frame counters of the session.
+
+    Args:
+        ws: The WebSocket connection.
+    """
+    tracker = fer.FaceTracker()
+
+    while True:
+        message = ws.receive()
+        if isinstance(message, str):
+            if message == 'end':
+                break
+            continue
+
+        try:
+            ws.send(json.dumps(track_emotion(tracker, message)))
+        except Exception as e:
+            print(f"Error processing frame: {e}")
+            ws.send(json.dumps({'error': str(e)}))
+
+    ws.send(json.dumps(tracker.stats()))
+
+
+@app.route('/detect_weapons', methods=['POST'])
+def detect_weapons():
+    """
+    Endpoint to detect weapons in an uploaded image file.
+
+    Returns:
+        Response: A JSON response with the `detections` of the image, each with its `label`, `confidence` and `box`
+         (x, y, width, height), or an error message.
+    """
+    try:
+        image_bytes = request.files['file'].read()
+        detections = cached_result(image_bytes, weapons.model_version, lambda: weapons.detect_image(image_bytes))
+        return jsonify({'detections': detections})
+
+    except Exception as e:
+        print(f"Error detecting weapons: {e}")
+        return jsonify({'error': str(e)})
+
+
+@app.route('/detect_weapons_video', methods=['POST'])
+def detect_weapons_video():
+    """
+    Endpoint to detect weapons in an uploaded video file.
+
+    The video is sampled at `weapons.sample_fps` frames per second and the sampled frames are detected in batches.
+
+    Returns:
+        Response: A JSON response with the frame rate of the video, the sampling rate and the detections of each
+         sampled frame, or an error message.
+    """
+    try:
+        video_file = request.files['file']
+        video_bytes = video_file.read()
+        suffix = os.path.splitext(video_file.filename or '')[1] or '.mp4'
+        result = cached_result(video_bytes, weapons.model_version,
+                               lambda: weapons.detect_video_bytes(video_bytes, suffix))
+        return jsonify(result)
+
+    except Exception as e:
+        print(f"Error detecting weapons: {e}")
+        return jsonify({'error': str(e)})
+
+
+@app.route('/recognize_emotion/stats', methods=['GET'])
+def emotion_batching_stats():
+    """
+    Endpoint to inspect the emotion recognition batcher.
+
+    Returns:
+        Response: A JSON response with the number of faces waiting in the queue and the number of batches run for
+         each batch size.
+    """
+    return jsonify(fer.get_batcher().stats())
+
+
+def prediction_cache_stats():
+    stats = dict(result_cache.stats()) if result_cache is not None else {}
+    stats['predictions'] = dict(prediction_cache.stats() if prediction_cache is not None else {},
+                                **prediction_flights.stats())
+    return stats
+
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """
+    Endpoint to inspect the result cache of /recognize_emotion and /transcribe_audio, and the memo of the GET
+     prediction routes.
+
+    Returns:
+        Response: A JSON response with the hit, miss and eviction counters of the result cache (none when it is
+         disabled), and under `predictions` those of the memo with the number of calls that shared a computation.
+    """
+    return jsonify(prediction_cache_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    """
+    Endpoint exposing the latency histograms, in-flight requests, model load times, batcher and cache state in the
+     Prometheus text format.
+
+    Returns:
+        Response: The metrics page.
+    """
+    if fer.batcher is not None:
+        metrics.batch_queue_depth.set(fer.batcher.queue.qsize(), fer.batcher.name)
+    if result_cache is not None:
+        for event, count in result_cache.stats().items():
+            metrics.result_cache_events.set(count, event)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,158 @@
+"""
+Transcribes many recordings offline.
+
+The audio files are decoded and turned into spectrograms in a thread pool. The spectrograms
+are then sorted by length and split into buckets of similar length, so each bucket runs
+through the model in one pass with little padding. One JSON line is written per file, in
+the order of the input.
+
+The input is a directory (every file in it is transcribed), or a manifest with one path
+per line or one JSON object per line with an `audio_filepath` or `path` key.
+
+Usage (from the backend directory):
+    python transcribe_batch.py recordings/ --output transcriptions.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tts
+
+
+def read_inputs(source):
+    """
+    Lists the audio files to transcribe.
+
+    Args:
+        source (str): A directory or a manifest file.
+
+    Returns:
+        list of str: The paths of the audio files.
+    """
+    if os.path.isdir(source):
+        return [os.path.join(source, filename) for filename in sorted(os.listdir(source))
+                if os.path.isfile(os.path.join(source, filename))]
+
+    paths = []
+    with open(source) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                entry = json.loads(line)
+                line = entry.get('audio_filepath', entry.get('path'))
+            paths.append(line)
+    return paths
+
+
+def prepare(path):
+    """
+    Decodes an audio file and computes its spectrogram.
+
+    Args:
+        path (str): Path of the audio file.
+
+    Returns:
+        tuple: The spectrogram as a NumPy array and the duration of the audio in seconds.
+    """
+    with open(path, 'rb') as audio_file:
+        samples = tts.decode_audio(audio_file.read())
+    return tts.compute_spectrogram(samples).numpy(), len(samples) / tts.sample_rate
+
+
+def make_buckets(lengths, max_batch_size, max_batch_frames):
+    """
+    Groups items of similar length into batches.
+
+    Args:
+        lengths (list of int): Number of spectrogram frames of each item.
+        max_batch_size (int): Largest number of items in a batch.
+        max_batch_frames (int): Largest number of padded frames in a batch (items x longest item).
+
+    Returns:
+        list of list of int: The indices of the items of each batch.
+    """
+    buckets = []
+    bucket = []
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        # The items are sorted, so the current item is the longest of its bucket
+        if bucket and (len(bucket) == max_batch_size or (len(bucket) + 1) * lengths[index] > max_batch_frames):
+            buckets.append(bucket)
+            bucket = []
+        bucket.append(index)
+    if bucket:
+        buckets.append(bucket)
+    return buckets
+
+
+def transcribe_chunk(paths, executor, args):
+    """
+    Transcribes a group of files.
+
+    Args:
+        paths (list of str): Paths of the audio files.
+        executor (ThreadPoolExecutor): Pool used to decode the audio.
+        args (argparse.Namespace): Command line arguments.
+
+    Returns:
+        list of dict: One result per file, in the same order.
+    """
+    results = [None] * len(paths)
+    spectrograms = [None] * len(paths)
+    futures = [executor.submit(prepare, path) for path in paths]
+    for i, (path, future) in enumerate(zip(paths, futures)):
+        try:
+            spectrograms[i], seconds = future.result()
+            results[i] = {'path': path, 'audio_seconds': seconds}
+        except Exception as e:
+            results[i] = {'path': path, 'error': f"Error decoding audio: {e}"}
+
+    valid = [i for i in range(len(paths)) if spectrograms[i] is not None]
+    lengths = [len(spectrograms[i]) for i in valid]
+    for bucket in make_buckets(lengths, args.batch_size, args.max_batch_frames):
+        indices = [valid[position] for position in bucket]
+        try:
+            transcriptions = tts.transcribe_spectrograms([spectrograms[i] for i in indices])
+        except Exception as e:
+            # A failed model pass only loses its own bucket
+            for i in indices:
+                results[i]['error'] = f"Error transcribing audio: {e}"
+            continue
+        for i, transcription in zip(indices, transcriptions):
+            results[i]['transcription'] = transcription
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='Directory of audio files or manifest.')
+    parser.add_argument('--output', default='transcriptions.jsonl', help='JSONL file to write.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Threads decoding audio.')
+    parser.add_argument('--batch-size', type=int, default=32, help='Largest number of recordings per model pass.')
+    parser.add_argument('--max-batch-frames', type=int, default=32 * 2000,
+                        help='Largest number of padded spectrogram frames per model pass.')
+    parser.add_argument('--chunk-size', type=int, default=1024,
+                        help='Recordings held in memory at once. Buckets are formed within each chunk.')
+    args = parser.parse_args()
+
+    paths = read_inputs(args.source)
+    tts.load_model()
+
+    start = time.perf_counter()
+    audio_seconds = 0.0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor, open(args.output, 'w') as output:
+        for offset in range(0, len(paths), args.chunk_size):
+            for result in transcribe_chunk(paths[offset:offset + args.chunk_size], executor, args):
+                audio_seconds += result.get('audio_seconds', 0.0)
+                output.write(json.dumps(result) + '\n')
+    elapsed = time.perf_counter() - start
+
+    print(f"Transcribed {len(paths)} files ({audio_seconds:.1f} s of audio) in {elapsed:.1f} s: "
+          f"{audio_seconds / elapsed:.1f} audio-seconds per wall-second")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,16 @@
-import tempfile
-import tensorflow as tf
-from tensorflow import keras
+import io
+import math
+import wave
 import ffmpeg
 import numpy as np
 import os
 import logging
+import threading
+import functools
+from inference import compile_inference, compile_tflite_inference
+from cache import file_version
+import metrics
+import time
 
 # Set TensorFlow logging level to only display errors
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # 0 = all messages, 1 = info, 2 = warnings, 3 = errors
@@ -34,6 +40,9 @@ def CTCLoss(y_true, y_pred):
         - The predicted logits `y_pred` should be the raw output of the network before applying softmax.
         - The `input_length` and `label_length` are automatically computed based on the shapes of `y_pred` and `y_true`.
     """
+    import tensorflow as tf
+    from tensorflow import keras
+
     # Compute the training-time loss value
     batch_len = tf.cast(tf.shape(y_true)[0], dtype="int64")
     input_length = tf.cast(tf.shape(y_pred)[1], dtype="int64")
@@ -46,28 +55,155 @@ def CTCLoss(y_true, y_pred):
     return loss
 
 
-model = tf.keras.models.load_model(r'deep_learning_models/weights/tts.keras', custom_objects={'CTCLoss': CTCLoss})
+# STT Model, loaded on first use by `load_model`. A .tflite path, e.g. a model quantized by `quantize.py`, is served by
+# the TFLite interpreter instead of Keras.
+model_path = os.environ.get('TTS_WEIGHTS', r'deep_learning_models/weights/tts.keras')
+model = None
+# Graph-mode inference function of the model, built by `load_model`
+infer = None
+# Spectrogram frames per output time step of the model, measured by `load_model`
+time_stride = None
+model_lock = threading.Lock()
+
+# Number of frequency bins of the spectrogram (fft_length // 2 + 1)
+num_frequency_bins = 193
+
+# Audio format expected by the STT model: mono 16-bit PCM at 22050 Hz
+sample_rate = 22050
+
+# Short-time Fourier transform parameters of the spectrogram
+frame_length = 256
+frame_step = 160
+fft_length = 384
+
+
+def load_model():
+    """
+    Loads the speech-to-text model and compiles its inference function the first time it is needed.
+
+    Returns:
+        tf.keras.Model or inference.TFLiteModel: The speech-to-text model.
+    """
+    global model, infer, time_stride
+    with model_lock:
+        if model is None:
+            start = time.perf_counter()
+            if model_path.endswith('.tflite'):
+                loaded_model = infer = compile_tflite_inference(model_path, (1, 200, num_frequency_bins))
+            else:
+                import tensorflow as tf
+                loaded_model = tf.keras.models.load_model(model_path, custom_objects={'CTCLoss': CTCLoss})
+                infer = compile_inference(loaded_model, (1, 200, num_frequency_bins))
+            # The strided convolutions map `frames` spectrogram frames to ceil(frames / time_stride) output steps
+            output_steps = np.asarray(infer(np.zeros((1, 200, num_frequency_bins), np.float32))).shape[1]
+            time_stride = round(200 / output_steps)
+            model = loaded_model
+            metrics.model_load_seconds.set(time.perf_counter() - start, 'tts')
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def model_version():
+    """
+    Returns the version of the speech-to-text model, used to key cached results.
+
+    Returns:
+        str: Hash of the model weights.
+    """
+    return file_version(model_path)
+
+
 # The set of characters accepted in the transcription.
 characters = [x for x in "abcdefghijklmnopqrstuvwxyz "]
-# Mapping characters to integers
-char_to_num = keras.layers.StringLookup(vocabulary=characters, oov_token="")
-# Mapping integers back to original characters
-num_to_char = keras.layers.StringLookup(
-    vocabulary=char_to_num.get_vocabulary(), oov_token="", invert=True
-)
 
 
-def decode_batch_predictions(pred):
+# Character of each model output class: index 0 is the OOV token of the `StringLookup` vocabulary the model was
+# trained with and the last class is the CTC blank, both decoded as empty strings. Building the table from
+# `characters` rather than from `StringLookup` layers keeps TensorFlow from being initialised on import.
+index_to_char = np.array([""] + characters + [""], dtype=object)
+
+
+def log_add(a, b):
+    """
+    Adds two probabilities given as logarithms.
+
+    Args:
+        a (float): Logarithm of the first probability.
+        b (float): Logarithm of the second probability.
+
+    Returns:
+        float: Logarithm of the sum of both probabilities.
+    """
+    if a == -math.inf:
+        return b
+    if b == -math.inf:
+        return a
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+def beam_search_decode(probs, beam_width):
+    """
+    Decodes the output of a CTC-based model for one sequence with prefix beam search.
+
+    Args:
+        probs (numpy.ndarray): A 2D array of shape (time_steps, num_classes) with the output probabilities of the
+         valid time steps. The last class is the CTC blank.
+        beam_width (int): Number of prefixes kept after each time step.
+
+    Returns:
+        numpy.ndarray: The class indices of the most probable labelling, without blanks.
+    """
+    blank = probs.shape[1] - 1
+    log_probs = np.log(probs + 1e-7)
+    # Each prefix keeps the log probabilities of its paths ending in a blank and in a character
+    beams = {(): (0.0, -math.inf)}
+    for step in log_probs:
+        candidates = np.argsort(step)[-beam_width:]
+        next_beams = {}
+        for prefix, (blank_score, char_score) in beams.items():
+            for c in candidates:
+                c = int(c)
+                score = float(step[c])
+                if c == blank:
+                    next_blank, next_char = next_beams.get(prefix, (-math.inf, -math.inf))
+                    next_beams[prefix] = (log_add(next_blank, log_add(blank_score, char_score) + score), next_char)
+                    continue
+
+                extended = prefix + (c,)
+                next_blank, next_char = next_beams.get(extended, (-math.inf, -math.inf))
+                if prefix and prefix[-1] == c:
+                    # A repeated character only extends the prefix after a blank, otherwise it collapses into it
+                    next_beams[extended] = (next_blank, log_add(next_char, blank_score + score))
+                    same_blank, same_char = next_beams.get(prefix, (-math.inf, -math.inf))
+                    next_beams[prefix] = (same_blank, log_add(same_char, char_score + score))
+                else:
+                    next_beams[extended] = (next_blank, log_add(next_char, log_add(blank_score, char_score) + score))
+
+        beams = dict(sorted(next_beams.items(), key=lambda item: log_add(*item[1]), reverse=True)[:beam_width])
+
+    best_prefix = max(beams.items(), key=lambda item: log_add(*item[1]))[0]
+    return np.array(best_prefix, dtype=np.int64)
+
+
+def decode_batch_predictions(pred, input_length=None, beam_width=None):
     """
     Decodes the output predictions of a CTC-based model into readable text.
 
     This function takes the raw predictions from a model trained with Connectionist Temporal Classification (CTC) loss
-     and decodes them into text sequences. It uses a greedy search by default, but can be modified to use beam search
-      for more complex tasks.
+     and decodes them into text sequences. It uses a vectorized greedy search by default: argmax over the vocabulary
+     axis, then repeated classes and blanks are removed with masks and the remaining indices are mapped through
+     `index_to_char`. The result is the same as `keras.backend.ctc_decode(greedy=True)` followed by an inverted
+     `StringLookup` of `characters`.
+     Prefix beam search can be used instead by passing `beam_width`.
 
     Args:
         pred (numpy.ndarray): A 3D array of shape (batch_size, time_steps, num_classes) containing the output predictions
          from the model.
+        input_length (numpy.ndarray, optional): Number of valid time steps of each batch element, for batches padded
+         to a common length. Defaults to all the time steps.
+        beam_width (int, optional): Number of prefixes kept by beam search. Greedy search is used when it is None.
 
     Returns:
         list of str: A list of decoded text sequences for each batch element.
@@ -78,114 +214,303 @@ def decode_batch_predictions(pred):
         print(decoded_texts)  # Output: ['text1', 'text2']
 
     Notes:
-        - The function assumes the presence of a `num_to_char` mapping function, which converts numerical predictions to
-         their corresponding characters.
         - Greedy search is used for decoding by default. For better accuracy, especially on complex tasks, consider
         using beam search.
     """
-    input_len = np.ones(pred.shape[0]) * pred.shape[1]
-    # Use greedy search. For complex tasks, you can use beam search
-    results = keras.backend.ctc_decode(pred, input_length=input_len, greedy=True)[0][0]
-    # Iterate over the results and get back the text
-    output_text = []
-    for result in results:
-        result = tf.strings.reduce_join(num_to_char(result)).numpy().decode("utf-8")
-        output_text.append(result)
-    return output_text
+    pred = np.asarray(pred)
+    batch_size, time_steps, num_classes = pred.shape
+    input_length = np.full(batch_size, time_steps) if input_length is None else np.asarray(input_length, dtype=np.int64)
+
+    if beam_width is not None:
+        return ["".join(index_to_char[beam_search_decode(probs[:length], beam_width)])
+                for probs, length in zip(pred, input_length)]
+
+    best_path = np.argmax(pred, axis=-1)
+
+    # Keep the valid time steps that are not blanks and differ from the previous step
+    keep = (np.arange(time_steps) < input_length[:, np.newaxis]) & (best_path != num_classes - 1)
+    keep[:, 1:] &= best_path[:, 1:] != best_path[:, :-1]
+
+    return ["".join(index_to_char[path[mask]]) for path, mask in zip(best_path, keep)]
+
+
+def read_matching_wav(data):
+    """
+    Reads the samples of a WAV file that is already in the format expected by the model.
 
+    Args:
+        data (bytes): The contents of the uploaded file.
 
-def transform_audio(input_file):
+    Returns:
+        numpy.ndarray or None: The float32 samples in [-1, 1], or None when the data is not an uncompressed mono
+         16-bit WAV at `sample_rate`.
+    """
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            if (wav.getnchannels(), wav.getsampwidth(), wav.getframerate(), wav.getcomptype()) != (1, 2, sample_rate,
+                                                                                                 'NONE'):
+                return None
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    return np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def decode_audio(data):
     """
-    Transforms an audio file to a specific format suitable for further processing.
+    Decodes an uploaded audio file in memory into the samples expected by the model.
 
-    This function takes an input audio file, resamples it to 22050 Hz, converts it to mono (single channel), and applies
-     an asynchronous resampling filter. The transformed audio is saved to a temporary WAV file, which is returned for
-     further use.
+    This function pipes the file into ffmpeg's stdin and reads raw 22050 Hz mono 16-bit PCM back from its stdout,
+     applying an asynchronous resampling filter to keep the samples aligned with the timestamps, so nothing is
+     written to disk. WAV files that are already in that format skip ffmpeg.
 
     Args:
-        input_file (str): The path to the input audio file.
+        data (bytes): The contents of the uploaded audio file, in any format ffmpeg can read.
 
     Returns:
-        tempfile._TemporaryFileWrapper: A temporary file object containing the transformed audio.
+        numpy.ndarray: The float32 samples in [-1, 1].
 
     Example:
-        temp_output = transform_audio('input.mp3')
-        print(temp_output.name)  # Output: Path to the temporary WAV file
+        with open('input.mp3', 'rb') as file:
+            samples = decode_audio(file.read())
+        print(samples.shape)  # Output: (number_of_samples,)
+    """
+    with metrics.stage('stt', 'decode'):
+        samples = read_matching_wav(data)
+        if samples is not None:
+            return samples
+
+        output, _ = (ffmpeg.input('pipe:0')
+                     .output('pipe:1', format='s16le', acodec='pcm_s16le', ar=sample_rate, ac=1,
+                             af="aresample=async=1:min_hard_comp=0.100000:first_pts=0", loglevel="quiet")
+                     .run(input=data, capture_stdout=True, capture_stderr=True))
+        return np.frombuffer(output, dtype='<i2').astype(np.float32) / 32768.0
 
-    Notes:
-        - The function uses `ffmpeg` for audio processing, which must be installed and available in the system path.
-        - The temporary file is not deleted automatically when closed. The caller is responsible for deleting it when
-         no longer needed.
 
-    Dependencies:
-        - ffmpeg-python: Install with `pip install ffmpeg-python`
-        - ffmpeg: Install from https://ffmpeg.org/download.html
+def pcm_samples(data):
     """
-    # Create a temporary file to store the output
-    temp_output = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    # Perform the transformation
-    ffmpeg.input(input_file).output(temp_output.name, ar=22050, ac=1, af="aresample=async=1:min_hard_comp=0.100000:first_pts=0",
-                                    loglevel="quiet").run(overwrite_output=True)
-    # Return the temporary file object
-    return temp_output
+    Converts a chunk of mono 16-bit little-endian PCM into the samples expected by the model.
 
+    Args:
+        data (bytes): The PCM chunk.
 
-def transcribe_audio(audio_file):
+    Returns:
+        numpy.ndarray: The float32 samples in [-1, 1].
+
+    Raises:
+        ValueError: When the chunk does not hold a whole number of samples.
     """
-    Transcribes an audio file to text using a pre-trained model.
+    if len(data) % 2:
+        raise ValueError(f"Audio chunks must hold whole 16-bit samples, got {len(data)} bytes")
+    return np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+
 
-    This function reads an audio file, computes its spectrogram, normalizes it, and passes it through a pre-trained
-     model to get the transcription. It returns the decoded transcription of the audio.
+def compute_spectrogram(audio):
+    """
+    Computes the normalized spectrogram that the model takes as input.
 
     Args:
-        audio_file (str): The path to the input audio file.
+        audio (numpy.ndarray or tf.Tensor): The float32 mono samples.
 
     Returns:
-        str: The transcribed text from the audio file.
+        tf.Tensor: A tensor of shape (frames, num_frequency_bins) with each frame normalized to zero mean and unit
+         variance.
+    """
+    import tensorflow as tf
 
-    Example:
-        transcription = transcribe_audio('input.wav')
-        print(transcription)  # Output: Transcribed text
+    with metrics.stage('stt', 'preprocess'):
+        # Compute the spectrogram
+        spectrogram = tf.signal.stft(audio, frame_length=frame_length, frame_step=frame_step, fft_length=fft_length)
+        spectrogram = tf.abs(spectrogram)
+        spectrogram = tf.math.pow(spectrogram, 0.5)
 
-    Notes:
-        - The `decode_batch_predictions` function should be defined to decode the model predictions into readable text.
+        # Normalization
+        means = tf.math.reduce_mean(spectrogram, 1, keepdims=True)
+        stddevs = tf.math.reduce_std(spectrogram, 1, keepdims=True)
+        spectrogram = (spectrogram - means) / (stddevs + 1e-10)
+
+    return spectrogram
+
+
+def transcribe_samples(audio):
     """
-    # Read the audio file
-    file = tf.io.read_file(audio_file)
-    audio, _ = tf.audio.decode_wav(file, desired_channels=1)
-    audio = tf.squeeze(audio, axis=-1)
-    audio = tf.cast(audio, tf.float32)
+    Transcribes audio samples to text using a pre-trained model.
 
-    # Compute the spectrogram
-    spectrogram = tf.signal.stft(audio, frame_length=256, frame_step=160, fft_length=384)
-    spectrogram = tf.abs(spectrogram)
-    spectrogram = tf.math.pow(spectrogram, 0.5)
+    Args:
+        audio (numpy.ndarray or tf.Tensor): The float32 mono samples at `sample_rate`.
 
-    # Normalization
-    means = tf.math.reduce_mean(spectrogram, 1, keepdims=True)
-    stddevs = tf.math.reduce_std(spectrogram, 1, keepdims=True)
-    spectrogram = (spectrogram - means) / (stddevs + 1e-10)
+    Returns:
+        list of str: The transcribed text, as a one-element list.
+    """
+    import tensorflow as tf
+
+    spectrogram = compute_spectrogram(tf.convert_to_tensor(audio, dtype=tf.float32))
 
     # Add batch dimension
     spectrogram = tf.expand_dims(spectrogram, axis=0)
 
     # Pass through the model
-    prediction = model.predict(spectrogram)
+    load_model()
+    with metrics.stage('stt', 'infer'):
+        prediction = np.asarray(infer(spectrogram))
 
     # Decode the transcription
-    transcription = decode_batch_predictions(prediction)
+    with metrics.stage('stt', 'postprocess'):
+        transcription = decode_batch_predictions(prediction)
 
     return transcription
 
 
+def transcribe_audio(audio_file):
+    """
+    Transcribes an audio file to text using a pre-trained model.
+
+    This function reads an audio file, decodes it in memory with `decode_audio` and passes the samples to
+     `transcribe_samples`, like the /transcribe_audio route does with an upload.
+
+    Args:
+        audio_file (str): The path to the input audio file, in any format ffmpeg can read.
+
+    Returns:
+        list of str: The transcribed text, as a one-element list.
+
+    Example:
+        transcription = transcribe_audio('input.wav')
+        print(transcription)  # Output: Transcribed text
+    """
+    with open(audio_file, 'rb') as file:
+        data = file.read()
+
+    return transcribe_samples(decode_audio(data))
+
+
+def transcribe_spectrograms(spectrograms):
+    """
+    Transcribes several spectrograms with a single pass through the model.
+
+    The spectrograms are zero-padded to the longest one, and the output of each is decoded only up to its own length.
+     Padding still reaches the valid frames through the bidirectional layers, so the batch should contain spectrograms
+     of similar lengths (see `transcribe_batch.py`, which groups them into length buckets).
+
+    Args:
+        spectrograms (list of numpy.ndarray): Spectrograms of shape (frames, num_frequency_bins), as returned by
+         `compute_spectrogram`.
+
+    Returns:
+        list of str: The transcription of each spectrogram, in the same order.
+    """
+    lengths = np.array([len(spectrogram) for spectrogram in spectrograms])
+    batch = np.zeros((len(spectrograms), lengths.max(), num_frequency_bins), dtype=np.float32)
+    for i, spectrogram in enumerate(spectrograms):
+        batch[i, :len(spectrogram)] = spectrogram
+
+    load_model()
+    with metrics.stage('stt', 'infer'):
+        prediction = np.asarray(infer(batch))
+
+    # The model downsamples the time axis by its stride, so padding steps are left out of each length
+    output_length = np.minimum(np.ceil(lengths / time_stride), prediction.shape[1])
+    with metrics.stage('stt', 'postprocess'):
+        return decode_batch_predictions(prediction, input_length=output_length)
+
+
+class StreamingTranscriber:
+    def __init__(self, partial_every_seconds=0.5):
+        """
+        Initializes the StreamingTranscriber class.
+
+        This class transcribes audio that arrives in chunks while the user is still talking. The STFT frames are
+         computed as soon as each chunk arrives: the samples after the last complete frame are carried over to the next
+         chunk, so the frames are the same as those of the whole utterance. Each frame is normalized on its own, so
+         earlier frames never need to be recomputed. A partial greedy-CTC transcript of the audio received so far is
+         produced every `partial_every_seconds` of new audio.
+
+        Args:
+            partial_every_seconds (float, optional): Seconds of new audio between partial transcripts. Defaults to 0.5.
+
+        Example:
+            transcriber = StreamingTranscriber()
+            for chunk in chunks:
+                partial = transcriber.add_audio(chunk)
+                if partial is not None:
+                    print(partial)
+            print(transcriber.finish())
+        """
+        self.partial_every_frames = max(1, int(partial_every_seconds * sample_rate / frame_step))
+        # Samples received after the start of the next incomplete frame
+        self.pending = np.zeros(0, dtype=np.float32)
+        # Normalized spectrogram frames computed so far
+        self.frames = []
+        self.frames_since_partial = 0
+        self.samples_received = 0
+        self.transcript = ''
+
+    @property
+    def audio_seconds(self):
+        return self.samples_received / sample_rate
+
+    def add_audio(self, samples):
+        """
+        Adds a chunk of audio and computes its complete STFT frames.
+
+        Args:
+            samples (numpy.ndarray): The float32 mono samples of the chunk at `sample_rate`.
+
+        Returns:
+            str or None: A partial transcript of the audio so far, or None when no partial is due yet.
+        """
+        self.samples_received += len(samples)
+        self.pending = np.concatenate([self.pending, samples])
+
+        if len(self.pending) >= frame_length:
+            num_frames = 1 + (len(self.pending) - frame_length) // frame_step
+            chunk = self.pending[:(num_frames - 1) * frame_step + frame_length]
+            self.frames.append(compute_spectrogram(chunk).numpy())
+            # Keep the overlap with the next frame
+            self.pending = self.pending[num_frames * frame_step:]
+            self.frames_since_partial += num_frames
+
+        if self.frames_since_partial >= self.partial_every_frames:
+            return self.transcribe()
+        return None
+
+    def transcribe(self):
+        """
+        Transcribes all the frames received so far.
+
+        Returns:
+            str: The greedy-CTC transcript of the audio so far.
+        """
+        self.frames_since_partial = 0
+        if not self.frames:
+            return self.transcript
+
+        spectrogram = np.concatenate(self.frames)[np.newaxis]
+        load_model()
+        with metrics.stage('stt', 'infer'):
+            prediction = np.asarray(infer(spectrogram))
+        with metrics.stage('stt', 'postprocess'):
+            self.transcript = decode_batch_predictions(prediction)[0]
+        return self.transcript
+
+    def finish(self):
+        """
+        Transcribes the complete utterance once the last chunk has been received.
+
+        Returns:
+            str: The final transcript.
+        """
+        if self.frames_since_partial:
+            return self.transcribe()
+        return self.transcript
+
+
 if __name__ == "__main__":
     # Test with an audio file
-    input_audio_file = r"test.wav"  # Replace with the path to your input WAV file
-    print("Transforming audio...")
-    transformed_file = transform_audio(input_audio_file)
+    input_audio_file = r"test.wav"  # Replace with the path to your input audio file
+    print("Decoding audio...")
+    with open(input_audio_file, 'rb') as input_audio:
+        samples = decode_audio(input_audio.read())
     print("Transcribing audio...")
-    transcription = transcribe_audio(transformed_file.name)
+    transcription = transcribe_samples(samples)
     print("Transcription:", transcription)
-
-    # Close and delete the temporary file
-    transformed_file.close()
@@ -0,0 +1,386 @@
+"""
+CPU weapon detection with the YOLOv8 model trained in object_detection/yolo.ipynb.
+
+The notebook runs the PyTorch checkpoint on CUDA. The backend serves a TFLite export of it
+instead, run by the TensorFlow Lite interpreter (XNNPACK) that ships with TensorFlow. The
+export is made once with `python weapons.py export`, which needs `ultralytics`; serving
+does not. The interpreter of `ai_edge_litert` (LiteRT) is used when it is installed.
+
+Each thread that detects keeps its own interpreter, with WEAPON_NUM_THREADS threads (1 by
+default), so a worker with one thread per core serves one stream per core. The frames of
+a video are sampled at WEAPON_SAMPLE_FPS, and the skipped frames are grabbed without being
+decoded to an image. The sampled frames are run in batches of the batch size of the export.
+"""
+import argparse
+import functools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from cache import file_version
+from inference import new_interpreter
+import metrics
+
+# Set TensorFlow logging level to only display errors
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # 0 = all messages, 1 = info, 2 = warnings, 3 = errors
+
+# TFLite export of the detector and the JSON list of its class names, written by `export_model`
+model_path = os.environ.get('WEAPON_WEIGHTS', r'deep_learning_models/weights/weapons.tflite')
+num_threads = int(os.environ.get('WEAPON_NUM_THREADS', 1))
+
+# Detections below the confidence are dropped, and boxes of the same class that overlap more than the IoU are
+# suppressed. The notebook predicted with conf=0.5.
+confidence_threshold = float(os.environ.get('WEAPON_CONFIDENCE', 0.5))
+iou_threshold = float(os.environ.get('WEAPON_IOU', 0.45))
+
+# Frames per second of a video that are run through the detector
+sample_fps = float(os.environ.get('WEAPON_SAMPLE_FPS', 5))
+
+# Flatbuffer and class names of the detector, read on first use by `load_model`
+model_content = None
+class_names = None
+model_lock = threading.Lock()
+
+# Interpreter of each thread, created by `get_detector`
+detectors = threading.local()
+
+
+def labels_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def load_model():
+    """
+    Reads the detector and its class names the first time they are needed.
+
+    Returns:
+        bytes: The TFLite flatbuffer, shared by the interpreters of every thread.
+    """
+    global model_content, class_names
+    with model_lock:
+        if model_content is None:
+            start = time.perf_counter()
+            with open(model_path, 'rb') as file:
+                content = file.read()
+            names = None
+            if os.path.exists(labels_path(model_path)):
+                with open(labels_path(model_path)) as file:
+                    names = json.load(file)
+            class_names = names
+            model_content = content
+            get_detector()
+            metrics.model_load_seconds.set(time.perf_counter() - start, 'weapons')
+    return model_content
+
+
+@functools.lru_cache(maxsize=None)
+def model_version():
+    """
+    Returns the version of the detection pipeline, used to key cached results.
+
+    Returns:
+        str: Hash of the detector together with the thresholds and the video sampling rate.
+    """
+    return f"{file_version(model_path)}:{confidence_threshold}:{iou_threshold}:{sample_fps}"
+
+
+class Detector:
+    def __init__(self, content, threads=1):
+        """
+        Initializes the Detector class, which runs a YOLOv8 TFLite export on batches of frames.
+
+        Args:
+            content (bytes): The TFLite flatbuffer. Its input is (batch, size, size, 3) RGB in [0, 1], and its output
+             (batch, 4 + classes, anchors) with normalized center boxes, as exported by `ultralytics`.
+            threads (int): Threads used by the interpreter.
+        """
+        self.interpreter = new_interpreter(model_content=content, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size, self.size = int(self.input['shape'][0]), int(self.input['shape'][1])
+
+    def predict(self, images):
+        """
+        Runs the detector on up to `batch_size` letterboxed images.
+
+        The input of an export has a fixed batch size, so a shorter batch is padded and the padding rows are dropped.
+
+        Args:
+            images (numpy.ndarray): Array of shape (n, size, size, 3).
+
+        Returns:
+            numpy.ndarray: Raw output of shape (n, anchors, 4 + classes).
+        """
+        count = len(images)
+        if count < self.batch_size:
+            images = np.concatenate([images, np.zeros((self.batch_size - count,) + images.shape[1:], images.dtype)])
+        self.interpreter.set_tensor(self.input['index'], images)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output['index'])[:count].transpose(0, 2, 1)
+
+
+def get_detector():
+    """
+    Creates the interpreter of the current thread the first time it needs one.
+
+    A TFLite interpreter must not be shared between threads that run at the same time, so each thread keeps its own,
+     built from the shared flatbuffer.
+
+    Returns:
+        Detector: The detector of the current thread.
+    """
+    detector = getattr(detectors, 'detector', None)
+    if detector is None:
+        detector = Detector(load_model() if model_content is None else model_content, num_threads)
+        detectors.detector = detector
+    return detector
+
+
+def letterbox(image, size):
+    """
+    Resizes a BGR image to fit a square, keeping its aspect ratio and padding it with gray like `ultralytics`.
+
+    Args:
+        image (numpy.ndarray): BGR image of shape (height, width, 3).
+        size (int): Side of the square input of the detector.
+
+    Returns:
+        tuple: The RGB float32 input of shape (size, size, 3), the scale applied to the image and the (x, y) padding.
+    """
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized_width, resized_height = round(width * scale), round(height * scale)
+    pad_x, pad_y = (size - resized_width) // 2, (size - resized_height) // 2
+
+    canvas = np.full((size, size, 3), 114, np.uint8)
+    canvas[pad_y:pad_y + resized_height, pad_x:pad_x + resized_width] = cv2.resize(
+        image, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0, scale, (pad_x, pad_y)
+
+
+def postprocess(output, size, scale, padding, shape):
+    """
+    Filters the raw output of the detector for one image and maps its boxes back to the image.
+
+    Args:
+        output (numpy.ndarray): Raw output of shape (anchors, 4 + classes).
+        size (int): Side of the input of the detector.
+        scale (float): Scale returned by `letterbox`.
+        padding (tuple): Padding returned by `letterbox`.
+        shape (tuple): Shape of the original image.
+
+    Returns:
+        list: One dict per detection with its `label`, `confidence` and `box` (x, y, width, height) in pixels.
+    """
+    scores = output[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    keep = confidences >= confidence_threshold
+    if not keep.any():
+        return []
+
+    centers = output[keep, :4] * size
+    boxes = np.column_stack([centers[:, 0] - centers[:, 2] / 2, centers[:, 1] - centers[:, 3] / 2,
+                             centers[:, 2], centers[:, 3]])
+    confidences, class_ids = confidences[keep], class_ids[keep]
+    indices = cv2.dnn.NMSBoxesBatched(boxes.tolist(), confidences.tolist(), class_ids.tolist(),
+                                      confidence_threshold, iou_threshold)
+
+    height, width = shape[:2]
+    detections = []
+    for i in np.asarray(indices, dtype=int).reshape(-1):
+        x = max(0.0, (boxes[i, 0] - padding[0]) / scale)
+        y = max(0.0, (boxes[i, 1] - padding[1]) / scale)
+        right = min(float(width), (boxes[i, 0] + boxes[i, 2] - padding[0]) / scale)
+        bottom = min(float(height), (boxes[i, 1] + boxes[i, 3] - padding[1]) / scale)
+        class_id = int(class_ids[i])
+        detections.append({'label': class_names[class_id] if class_names else str(class_id),
+                           'confidence': round(float(confidences[i]), 4),
+                           'box': [round(x), round(y), round(right - x), round(bottom - y)]})
+    return detections
+
+
+def detect(images):
+    """
+    Detects weapons in a list of BGR images, in batches of the batch size of the detector.
+
+    Args:
+        images (list): BGR images of shape (height, width, 3).
+
+    Returns:
+        list: The detections of each image, see `postprocess`.
+    """
+    detector = get_detector()
+    results = []
+    for start in range(0, len(images), detector.batch_size):
+        batch = images[start:start + detector.batch_size]
+        with metrics.stage('weapons', 'preprocess'):
+            letterboxed = [letterbox(image, detector.size) for image in batch]
+        with metrics.stage('weapons', 'infer'):
+            outputs = detector.predict(np.stack([inputs for inputs, _, _ in letterboxed]))
+        with metrics.stage('weapons', 'postprocess'):
+            for image, output, (_, scale, padding) in zip(batch, outputs, letterboxed):
+                results.append(postprocess(output, detector.size, scale, padding, image.shape))
+    return results
+
+
+def to_bgr(image):
+    """
+    Converts a grayscale or BGRA image to BGR, returning BGR images unchanged.
+    """
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    return image
+
+
+def detect_image(image_bytes):
+    """
+    Detects weapons in an encoded image.
+
+    Args:
+        image_bytes (bytes): The uploaded image, e.g. a JPEG.
+
+    Returns:
+        list: The detections of the image, see `postprocess`.
+    """
+    with metrics.stage('weapons', 'decode'):
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("The image could not be decoded")
+    return detect([image])[0]
+
+
+def sample_frames(capture, fps):
+    """
+    Yields the frames of a video at a lower frame rate.
+
+    Every frame is grabbed so that the position in the video advances, but only the sampled frames are retrieved as
+     images.
+
+    Args:
+        capture (cv2.VideoCapture): The opened video.
+        fps (float): Frames per second to sample.
+
+    Yields:
+        tuple: The index of the frame and its BGR image.
+    """
+    video_fps = capture.get(cv2.CAP_PROP_FPS) or fps
+    step = max(1, round(video_fps / fps))
+    index = 0
+    while True:
+        with metrics.stage('weapons', 'decode'):
+            if not capture.grab():
+                return
+            frame = capture.retrieve()[1] if index % step == 0 else None
+        if frame is not None:
+            yield index, to_bgr(frame)
+        index += 1
+
+
+def detect_video(path, fps=None):
+    """
+    Detects weapons in the sampled frames of a video file.
+
+    Args:
+        path (str): Path of the video.
+        fps (float, optional): Frames per second to sample, `sample_fps` by default.
+
+    Returns:
+        dict: The frame rate of the video, the sampling rate, and for each sampled frame its index, its time in seconds
+         and its detections.
+    """
+    fps = fps or sample_fps
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("The video could not be opened")
+
+    try:
+        video_fps = capture.get(cv2.CAP_PROP_FPS) or fps
+        batch_size = get_detector().batch_size
+        frames = []
+        pending = []
+
+        def flush():
+            for (index, _), detections in zip(pending, detect([frame for _, frame in pending])):
+                frames.append({'frame': index, 'time': round(index / video_fps, 3), 'detections': detections})
+            pending.clear()
+
+        for index, frame in sample_frames(capture, fps):
+            pending.append((index, frame))
+            if len(pending) == batch_size:
+                flush()
+        flush()
+    finally:
+        capture.release()
+
+    return {'fps': video_fps, 'sample_fps': min(fps, video_fps), 'frames': frames}
+
+
+def detect_video_bytes(video_bytes, suffix='.mp4'):
+    """
+    Detects weapons in an uploaded video, see `detect_video`.
+
+    OpenCV only reads videos from files, so the upload is written to a temporary file first.
+
+    Args:
+        video_bytes (bytes): The uploaded video.
+        suffix (str): Extension of the upload, which helps OpenCV pick the container format.
+
+    Returns:
+        dict: See `detect_video`.
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix) as file:
+        file.write(video_bytes)
+        file.flush()
+        return detect_video(file.name)
+
+
+def export_model(weights, output_path, imgsz=640, batch=1, half=False):
+    """
+    Exports the PyTorch checkpoint trained in the notebook to TFLite, with its class names next to it.
+
+    Args:
+        weights (str): Path of the checkpoint, e.g. object_detection/weights/train/weights/best.pt.
+        output_path (str): Path of the TFLite file to write.
+        imgsz (int): Side of the input. Smaller inputs are faster on CPU, e.g. 320 or 416.
+        batch (int): Fixed batch size of the input.
+        half (bool): Store the weights as float16.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    exported_path = model.export(format='tflite', imgsz=imgsz, batch=batch, half=half)
+    shutil.copyfile(exported_path, output_path)
+    with open(labels_path(output_path), 'w') as file:
+        json.dump([model.names[i] for i in sorted(model.names)], file)
+    print(f"Exported {weights} to {output_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='Export the notebook checkpoint to TFLite.')
+    export_parser.add_argument('weights', help='Path of the PyTorch checkpoint (best.pt).')
+    export_parser.add_argument('--output', default=model_path, help='Path of the TFLite file to write.')
+    export_parser.add_argument('--imgsz', type=int, default=640, help='Side of the input.')
+    export_parser.add_argument('--batch', type=int, default=1, help='Fixed batch size of the input.')
+    export_parser.add_argument('--half', action='store_true', help='Store the weights as float16.')
+    detect_parser = subparsers.add_parser('detect', help='Detect weapons in an image or a video.')
+    detect_parser.add_argument('path', help='Path of the image or video.')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_model(args.weights, args.output, args.imgsz, args.batch, args.half)
+    else:
+        image = cv2.imread(args.path)
+        result = detect([image])[0] if image is not None else detect_video(args.path)
+        print(json.dumps(result, indent=2))